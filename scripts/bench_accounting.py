@@ -0,0 +1,69 @@
+import argparse
+import time
+
+from py_sandbox.AnalyzerConfig import AnalyzerConfig
+from py_sandbox.CodeRunner import CodeRunner
+from py_sandbox.RunAccounting import UsageLedger
+
+# from a trivial snippet, where the fixed per-run cost shows, to allocation heavy ones
+WORKLOADS = {
+    "assignment": "x = 1",
+    "print": "for i in range(100):\n    print(i)",
+    "loop": "total = 0\nfor i in range(100000):\n    total += i",
+    "allocations": "items = [str(i) for i in range(100000)]",
+    "dicts": "table = {i: [i] * 4 for i in range(20000)}",
+}
+
+
+def best_of(runner, compiled, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        runner.run_compiled(compiled)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-run cost of resource accounting, and what the ledger adds up")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--sessions", type=int, default=4)
+    args = parser.parse_args()
+
+    config = AnalyzerConfig()
+    runners = {
+        "off": CodeRunner(),
+        "on": CodeRunner(accounting=True),
+        "tracemalloc": CodeRunner(accounting="tracemalloc"),
+    }
+
+    print(f"{'workload':<12} {'off ms':>9} {'on ms':>9} {'overhead':>9} {'traced ms':>10} {'overhead':>9}")
+    for name, source in WORKLOADS.items():
+        timings = {}
+        for mode, runner in runners.items():
+            _, compiled = runner.prepare(source, config)
+            timings[mode] = best_of(runner, compiled, args.repeat)
+        base = timings["off"]
+        print(f"{name:<12} {base * 1e3:>9.3f} {timings['on'] * 1e3:>9.3f} {timings['on'] / base - 1:>9.1%} "
+              f"{timings['tracemalloc'] * 1e3:>10.3f} {timings['tracemalloc'] / base - 1:>9.1%}")
+
+    print()
+    ledger = UsageLedger()
+    runner = CodeRunner(accounting=True, ledger=ledger)
+    compiled = {name: runner.prepare(source, config)[1] for name, source in WORKLOADS.items()}
+    for session in range(args.sessions):
+        # session n runs the first n + 1 workloads, so their totals differ
+        for name in list(WORKLOADS)[:session + 1]:
+            runner.run_accounted(compiled[name], session=f"session-{session}")
+    stats = ledger.stats()
+    print(f"{'session':<12} {'runs':>5} {'cpu ms':>9} {'wall ms':>9} {'net blocks':>10} {'output':>7}")
+    for session, totals in sorted(stats["by_session"].items()):
+        print(f"{session:<12} {totals['runs']:>5} {(totals['user_cpu'] + totals['sys_cpu']) * 1e3:>9.2f} "
+              f"{totals['wall_ns'] / 1e6:>9.2f} {totals['net_blocks']:>10} {totals['output_bytes']:>7}")
+    total = stats["total"]
+    print(f"{'total':<12} {total['runs']:>5} {(total['user_cpu'] + total['sys_cpu']) * 1e3:>9.2f} "
+          f"{total['wall_ns'] / 1e6:>9.2f} {total['net_blocks']:>10} {total['output_bytes']:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import argparse
+import ast
+import time
+
+from py_sandbox.AnalyzerConfig import AnalyzerConfig
+from py_sandbox.CodeAnalyzer import CodeAnalyzer
+
+
+def nested_functions(depth, branches=3):
+    """depth nested functions, each with a few decision points of its own"""
+    out = []
+    indent = ""
+    for d in range(depth):
+        out.append(f"{indent}def level_{d}(x):")
+        indent += "    "
+        for b in range(branches):
+            out.append(f"{indent}if x > {b} and x < {b + 10}:")
+            out.append(f"{indent}    x += 1")
+    out.append(f"{indent}return x")
+    return "\n".join(out)
+
+
+def walk_complexity(tree):
+    """The old per-function ast.walk approach, quadratic on nested functions"""
+    complexities = []
+    for func in ast.walk(tree):
+        if isinstance(func, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            complexity = 1
+            for node in ast.walk(func):
+                if isinstance(node, (ast.If, ast.While, ast.For, ast.ExceptHandler)):
+                    complexity += 1
+                elif isinstance(node, ast.BoolOp):
+                    complexity += len(node.values) - 1
+            complexities.append(complexity)
+    return complexities
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def bench(depths, repeat):
+    config = AnalyzerConfig()
+    print(f"{'depth':>6} {'nodes':>8} {'analyze ms':>11} {'ns/node':>9} {'walk ms':>9} {'ns/node':>9}")
+    for depth in depths:
+        source = nested_functions(depth)
+        nodes = sum(1 for _ in ast.walk(ast.parse(source)))
+
+        analyze_time, (results, _) = timed(lambda: CodeAnalyzer(config).analyze_code(source), repeat)
+        tree = ast.parse(source)
+        walk_time, expected = timed(lambda: walk_complexity(tree), repeat)
+        # analyze_time includes parse and the rest of the analysis, walk_time is complexity alone
+        assert [f["complexity"] for f in results["functions"]] == expected
+
+        print(f"{depth:>6} {nodes:>8} {analyze_time * 1e3:>11.2f} {analyze_time / nodes * 1e9:>9.0f}"
+              f" {walk_time * 1e3:>9.2f} {walk_time / nodes * 1e9:>9.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Function complexity cost on deeply nested generated code")
+    parser.add_argument("--depths", type=int, nargs="*", default=[10, 20, 40, 80])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    bench(args.depths, args.repeat)
@@ -0,0 +1,97 @@
+# Representative snippets for the pipeline benchmarks, generated so runs are comparable
+
+REPL_LINES = [
+    "x = 1 + 1",
+    "print('Hello World')",
+    "nums = [i * i for i in range(10)]",
+    "total = sum(nums) if nums else 0",
+    "name = 'sandbox'.upper()",
+    "d = {'a': 1, 'b': 2}",
+]
+
+
+def script_1k(lines=1000):
+    """Plain module with many small functions, loops and conditionals"""
+    out = ['"""generated script"""', "results = []"]
+    i = 0
+    while len(out) < lines:
+        out += [
+            f"def func_{i}(a, b=2):",
+            f'    """function {i}"""',
+            "    total = 0",
+            "    for j in range(a):",
+            "        if j % b == 0 and j > 1:",
+            "            total += j",
+            "        elif j % 3 == 0 or j % 5 == 0:",
+            "            total -= 1",
+            "    return total",
+            f"results.append(func_{i}({i % 7}))",
+        ]
+        i += 1
+    return "\n".join(out[:lines])
+
+
+def deeply_nested(depth=60):
+    """Nested conditionals, loops (python caps those at 20) and functions"""
+    out = []
+    indent = ""
+    for d in range(depth):
+        out.append(f"{indent}if {d} >= 0:")
+        indent += "    "
+    out.append(f"{indent}value = 1")
+    indent = ""
+    for d in range(15):
+        # no calls here, policies rewrite range() and iterating 'ALERT' would explode
+        out.append(f"{indent}for i{d} in (0,):")
+        indent += "    "
+    out.append(f"{indent}value = 2")
+    indent = ""
+    for d in range(30):
+        out.append(f"{indent}def nested_{d}():")
+        indent += "    "
+    out.append(f"{indent}return {depth}")
+    return "\n".join(out)
+
+
+def import_heavy(modules=None):
+    modules = modules or [
+        "json", "math", "re", "collections", "itertools", "functools", "string",
+        "random", "statistics", "decimal", "fractions", "datetime", "textwrap",
+    ]
+    out = []
+    for name in modules:
+        out.append(f"import {name}")
+        out.append(f"import {name} as {name}_alias")
+    out.append("from collections import OrderedDict, defaultdict")
+    out.append("from math import sqrt, pi")
+    return "\n".join(out)
+
+
+def blacklisted_call_heavy(calls=200):
+    """Lots of calls the default and example policies reject"""
+    templates = [
+        "open('f{i}.txt')",
+        "os.system('echo {i}')",
+        "sys.exit({i})",
+        "socket.socket()",
+        "eval('{i}')",
+        "print({i})",
+    ]
+    out = ["import os", "import sys", "import socket"]
+    for i in range(calls):
+        out.append("try:")
+        out.append("    " + templates[i % len(templates)].format(i=i))
+        out.append("except Exception:")
+        out.append("    pass")
+    return "\n".join(out)
+
+
+def corpus():
+    """name -> list of snippets"""
+    return {
+        "repl_line": REPL_LINES,
+        "script_1k": [script_1k()],
+        "deeply_nested": [deeply_nested()],
+        "import_heavy": [import_heavy()],
+        "blacklisted_calls": [blacklisted_call_heavy()],
+    }
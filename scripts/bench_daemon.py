@@ -0,0 +1,73 @@
+import argparse
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from py_sandbox.SandboxClient import SandboxClient
+from py_sandbox.SandboxDaemon import SandboxDaemon
+
+SNIPPET = "total = sum(i * i for i in range(100))\nname = 'sandbox'.upper()"
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, len(values) * pct // 100)]
+
+
+def timed(fn, count):
+    times = []
+    for n in range(count):
+        start = time.perf_counter()
+        fn(n)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Round trip latency of a local sandbox daemon")
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    socket_path = os.path.join(tempfile.mkdtemp(), "sandbox.sock")
+    daemon = multiprocessing.get_context("fork").Process(
+        target=SandboxDaemon(socket_path).serve_forever, daemon=True)
+    daemon.start()
+    while not os.path.exists(socket_path):
+        time.sleep(0.01)
+
+    try:
+        with SandboxClient(socket_path) as client:
+            print(f"{'call':<22} {'p50 us':>8} {'p99 us':>8}")
+            rows = {
+                "ping": lambda n: client.ping(),
+                "analyze (cached)": lambda n: client.analyze(SNIPPET, summary=True),
+                "analyze (new)": lambda n: client.analyze(f"{SNIPPET}\nx = {n}", summary=True),
+                "run (cached)": lambda n: client.run(SNIPPET),
+            }
+            for name, fn in rows.items():
+                times = timed(fn, args.requests)
+                print(f"{name:<22} {percentile(times, 50) * 1e6:>8.1f} {percentile(times, 99) * 1e6:>8.1f}")
+
+            jobs = [{"op": "analyze", "code": f"y = {n}", "summary": True} for n in range(args.requests)]
+            start = time.perf_counter()
+            client.pipeline(jobs)
+            pipelined = (time.perf_counter() - start) / len(jobs)
+            start = time.perf_counter()
+            client.batch(jobs)
+            batched = (time.perf_counter() - start) / len(jobs)
+            print(f"{'pipelined analyze':<22} {pipelined * 1e6:>8.1f} per request")
+            print(f"{'batched analyze':<22} {batched * 1e6:>8.1f} per job")
+    finally:
+        daemon.terminate()
+        daemon.join()
+
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"], check=True)
+    print(f"for scale, starting a bare interpreter: {(time.perf_counter() - start) * 1e6:.0f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import argparse
+import ast
+import time
+
+from py_sandbox.AnalyzerConfig import AnalyzerConfig
+from py_sandbox.CodeAnalyzer import CodeAnalyzer
+from py_sandbox.MultiPolicyAnalyzer import MultiPolicyAnalyzer
+
+from bench_corpus import corpus
+from bench_prescreen import configs as example_configs
+
+
+def tenant_configs(count):
+    """The example policies plus generated tenants with their own blacklists"""
+    out = dict(example_configs())
+    i = 0
+    while len(out) < count:
+        config = AnalyzerConfig()
+        config.blacklisted_functions = ["open", "eval", f"tenant_func_{i}"]
+        config.blacklist_imports = ["os", "sys", "socket", f"tenant_mod_{i}"]
+        if i % 3 == 0:
+            # some tenants block a function the corpus actually calls
+            config.blacklisted_functions.append(f"func_{i}")
+        config.blacklist = config.blacklist_imports + config.blacklist_statements + config.blacklisted_functions
+        config.compile()
+        out[f"tenant_{i}"] = config
+        i += 1
+    return dict(list(out.items())[:count])
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="N separate analyses vs one multi-policy pass")
+    parser.add_argument("--policies", type=int, nargs="*", default=[1, 4, 16, 64])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    snippets = {"script_1k": corpus()["script_1k"][0], "blacklisted_calls": corpus()["blacklisted_calls"][0]}
+    print(f"{'snippet':<18} {'policies':>8} {'separate ms':>12} {'multi ms':>9} {'speedup':>8}")
+    for name, source in snippets.items():
+        for count in args.policies:
+            configs = tenant_configs(count)
+
+            def separate():
+                return {key: CodeAnalyzer(config).analyze_code(source) for key, config in configs.items()}
+
+            def multi():
+                _, verdicts = MultiPolicyAnalyzer().analyze_code(source, configs)
+                # build every tree so the comparison includes the copies
+                return {key: verdict.tree for key, verdict in verdicts.items()}
+
+            expected = separate()
+            _, verdicts = MultiPolicyAnalyzer().analyze_code(source, configs)
+            for key, (report, tree) in expected.items():
+                assert report["alert_types"] == verdicts[key].alert_types, key
+                assert ast.dump(tree) == ast.dump(verdicts[key].tree), key
+
+            separate_time = timed(separate, args.repeat)
+            multi_time = timed(multi, args.repeat)
+            print(f"{name:<18} {count:>8} {separate_time * 1e3:>12.1f} {multi_time * 1e3:>9.1f}"
+                  f" {separate_time / multi_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
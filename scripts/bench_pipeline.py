@@ -0,0 +1,154 @@
+import argparse
+import ast
+import contextlib
+import glob
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+from py_sandbox.AnalyzerConfig import AnalyzerConfig
+from py_sandbox.CodeAnalyzer import CodeAnalyzer
+from py_sandbox.CodeRunner import CodeRunner
+
+from bench_corpus import corpus
+
+PHASES = ("parse", "analyze", "report", "compile", "exec")
+
+
+def run_once(source, config, runner, timings):
+    """One trip through analyze -> transform -> compile -> exec, recording each phase"""
+    clock = time.perf_counter_ns
+    t0 = clock()
+    tree = ast.parse(source, mode="exec")
+    t1 = clock()
+    analyzer = CodeAnalyzer(config)
+    analyzer.line_count = len(source.splitlines())
+    analyzer.visit(tree)
+    t2 = clock()
+    analyzer._compile_results()
+    t3 = clock()
+    compiled = runner.compile_tree(tree)
+    t4 = clock()
+    try:
+        runner.run_compiled(compiled)
+    except BaseException:
+        # rewritten calls return 'ALERT', restrictive policies often make the code fail
+        pass
+    t5 = clock()
+    for phase, start, end in zip(PHASES, (t0, t1, t2, t3, t4), (t1, t2, t3, t4, t5)):
+        timings[phase].append(end - start)
+
+
+def allocations(source, config, runner):
+    """Peak traced KiB and net allocated blocks of every phase, measured on a separate run"""
+    out = {}
+    state = {}
+
+    def measure(phase, fn):
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        blocks = sys.getallocatedblocks()
+        result = fn()
+        _, peak = tracemalloc.get_traced_memory()
+        out[phase] = {"peak_kib": (peak - before) / 1024, "blocks": sys.getallocatedblocks() - blocks}
+        return result
+
+    def analyze():
+        analyzer = CodeAnalyzer(config)
+        analyzer.visit(state["tree"])
+        return analyzer
+
+    def execute():
+        try:
+            runner.run_compiled(state["code"])
+        except BaseException:
+            pass
+
+    tracemalloc.start()
+    try:
+        state["tree"] = measure("parse", lambda: ast.parse(source, mode="exec"))
+        analyzer = measure("analyze", analyze)
+        measure("report", analyzer._compile_results)
+        state["code"] = measure("compile", lambda: runner.compile_tree(state["tree"]))
+        measure("exec", execute)
+    finally:
+        tracemalloc.stop()
+    return out
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, len(samples) * pct // 100)]
+
+
+def bench(config_paths, iterations):
+    configs = {"default": AnalyzerConfig()}
+    for path in config_paths:
+        configs[os.path.splitext(os.path.basename(path))[0]] = AnalyzerConfig(config_path=path)
+
+    results = {}
+    runner = CodeRunner()
+    for config_name, config in configs.items():
+        for corpus_name, snippets in corpus().items():
+            timings = {phase: [] for phase in PHASES}
+            allocs = {phase: {"peak_kib": 0, "blocks": 0} for phase in PHASES}
+            for source in snippets:
+                for _ in range(iterations):
+                    run_once(source, config, runner, timings)
+                for phase, alloc in allocations(source, config, runner).items():
+                    allocs[phase]["peak_kib"] = max(allocs[phase]["peak_kib"], alloc["peak_kib"])
+                    allocs[phase]["blocks"] = max(allocs[phase]["blocks"], alloc["blocks"])
+            for phase in PHASES:
+                results[f"{config_name}/{corpus_name}/{phase}"] = {
+                    "p50_us": percentile(timings[phase], 50) / 1000,
+                    "p95_us": percentile(timings[phase], 95) / 1000,
+                    "p99_us": percentile(timings[phase], 99) / 1000,
+                    **allocs[phase],
+                }
+    return results
+
+
+def report(results, baseline=None, threshold=0.10):
+    """Print the table, flag rows slower than baseline by more than threshold; returns regressions"""
+    regressions = []
+    print(f"{'config/corpus/phase':<42} {'p50 us':>10} {'p95 us':>10} {'p99 us':>10} {'peak KiB':>10} {'blocks':>8}  vs baseline")
+    for key, row in results.items():
+        line = (f"{key:<42} {row['p50_us']:>10.1f} {row['p95_us']:>10.1f} {row['p99_us']:>10.1f}"
+                f" {row['peak_kib']:>10.1f} {row['blocks']:>8}")
+        base = (baseline or {}).get(key)
+        if base and base["p50_us"] > 0:
+            change = row["p50_us"] / base["p50_us"] - 1
+            line += f"  {change:+.1%}"
+            if change > threshold:
+                line += " REGRESSION"
+                regressions.append(key)
+        print(line)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-phase latency and allocations of the sandbox pipeline")
+    parser.add_argument("-n", "--iterations", type=int, default=50, help="runs per snippet")
+    parser.add_argument("--configs", nargs="*", default=sorted(glob.glob("example_configs/*.yaml")))
+    parser.add_argument("--save", help="write results as a baseline json file")
+    parser.add_argument("--baseline", help="compare against a saved baseline")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed p50 slowdown before flagging")
+    args = parser.parse_args()
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        results = bench(args.configs, args.iterations)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    regressions = report(results, baseline, args.threshold)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nbaseline saved to: {args.save}")
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}")
+        sys.exit(1)
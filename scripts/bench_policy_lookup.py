@@ -0,0 +1,48 @@
+import argparse
+import contextlib
+import os
+import time
+
+from py_sandbox.AnalyzerConfig import AnalyzerConfig
+from py_sandbox.CodeAnalyzer import CodeAnalyzer
+
+# Hits every rule lookup: blacklisted imports, aliases, calls and attributes
+SNIPPET = """
+import os as o
+import socket
+from sys import path
+x = len([1, 2, 3])
+o.system("ls")
+socket.socket()
+print(open("f"), path, x)
+"""
+
+
+def bench(analyses, checkpoints):
+    """Run many analyses against one shared config and time each window"""
+    config = AnalyzerConfig()
+    blacklist_size = len(config.blacklist)
+    window = max(analyses // checkpoints, 1)
+    done = 0
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        rows = []
+        while done < analyses:
+            start = time.perf_counter()
+            for _ in range(window):
+                CodeAnalyzer(config).analyze_code(SNIPPET)
+            elapsed = time.perf_counter() - start
+            done += window
+            rows.append((done, elapsed / window * 1e6, len(config.blacklist)))
+
+    print(f"{'analyses':>12} {'us/analysis':>12} {'blacklist':>10}")
+    for done, per_analysis, size in rows:
+        print(f"{done:>12} {per_analysis:>12.1f} {size:>10}")
+    print(f"blacklist size before: {blacklist_size} after: {len(config.blacklist)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shows rule lookup cost stays flat on a shared config")
+    parser.add_argument("-n", "--analyses", type=int, default=100_000)
+    parser.add_argument("--checkpoints", type=int, default=10)
+    args = parser.parse_args()
+    bench(args.analyses, args.checkpoints)
@@ -0,0 +1,82 @@
+import argparse
+import ast
+import glob
+import os
+import time
+
+from py_sandbox.AnalyzerConfig import AnalyzerConfig
+from py_sandbox.CodeAnalyzer import CodeAnalyzer
+from py_sandbox.CodeRunner import CodeRunner
+from py_sandbox.PreScreen import PreScreen
+
+from bench_corpus import corpus
+
+# typical agent/REPL traffic plus a few that must never be waved through
+TRAFFIC = [
+    "x = 1 + 1",
+    "total = sum(i * i for i in range(100))",
+    "name = 'sandbox'.upper()",
+    "d = {'a': 1, 'b': 2}\nd['c'] = 3",
+    "def f(a):\n    return a * 2\nresult = f(21)",
+    "print('hello')",
+    "values = sorted([3, 1, 2])",
+    "import json\njson.dumps({})",
+    "import os\nos.listdir('.')",
+    "from os import path",
+    "open('/etc/passwd').read()",
+    "s = socket.socket()",
+    "ｏｐｅｎ('/etc/passwd')",
+    "# mentions open in a comment only\ny = 2",
+]
+
+
+def configs():
+    here = os.path.dirname(os.path.abspath(__file__))
+    yield "default", AnalyzerConfig()
+    for path in sorted(glob.glob(os.path.join(here, "..", "example_configs", "*.yaml"))):
+        yield os.path.basename(path)[:-5], AnalyzerConfig(config_path=path)
+
+
+def snippets():
+    out = list(TRAFFIC)
+    for group in corpus().values():
+        out.extend(group)
+    return out
+
+
+def check_no_false_accepts(config, sources):
+    """Every snippet the screen lets through must come out of the full pass untouched and without alerts"""
+    screen = PreScreen(config.policy)
+    for source in sources:
+        if not screen.is_clean(source):
+            continue
+        report, tree = CodeAnalyzer(config).analyze_code(source)
+        assert not report["alert"], f"false accept (alert): {source!r}"
+        assert ast.dump(tree) == ast.dump(ast.parse(source)), f"false accept (rewrite): {source!r}"
+    return screen
+
+
+def time_prepare(config, sources, prescreen, repeat):
+    runner = CodeRunner(prescreen=prescreen)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for source in sources:
+            runner.prepare(source, config)
+    return (time.perf_counter() - start) / (repeat * len(sources))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Skip rate and prepare() latency with the lexical pre-screen")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'policy':<16} {'skip rate':>9} {'full us':>9} {'screened us':>12}")
+    for name, config in configs():
+        screen = check_no_false_accepts(config, snippets())
+        full = time_prepare(config, TRAFFIC, False, args.repeat)
+        screened = time_prepare(config, TRAFFIC, True, args.repeat)
+        print(f"{name:<16} {screen.skip_rate:>9.0%} {full * 1e6:>9.1f} {screened * 1e6:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
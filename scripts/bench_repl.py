@@ -0,0 +1,46 @@
+import argparse
+import codeop
+import time
+
+from py_sandbox.ReplBuffer import ReplBuffer
+
+
+def pasted_block(lines):
+    """One function of about `lines` lines, the kind of block people paste"""
+    body = [f"    value_{n} = [{n}, '{n}:'] + list(range({n % 7}))" for n in range(lines - 2)]
+    return ["def pasted():"] + body + ["    return value_0", ""]
+
+
+def rejoin_and_compile(lines):
+    """What the old multiline REPL did: join the whole buffer and compile it again on every line"""
+    buffer = []
+    for line in lines:
+        buffer.append(line)
+        if codeop.compile_command("\n".join(buffer)) is not None:
+            buffer.clear()
+
+
+def incremental(lines):
+    buffer = ReplBuffer()
+    for line in lines:
+        buffer.feed(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time to take in a pasted block, line by line")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 500, 2000])
+    args = parser.parse_args()
+
+    print(f"{'lines':>6} {'rejoin ms':>10} {'incremental ms':>15}")
+    for size in args.sizes:
+        lines = pasted_block(size)
+        timings = []
+        for fn in (rejoin_and_compile, incremental):
+            start = time.perf_counter()
+            fn(lines)
+            timings.append(time.perf_counter() - start)
+        print(f"{size:>6} {timings[0] * 1e3:>10.1f} {timings[1] * 1e3:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
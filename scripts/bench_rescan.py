@@ -0,0 +1,70 @@
+# Full scan vs incremental rescan of a generated tree through an AnalysisManifest
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from py_sandbox.AnalysisManifest import AnalysisManifest
+from py_sandbox.AnalyzerConfig import AnalyzerConfig
+from py_sandbox.BatchAnalyzer import BatchAnalyzer
+
+from bench_corpus import script_1k
+
+
+def build_tree(root, files, lines):
+    source = script_1k(lines)
+    for i in range(files):
+        directory = os.path.join(root, f"pkg_{i // 500}")
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"mod_{i}.py"), "w") as f:
+            f.write(f"# module {i}\n{source}\n")
+
+
+def scan(root, manifest, config, workers):
+    start = time.perf_counter()
+    with BatchAnalyzer(config, workers=workers, manifest=manifest) as batch:
+        records = list(batch.analyze([root], ordered=False))
+    elapsed = time.perf_counter() - start
+    cached = sum(1 for r in records if r.get("cached"))
+    return elapsed, len(records), cached
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Full scan vs incremental rescan through an AnalysisManifest")
+    parser.add_argument("--files", type=int, default=5000)
+    parser.add_argument("--lines", type=int, default=200)
+    parser.add_argument("--edits", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp(prefix="sbx-rescan-")
+    try:
+        root = os.path.join(work, "tree")
+        build_tree(root, args.files, args.lines)
+        config = AnalyzerConfig()
+        manifest = AnalysisManifest(os.path.join(work, "manifest.db"))
+
+        def report(name, result):
+            elapsed, total, cached = result
+            print(f"{name:<18} {elapsed:8.2f}s  files={total} cached={cached} {manifest.stats()}")
+
+        report("cold scan", scan(root, manifest, config, args.workers))
+        report("unchanged rescan", scan(root, manifest, config, args.workers))
+
+        for i in range(args.edits):
+            with open(os.path.join(root, "pkg_0", f"mod_{i}.py"), "a") as f:
+                f.write(f"edited_{i} = {i}\n")
+        # touched but identical content is re-hashed, not re-analyzed
+        os.utime(os.path.join(root, "pkg_0", f"mod_{args.edits}.py"))
+        report(f"{args.edits} edits rescan", scan(root, manifest, config, args.workers))
+
+        stricter = AnalyzerConfig(config_path=os.path.join(os.path.dirname(__file__), "..", "example_configs", "locktight.yaml"))
+        report("policy change", scan(root, manifest, stricter, args.workers))
+        manifest.close()
+    finally:
+        shutil.rmtree(work)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import argparse
+import random
+import time
+
+from py_sandbox.CostScheduler import CostScheduler, JobRejected
+
+# what an interactive user types
+CHEAP = [
+    "x = 1 + 1",
+    "name = 'sandbox'.upper()",
+    "values = sorted([3, 1, 2])",
+    "d = {'a': 1}\nd['b'] = 2",
+    "total = sum(i for i in range(100))",
+]
+
+# scripts sharing the same runner
+HEAVY = [
+    "total = 0\nfor i in range(300000):\n    total += i * i",
+    "def fib(n, f):\n    return n if n < 2 else f(n - 1, f) + f(n - 2, f)\nfib(22, fib)",
+    "rows = [[i * j for j in range(300)] for i in range(300)]",
+]
+
+
+def workload(jobs, heavy_share, seed=0):
+    rng = random.Random(seed)
+    return [("heavy", rng.choice(HEAVY)) if rng.random() < heavy_share else ("cheap", rng.choice(CHEAP))
+            for _ in range(jobs)]
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, len(values) * pct // 100)] if values else 0
+
+
+def replay(scheduler, jobs):
+    """Submit everything at once, return completion latencies per kind"""
+    latencies = {"cheap": [], "heavy": []}
+    rejected = 0
+    pending = []
+    start = time.perf_counter()
+    for kind, source in jobs:
+        try:
+            future = scheduler.submit(source)
+        except JobRejected:
+            rejected += 1
+            continue
+        future.add_done_callback(lambda f, kind=kind: latencies[kind].append(time.perf_counter() - start))
+        pending.append(future)
+    for future in pending:
+        future.result()
+    return latencies, rejected
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency of cheap snippets queued with heavy ones, FIFO vs cost ordered")
+    parser.add_argument("--jobs", type=int, default=200)
+    parser.add_argument("--heavy-share", type=float, default=0.1)
+    parser.add_argument("--max-queued-seconds", type=float, default=None)
+    args = parser.parse_args()
+    jobs = workload(args.jobs, args.heavy_share)
+
+    print(f"{'order':<8} {'cheap p50 ms':>13} {'cheap p95 ms':>13} {'heavy p50 ms':>13} {'total ms':>9} {'rejected':>9}")
+    # an aging rate this high makes the submit time the only thing that counts: FIFO
+    for name, aging in (("fifo", 1e9), ("cost", 0.5)):
+        with CostScheduler(aging=aging, max_queued_seconds=args.max_queued_seconds) as scheduler:
+            # one pass so the model has measured every snippet once
+            replay(scheduler, [("cheap", source) for source in CHEAP + HEAVY])
+            latencies, rejected = replay(scheduler, jobs)
+        total = max(latencies["cheap"] + latencies["heavy"])
+        print(f"{name:<8} {percentile(latencies['cheap'], 50) * 1e3:>13.1f} "
+              f"{percentile(latencies['cheap'], 95) * 1e3:>13.1f} {percentile(latencies['heavy'], 50) * 1e3:>13.1f} "
+              f"{total * 1e3:>9.1f} {rejected:>9}")
+
+
+if __name__ == "__main__":
+    main()
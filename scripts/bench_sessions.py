@@ -0,0 +1,84 @@
+import argparse
+import time
+import tracemalloc
+
+from py_sandbox.AnalyzerConfig import AnalyzerConfig
+from py_sandbox.CodeAnalyzer import CodeAnalyzer
+from py_sandbox.CodeRunner import CodeRunner
+from py_sandbox.SandboxSession import SandboxSession
+
+# setup every agent session would otherwise repeat
+WARMUP = [
+    "table = [[i * j for j in range(100)] for i in range(1000)]",
+    "lookup = {str(i): i for i in range(20000)}",
+] + [f"def helper_{n}(x):\n    return x + {n}" for n in range(200)]
+
+LINES = ["x = 1", "y = x + 1", "z = y * 2"]
+
+
+def per_line_old(config, lines, repeat):
+    """What cli.repl did before: a new analyzer and runner for every line"""
+    recurring_vars = {}
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for line in lines:
+            report, tree = CodeAnalyzer(config).analyze_code(source_code=line)
+            _, recurring_vars, _ = CodeRunner().run_tree(tree, recurring_vars)
+    return (time.perf_counter() - start) / (repeat * len(lines))
+
+
+def per_line_session(session, lines, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for line in lines:
+            session.run(line)
+    return (time.perf_counter() - start) / (repeat * len(lines))
+
+
+def measure(make, count):
+    """Seconds and traced bytes per session for count sessions made by make()"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    sessions = [make() for _ in range(count)]
+    elapsed = time.perf_counter() - start
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del sessions
+    return elapsed / count, used / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cost of starting sandbox sessions from a warmed snapshot")
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    config = AnalyzerConfig()
+
+    base = SandboxSession(config)
+    for source in WARMUP:
+        base.run(source)
+    snapshot = base.snapshot()
+
+    def cold():
+        session = SandboxSession(config, runner=base.runner)
+        for source in WARMUP:
+            session.run(source)
+        return session
+
+    cold_count = max(args.sessions // 50, 1)
+    cold_time, cold_bytes = measure(cold, cold_count)
+    fork_time, fork_bytes = measure(snapshot.fork, args.sessions)
+    print(f"{'start':<10} {'us/session':>11} {'KiB/session':>12}")
+    print(f"{'cold':<10} {cold_time * 1e6:>11.1f} {cold_bytes / 1024:>12.1f}")
+    print(f"{'fork':<10} {fork_time * 1e6:>11.1f} {fork_bytes / 1024:>12.1f}")
+
+    print()
+    session = snapshot.fork()
+    old = per_line_old(config, LINES, args.repeat)
+    new = per_line_session(session, LINES, args.repeat)
+    print(f"per line: new analyzer and runner {old * 1e6:.1f} us, session {new * 1e6:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import argparse
+import time
+
+from py_sandbox.AnalyzerConfig import AnalyzerConfig
+from py_sandbox.CodeRunner import CodeRunner
+from py_sandbox.ResourceLimiter import ResourceLimiter, StepLimitExceeded
+
+# loop and call heavy snippets, where the counters cost the most
+WORKLOADS = {
+    "for loop": "total = 0\nfor i in range(200000):\n    total += i",
+    "while loop": "i = 0\nwhile i < 200000:\n    i += 1",
+    "comprehension": "squares = [i * i for i in range(200000) if i % 3]",
+    "calls": "def f(x):\n    return x + 1\nfor i in range(100000):\n    f(i)",
+    # snippet level names are locals of the exec, so the function gets itself passed in
+    "recursion": "def fib(n, f):\n    return n if n < 2 else f(n - 1, f) + f(n - 2, f)\nfib(20, fib)",
+    "lambda": "g = lambda x: x * 2\nresult = list(map(g, range(200000)))",
+}
+
+# must all be stopped by the budget, however they try to dodge it
+RUNAWAY = {
+    "while True": "while True:\n    pass",
+    "swallowing": "while True:\n    try:\n        while True:\n            pass\n    except BaseException:\n        pass",
+    "generator": "def gen():\n    while True:\n        yield 1\ntry:\n    sum(gen())\nexcept RuntimeError:\n    pass",
+    "retrying": "while True:\n    try:\n        raise ValueError\n    except ValueError:\n        continue",
+}
+
+
+def best_of(runner, compiled, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        runner.run_compiled(compiled)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Overhead of step budget instrumentation, and runaway snippets it stops")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-steps", type=int, default=10**7)
+    args = parser.parse_args()
+
+    config = AnalyzerConfig()
+    plain = CodeRunner()
+    counted = CodeRunner(limiter=ResourceLimiter(max_steps=args.max_steps))
+
+    print(f"{'workload':<14} {'plain ms':>9} {'counted ms':>11} {'overhead':>9} {'steps':>8}")
+    for name, source in WORKLOADS.items():
+        _, plain_code = plain.prepare(source, config)
+        _, counted_code = counted.prepare(source, config)
+        base = best_of(plain, plain_code, args.repeat)
+        with_steps = best_of(counted, counted_code, args.repeat)
+        print(f"{name:<14} {base * 1e3:>9.2f} {with_steps * 1e3:>11.2f} {with_steps / base - 1:>9.1%} "
+              f"{counted.last_steps:>8}")
+
+    print()
+    runner = CodeRunner(limiter=ResourceLimiter(max_steps=100000))
+    for name, source in RUNAWAY.items():
+        _, compiled = runner.prepare(source, config)
+        start = time.perf_counter()
+        try:
+            runner.run_compiled(compiled)
+        except StepLimitExceeded:
+            outcome = "stopped"
+        else:
+            outcome = "NOT STOPPED"
+        print(f"{name:<14} {outcome} after {(time.perf_counter() - start) * 1e3:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import argparse
+import time
+
+from py_sandbox.AnalyzerConfig import AnalyzerConfig
+from py_sandbox.CodeRunner import CodeRunner
+from py_sandbox.ResourceLimiter import ResourceLimiter
+from py_sandbox.WorkerPool import WorkerPool
+
+SNIPPET = "total = sum(i * i for i in range(200))\nprint(total)"
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return {p: samples[min(len(samples) - 1, len(samples) * p // 100)] * 1e6 for p in (50, 95, 99)}
+
+
+def bench(jobs, workers):
+    """Compare in-process exec with a round trip through a warm worker"""
+    runner = CodeRunner()
+    _, compiled = runner.prepare(SNIPPET, AnalyzerConfig())
+
+    in_process = []
+    for _ in range(jobs):
+        start = time.perf_counter()
+        runner.run_compiled(compiled)
+        in_process.append(time.perf_counter() - start)
+
+    pooled = []
+    with WorkerPool(workers=workers, limiter=ResourceLimiter(wall_seconds=5)) as pool:
+        for _ in range(jobs):
+            start = time.perf_counter()
+            pool.run(compiled)
+            pooled.append(time.perf_counter() - start)
+        stats = pool.stats()
+
+    print(f"{'mode':>12} {'p50 us':>10} {'p95 us':>10} {'p99 us':>10}")
+    for name, samples in (("in-process", in_process), ("pool", pooled)):
+        p = percentiles(samples)
+        print(f"{name:>12} {p[50]:>10.1f} {p[95]:>10.1f} {p[99]:>10.1f}")
+    print(f"pool stats: {stats}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latency of the warm worker pool against in-process exec")
+    parser.add_argument("-n", "--jobs", type=int, default=5000)
+    parser.add_argument("-w", "--workers", type=int, default=2)
+    args = parser.parse_args()
+    bench(args.jobs, args.workers)
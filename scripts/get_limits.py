@@ -1,4 +1,5 @@
 import resource
+import sys
 
 # Function to print current resource limits
 def print_resource_limits():
@@ -10,7 +11,19 @@ def print_resource_limits():
     memory_limit = resource.getrlimit(resource.RLIMIT_AS)
     print(f"Memory Limit: Current = {memory_limit[0] / (1024 * 1024)} MB, Max = {memory_limit[1] / (1024 * 1024)} MB")
 
+# Function to print the per-execution budgets a sandbox config asks for
+def print_config_limits(config_path):
+    from py_sandbox.AnalyzerConfig import AnalyzerConfig
+    from py_sandbox.ResourceLimiter import ResourceLimiter
+
+    limiter = ResourceLimiter.from_config(AnalyzerConfig(config_path=config_path))
+    print(f"Sandbox CPU seconds: {limiter.cpu_seconds}")
+    print(f"Sandbox memory: {limiter.memory_bytes / (1024 * 1024) if limiter.memory_bytes else None} MB")
+    print(f"Sandbox wall seconds: {limiter.wall_seconds}")
+    print(f"Sandbox output bytes: {limiter.output_bytes}")
+
 # Example usage
 if __name__ == "__main__":
     print_resource_limits()
-    
\ No newline at end of file
+    if len(sys.argv) > 1:
+        print_config_limits(sys.argv[1])
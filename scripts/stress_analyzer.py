@@ -0,0 +1,76 @@
+import argparse
+import ast
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from py_sandbox.AnalysisCache import AnalysisCache
+from py_sandbox.AnalysisRecords import json_default
+from py_sandbox.CodeAnalyzer import CodeAnalyzer
+from py_sandbox.CodeRunner import CodeRunner
+
+from bench_corpus import corpus
+from bench_prescreen import TRAFFIC, configs
+
+
+def fingerprint(result):
+    report, tree = result
+    return json.dumps(report, default=json_default, sort_keys=True), ast.dump(tree)
+
+
+def work_items(repeat):
+    sources = list(TRAFFIC)
+    for group in corpus().values():
+        sources.extend(group)
+    # alerting and clean snippets interleaved, so leaked alerts would show up
+    return sources * repeat
+
+
+def stress(name, analyzer, runner, config, sources, expected, threads):
+    """Analyze everything on a shared analyzer (and a shared cached runner) from many threads"""
+    mismatches = []
+
+    def check(source):
+        try:
+            if fingerprint(analyzer.analyze_code(source)) != expected[source]:
+                mismatches.append(("analyze_code", source))
+            report, _ = runner.prepare(source, config)
+            if json.dumps(report, default=json_default, sort_keys=True) != expected[source][0]:
+                mismatches.append(("prepare", source))
+        except Exception as e:
+            mismatches.append((type(e).__name__, source))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(check, sources))
+    return time.perf_counter() - start, mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Share one analyzer per policy between threads and check every result")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+    print(f"python {sys.version.split()[0]}, GIL {'enabled' if gil else 'disabled'}")
+    sources = work_items(args.repeat)
+    failed = False
+    print(f"{'policy':<16} {'threads':>7} {'seconds':>8} {'mismatches':>11}")
+    for name, config in configs():
+        # what each snippet gives on a fresh analyzer, one at a time
+        expected = {source: fingerprint(CodeAnalyzer(config).analyze_code(source)) for source in set(sources)}
+        for threads in args.threads:
+            analyzer = CodeAnalyzer(config)
+            runner = CodeRunner(cache=AnalysisCache(max_entries=64))
+            elapsed, mismatches = stress(name, analyzer, runner, config, sources, expected, threads)
+            failed = failed or bool(mismatches)
+            print(f"{name:<16} {threads:>7} {elapsed:>8.2f} {len(mismatches):>11}")
+            for kind, source in mismatches[:3]:
+                print(f"    {kind}: {source[:60]!r}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import hashlib
+import marshal
+import threading
+from collections import OrderedDict
+
+from .AnalysisRecords import estimated_size
+
+
+def source_hash(source_code):
+    """Content address of a snippet"""
+    return hashlib.sha256(source_code.encode("utf-8")).hexdigest()
+
+
+class CacheEntry:
+    """A finished analysis report and its ready-to-exec code object"""
+    __slots__ = ("report", "code", "size")
+
+    def __init__(self, report, code, size):
+        self.report = report
+        self.code = code
+        self.size = size
+
+
+class AnalysisCache:
+    """
+    In-process LRU cache of analysis results keyed on (source hash, policy fingerprint).
+    Bounded both by number of entries and by an estimate of their size in bytes.
+    Reports are shared between hits so callers should treat them as read-only.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(source_code, policy, variant=None):
+        """variant tells apart code compiled differently from the same source and policy"""
+        fingerprint = policy.fingerprint
+        if variant:
+            fingerprint = hashlib.sha256(f"{fingerprint}:{variant}".encode("utf-8")).hexdigest()
+        return (source_hash(source_code), fingerprint)
+
+    def get(self, key):
+        """Return the CacheEntry for key and mark it most recently used, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, report, code):
+        """Store a report and code object, evicting least recently used entries as needed"""
+        size = self._estimate_size(report, code)
+        if size > self.max_bytes:
+            # would evict everything else and still not fit
+            return None
+        entry = CacheEntry(report, code, size)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old.size
+            self._entries[key] = entry
+            self.bytes += size
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= evicted.size
+                self.evictions += 1
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        """Counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0,
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _estimate_size(report, code):
+        # serialized sizes are a decent, cheap-enough proxy, only paid on a miss
+        return len(marshal.dumps(code)) + estimated_size(report)
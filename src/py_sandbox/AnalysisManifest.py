@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+import sqlite3
+
+from .AnalysisRecords import json_default
+
+# bump when the report format changes so old manifests are thrown away
+MANIFEST_VERSION = 1
+
+
+def file_hash(data):
+    """Content hash of a file's raw bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class AnalysisManifest:
+    """
+    On-disk record of (path, size, mtime, content hash, policy fingerprint) -> report
+    for repeated scans of the same tree.
+    A file is re-analyzed only when its size or mtime changed and its content
+    hash did too (a touched but unchanged file is re-hashed, not re-analyzed),
+    or when it was last analyzed under a different policy.
+    Backed by sqlite so lookups don't need the whole manifest in memory.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        if self.db.execute("PRAGMA user_version").fetchone()[0] != MANIFEST_VERSION:
+            self.db.execute("DROP TABLE IF EXISTS files")
+            self.db.execute(f"PRAGMA user_version = {MANIFEST_VERSION}")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, "
+            "hash TEXT, fingerprint TEXT, report TEXT)")
+        # losing the tail of a scan to a crash only means re-analyzing it
+        self.db.execute("PRAGMA synchronous = OFF")
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.hits = 0
+        self.rehashed = 0
+        self.misses = 0
+        self._pending = 0
+
+    def lookup(self, path, fingerprint):
+        """
+        The stored report for path if it is still valid under fingerprint, else None.
+        Also returns the stat result so the caller can record it afterwards.
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self.misses += 1
+            return None, None
+        row = self.db.execute(
+            "SELECT size, mtime_ns, hash, fingerprint, report FROM files WHERE path = ?", (path,)).fetchone()
+        if row is None or row[3] != fingerprint:
+            self.misses += 1
+            return None, stat
+        size, mtime_ns, digest, _, report = row
+        if size != stat.st_size or mtime_ns != stat.st_mtime_ns:
+            # stat changed, only the content can tell if it really did
+            try:
+                with open(path, "rb") as f:
+                    current = file_hash(f.read())
+            except OSError:
+                self.misses += 1
+                return None, stat
+            if current != digest:
+                self.misses += 1
+                return None, stat
+            self.rehashed += 1
+            self._write("UPDATE files SET size = ?, mtime_ns = ? WHERE path = ?",
+                        (stat.st_size, stat.st_mtime_ns, path))
+        self.hits += 1
+        return json.loads(report), stat
+
+    def record(self, path, stat, digest, fingerprint, report):
+        """Store a fresh report, stat is the one taken before the file was read"""
+        if stat is None:
+            return
+        self._write(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)",
+            (path, stat.st_size, stat.st_mtime_ns, digest, fingerprint, json.dumps(report, default=json_default)))
+
+    def forget(self, path):
+        self._write("DELETE FROM files WHERE path = ?", (path,))
+
+    def _write(self, sql, params):
+        self.db.execute(sql, params)
+        self._pending += 1
+        if self._pending >= 1000:
+            self.flush()
+
+    def flush(self):
+        self.db.commit()
+        self._pending = 0
+
+    def stats(self):
+        return {"hits": self.hits, "rehashed": self.rehashed, "misses": self.misses}
+
+    def close(self):
+        self.flush()
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
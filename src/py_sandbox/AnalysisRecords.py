@@ -0,0 +1,100 @@
+import json
+
+
+class CallRecord:
+    __slots__ = ("function", "line", "args", "kwargs", "context")
+
+    def __init__(self, function, line, args, kwargs, context):
+        self.function = function
+        self.line = line
+        self.args = args
+        self.kwargs = kwargs
+        self.context = context
+
+    def to_dict(self):
+        return {"function": self.function, "line": self.line, "args": self.args,
+                "kwargs": self.kwargs, "context": self.context}
+
+
+class LoopRecord:
+    __slots__ = ("type", "line", "context")
+
+    def __init__(self, type, line, context):
+        self.type = type
+        self.line = line
+        self.context = context
+
+    def to_dict(self):
+        return {"type": self.type, "line": self.line, "context": self.context}
+
+
+class ConditionalRecord:
+    __slots__ = ("line", "has_else", "context")
+
+    def __init__(self, line, has_else, context):
+        self.line = line
+        self.has_else = has_else
+        self.context = context
+
+    def to_dict(self):
+        return {"type": "if", "line": self.line, "has_else": self.has_else, "context": self.context}
+
+
+class TryRecord:
+    __slots__ = ("line", "handlers", "has_finally", "context")
+
+    def __init__(self, line, handlers, has_finally, context):
+        self.line = line
+        self.handlers = handlers
+        self.has_finally = has_finally
+        self.context = context
+
+    def to_dict(self):
+        return {"type": "try", "line": self.line, "handlers": self.handlers,
+                "has_finally": self.has_finally, "context": self.context}
+
+
+class ExceptRecord:
+    __slots__ = ("exception", "line", "context")
+
+    def __init__(self, exception, line, context):
+        self.exception = exception
+        self.line = line
+        self.context = context
+
+    def to_dict(self):
+        return {"type": "except", "exception": self.exception, "line": self.line, "context": self.context}
+
+
+def json_default(obj):
+    """default= for json.dump(s) that understands records"""
+    to_dict = getattr(obj, "to_dict", None)
+    if to_dict is not None:
+        return to_dict()
+    return str(obj)
+
+
+
+# report keys analyze_records() leaves as lists of records
+RECORD_LISTS = ("function_calls", "loops", "conditionals", "exceptions")
+# rough serialized size of one record, to size reports without building their dicts
+_RECORD_BYTES = 80
+
+
+def plain_report(report):
+    """report with its records turned into dicts, e.g. for marshal; reports without records come back as they are"""
+    plain = report
+    for key in RECORD_LISTS:
+        kept = report.get(key)
+        if kept and not isinstance(kept[0], dict):
+            if plain is report:
+                plain = dict(report)
+            plain[key] = [record.to_dict() for record in kept]
+    return plain
+
+
+def estimated_size(report):
+    """About the JSON size of report, records are counted rather than serialized"""
+    rest = {key: value for key, value in report.items() if key not in RECORD_LISTS}
+    count = sum(len(report.get(key) or ()) for key in RECORD_LISTS)
+    return len(json.dumps(rest, default=json_default)) + count * _RECORD_BYTES
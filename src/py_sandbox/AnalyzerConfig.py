@@ -1,6 +1,9 @@
 import yaml
 from pathlib import Path
 
+from .Policy import Policy
+from . import Events
+
 class AnalyzerConfig:
     def __init__(self,
                  config_path=None,
@@ -11,7 +14,8 @@ class AnalyzerConfig:
                  allowed_statements=[],
                  blacklist_statements=[],
                  allowed_complexity=4,
-                 no_exec=False
+                 no_exec=False,
+                 resource_limits=None
                  ):
         self.config_path=config_path
         self.allowed_imports=allowed_imports
@@ -22,6 +26,8 @@ class AnalyzerConfig:
         self.blacklist_statements=blacklist_statements
         self.allowed_complexity=allowed_complexity
         self.no_exec=no_exec
+        # cpu_seconds, memory_mb, wall_seconds, output_bytes (see ResourceLimiter)
+        self.resource_limits=resource_limits or {}
         
         if self.config_path:
             self._load_from_yaml(self.config_path)
@@ -30,6 +36,21 @@ class AnalyzerConfig:
             self._assign_defaults()
         
         self.blacklist = self.blacklist_imports + self.blacklist_statements +self.blacklisted_functions
+        self.compile()
+
+    def compile(self):
+        """
+        Compile the current attributes into an immutable Policy.
+        Call again after changing attributes by hand, analyzers pick up the
+        new policy on their next analysis.
+        """
+        self.policy = Policy.from_config(self)
+        return self.policy
+
+    @property
+    def fingerprint(self):
+        """Stable hash identifying the compiled policy"""
+        return self.policy.fingerprint
 
     def _load_from_yaml(self, config_file_path):
         path = Path(config_file_path)
@@ -43,9 +64,9 @@ class AnalyzerConfig:
     def _assign_attributes(self, config_data, prefix=''):
         for key, value in config_data.items():
             # TODO: make recursive if yaml has nested keys
-            print(f"assigning: {key} to {value}")
             setattr(self, key, value)
-            print(getattr(self, key, "Did not assign"))
+            if Events.default_stream.min_level <= Events.DEBUG:
+                Events.default_stream.emit(Events.CONFIG_LOADED, Events.DEBUG, key=key, value=value)
 
     def _assign_defaults(self):
         self.allowed_imports=[]
@@ -56,5 +77,6 @@ class AnalyzerConfig:
         self.blacklist_statements=[]
         self.allowed_complexity=4
         self.no_exec=False
+        self.resource_limits={}
 
 
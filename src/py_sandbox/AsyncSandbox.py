@@ -0,0 +1,236 @@
+import asyncio
+import contextlib
+import marshal
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from .AnalysisCache import AnalysisCache
+from .AnalyzerConfig import AnalyzerConfig
+from .CodeRunner import CodeRunner
+from .ResourceLimiter import ResourceLimiter, interrupt_thread
+
+# a cancelled job is interrupted again this often until it is gone, like ResourceLimiter's timers
+_REFIRE_SECONDS = 0.05
+
+
+class SandboxCancelled(BaseException):
+    """
+    Raised inside a sandbox job that was cancelled or timed out.
+    A BaseException so that `except Exception` in the snippet doesn't stop it.
+    """
+
+
+def _prepare_marshalled(source_code, config, max_steps, prescreen, timeout):
+    # runs in a process executor, code objects don't pickle but marshal fine.
+    # Tasks there can't be stopped from outside, the worker's own timer ends it
+    # (executor workers run tasks on their main thread, so it's a signal timer).
+    # The caches stay with the caller's runner, it looks up and stores around this
+    runner = CodeRunner(limiter=ResourceLimiter(max_steps=max_steps), prescreen=prescreen)
+    with ResourceLimiter(wall_seconds=timeout).limit():
+        report, compiled = runner.prepare(source_code, config)
+    return report, marshal.dumps(compiled)
+
+
+def _remaining(loop, deadline):
+    return max(deadline - loop.time(), 0) if deadline is not None else None
+
+
+def _consume(future):
+    # the caller already got its TimeoutError/CancelledError, drop the job's own outcome
+    if not future.cancelled():
+        future.exception()
+
+
+class _ThreadJob:
+    """
+    Callable run on an executor thread that can be stopped from the event loop,
+    as far as the code running there lets itself be: see AsyncSandbox.
+    """
+
+    def __init__(self, fn, *args):
+        self.fn = fn
+        self.args = args
+        self.lock = threading.Lock()
+        self.finished = threading.Event()
+        self.thread_id = None
+        self.done = False
+        self.cancelled = False
+
+    def __call__(self):
+        with self.lock:
+            if self.cancelled:
+                raise SandboxCancelled("cancelled before it started")
+            self.thread_id = threading.get_ident()
+        try:
+            return self.fn(*self.args)
+        finally:
+            # an interrupt can land in here too, retry until the job is marked done
+            while True:
+                try:
+                    with self.lock:
+                        self.done = True
+                        if self.cancelled:
+                            # clear a pending interrupt so it can't hit the next job on this thread
+                            interrupt_thread(self.thread_id, None)
+                    break
+                except SandboxCancelled:
+                    continue
+            self.finished.set()
+
+    def cancel(self):
+        with self.lock:
+            self.cancelled = True
+            if self.thread_id is None or self.done:
+                return
+        threading.Thread(target=self._interrupt, name="sandbox-cancel", daemon=True).start()
+
+    def _interrupt(self):
+        # the job may catch one interrupt, keep sending them until it has stopped
+        while True:
+            with self.lock:
+                if self.done:
+                    return
+                interrupt_thread(self.thread_id, SandboxCancelled)
+            if self.finished.wait(_REFIRE_SECONDS):
+                return
+
+
+class AsyncSandbox:
+    """
+    asyncio entry points for analysis and execution.
+    CPU bound work is offloaded to an executor (threads by default, analysis can
+    also go to a ProcessPoolExecutor) and untrusted code runs either on a thread
+    or, when a WorkerPool is given, in a worker process.
+    Concurrency is bounded globally and per tenant. Cancelling or timing out a
+    request always ends the await; the job itself is stopped for sure only in
+    a WorkerPool, whose worker is killed. On a thread stopping is best effort:
+    SandboxCancelled is raised into the job until it ends, which code that
+    catches BaseException in a loop never does, and that executor thread is
+    lost for good (and holds up interpreter exit). Run untrusted code with a
+    pool. Analysis in a ProcessPoolExecutor stops itself at its timeout, a
+    cancelled one runs to the end in the background.
+    """
+
+    def __init__(self, config=None, runner=None, executor=None, pool=None,
+                 max_concurrency=256, tenant_concurrency=8):
+        self.config = config or AnalyzerConfig()
+        self.runner = runner or CodeRunner(cache=AnalysisCache())
+        self.executor = executor or ThreadPoolExecutor(thread_name_prefix="sandbox")
+        # untrusted code never goes to a ProcessPoolExecutor, its tasks can't be stopped
+        if isinstance(self.executor, ProcessPoolExecutor):
+            self._threads = ThreadPoolExecutor(thread_name_prefix="sandbox")
+        else:
+            self._threads = self.executor
+        self.pool = pool
+        self.tenant_concurrency = tenant_concurrency
+        self._global = asyncio.Semaphore(max_concurrency)
+        # tenant -> [semaphore, requests holding or waiting for it], dropped when idle
+        self._tenants = {}
+
+    @contextlib.asynccontextmanager
+    async def _slot(self, tenant):
+        """One global and one per-tenant concurrency slot"""
+        entry = self._tenants.get(tenant)
+        if entry is None:
+            entry = self._tenants[tenant] = [asyncio.Semaphore(self.tenant_concurrency), 0]
+        entry[1] += 1
+        try:
+            async with self._global, entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._tenants[tenant]
+
+    async def _on_thread(self, timeout, fn, *args):
+        job = _ThreadJob(fn, *args)
+        future = asyncio.get_running_loop().run_in_executor(self._threads, job)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            job.cancel()
+            future.add_done_callback(_consume)
+            raise
+
+    async def _analyze(self, source_code, config, timeout):
+        runner = self.runner
+        if not isinstance(self.executor, ProcessPoolExecutor):
+            return await self._on_thread(timeout, runner.prepare, source_code, config)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout if timeout is not None else None
+        key = runner.cache_key(source_code, config.policy)
+        # the disk cache is file I/O, keep it off the loop
+        if runner.bytecode_cache is None:
+            hit = runner.lookup(key)
+        else:
+            hit = await self._on_thread(timeout, runner.lookup, key)
+        if hit is not None:
+            return hit[0], hit[1]
+        future = loop.run_in_executor(self.executor, _prepare_marshalled, source_code, config,
+                                      runner.limiter.max_steps, runner.prescreen, _remaining(loop, deadline))
+        report, code_bytes = await asyncio.wait_for(future, _remaining(loop, deadline))
+        compiled = marshal.loads(code_bytes)
+        if runner.bytecode_cache is None:
+            runner.store(key, report, compiled)
+        else:
+            await self._on_thread(None, runner.store, key, report, compiled)
+        return report, compiled
+
+    async def _run(self, compiled, recurring_vars, timeout, output, policy=None):
+        if self.pool is None:
+            return await self._on_thread(timeout, self.runner.run_compiled, compiled, recurring_vars, output, policy)
+        # output is only streamed for thread execution, workers send theirs back at the end
+        future = self.pool.submit(compiled, recurring_vars, policy=policy)
+        wrapped = asyncio.wrap_future(future)
+        try:
+            return await asyncio.wait_for(asyncio.shield(wrapped), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            self.pool.cancel(future)
+            wrapped.add_done_callback(_consume)
+            raise
+
+    async def analyze_async(self, source_code, config=None, tenant=None, timeout=None):
+        """Analyze and compile source_code, returns (report, code object)"""
+        async with self._slot(tenant):
+            return await self._analyze(source_code, config or self.config, timeout)
+
+    async def run_compiled_async(self, compiled, recurring_vars=None, tenant=None, timeout=None, output=None,
+                                 config=None):
+        """Run a compiled snippet in config's (default: the sandbox's) namespace, returns (output, vars, result)"""
+        config = config or self.config
+        async with self._slot(tenant):
+            return await self._run(compiled, recurring_vars, timeout, output, config.policy)
+
+    async def run_tree_async(self, code_tree, recurring_vars=None, tenant=None, timeout=None, output=None,
+                             config=None):
+        """Compile and run a sanitized tree, returns (output, vars, result)"""
+        config = config or self.config
+        async with self._slot(tenant):
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + timeout if timeout is not None else None
+            # instrumenting and compiling a big tree is CPU work like analysis, not for the loop
+            compiled = await self._on_thread(timeout, self.runner.compile_tree, code_tree)
+            return await self._run(compiled, recurring_vars, _remaining(loop, deadline), output, config.policy)
+
+    async def sandbox_async(self, source_code, config=None, recurring_vars=None, tenant=None,
+                            timeout=None, output=None):
+        """
+        Analyze then run source_code under one concurrency slot.
+        Returns (report, output, vars, result); when the policy is no_exec and
+        the analysis alerted, the code isn't run and the last three are None.
+        """
+        config = config or self.config
+        async with self._slot(tenant):
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + timeout if timeout is not None else None
+            report, compiled = await self._analyze(source_code, config, timeout)
+            if report["config_no_exec"] and report["alert"]:
+                return report, None, None, None
+            captured_output, captured_vars, result = await self._run(
+                compiled, recurring_vars, _remaining(loop, deadline), output, config.policy)
+            return report, captured_output, captured_vars, result
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        if self._threads is not self.executor:
+            self._threads.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,234 @@
+import collections
+import fnmatch
+import glob
+import os
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from .AnalysisManifest import file_hash
+from .AnalyzerConfig import AnalyzerConfig
+from .CodeAnalyzer import CodeAnalyzer
+
+# one analyzer per worker process, built once by _init_worker
+_analyzer = None
+
+
+def expand_paths(paths, pattern="*.py"):
+    """
+    Yield the files named by paths, which can be files, directories (searched
+    recursively for pattern) or globs. Each file is yielded once.
+    """
+    seen = set()
+    for path in paths:
+        if os.path.isdir(path):
+            found = _walk(path, pattern)
+        elif glob.has_magic(path):
+            found = sorted(glob.iglob(path, recursive=True))
+        else:
+            # missing files are passed on so they are reported like any other failure
+            found = [path]
+        for file in found:
+            if file not in seen and not os.path.isdir(file):
+                seen.add(file)
+                yield file
+
+
+def _walk(directory, pattern):
+    for root, dirs, files in os.walk(directory):
+        # stable order, and don't descend into hidden dirs or caches
+        dirs[:] = sorted(d for d in dirs if not d.startswith(".") and d != "__pycache__")
+        for name in sorted(files):
+            if fnmatch.fnmatch(name, pattern):
+                yield os.path.join(root, name)
+
+
+def _init_worker(config, detail):
+    global _analyzer
+    _analyzer = CodeAnalyzer(config, detail=detail)
+
+
+def analyze_path(analyzer, path):
+    """Analyze one file, failures are returned as an error record rather than raised"""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        report, _ = analyzer.analyze_code(data.decode("utf-8"), path)
+        return {"path": path, "hash": file_hash(data), "report": report}
+    except SyntaxError as e:
+        return {"path": path, "error": f"Syntax error: {e.msg}", "line": e.lineno, "offset": e.offset}
+    except Exception as e:
+        # RecursionError, MemoryError on huge generated files, unreadable files, ...
+        return {"path": path, "error": f"{type(e).__name__}: {e}"}
+
+
+def _analyze_chunk(paths):
+    return [analyze_path(_analyzer, path) for path in paths]
+
+
+def _finished(records):
+    future = Future()
+    future.set_result(records)
+    return future
+
+
+class BatchAnalyzer:
+    """
+    Analyze many files across a pool of processes.
+    Files are sent to workers in chunks to keep IPC overhead down, only the
+    reports come back (trees stay in the workers). Results are yielded as they
+    finish, either in input order or in completion order, and a file that fails
+    yields an error record instead of stopping the batch.
+    With a manifest (see AnalysisManifest) files unchanged since the last scan
+    under the same policy aren't analyzed again, their stored report is
+    yielded with "cached": True.
+    detail=False produces summary-only reports (see CodeAnalyzer), much smaller
+    to ship back from the workers and to write out.
+    """
+
+    def __init__(self, config=None, workers=None, chunksize=16, pattern="*.py", manifest=None, detail=True):
+        self.config = config or AnalyzerConfig()
+        self.workers = workers or os.cpu_count() or 1
+        self.chunksize = chunksize
+        self.pattern = pattern
+        self.manifest = manifest
+        self.detail = detail
+        self._executor = None
+        # stat taken at lookup time for files sent to analysis, recorded with their report
+        self._stats = {}
+
+    def _pool(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_init_worker, initargs=(self.config, self.detail))
+        return self._executor
+
+    def _chunks(self, paths):
+        """
+        Lists of paths still to analyze, files the manifest has a valid report
+        for come through in place as finished records.
+        """
+        chunk = []
+        todo = 0
+        fingerprint = self._fingerprint()
+        for path in expand_paths(paths, self.pattern):
+            if self.manifest is not None:
+                report, stat = self.manifest.lookup(path, fingerprint)
+                if report is not None:
+                    chunk.append({"path": path, "report": report, "cached": True})
+                else:
+                    self._stats[path] = stat
+                    chunk.append(path)
+                    todo += 1
+            else:
+                chunk.append(path)
+                todo += 1
+            # cached records are nearly free, let more of them ride along
+            if todo >= self.chunksize or len(chunk) >= self.chunksize * 64:
+                yield chunk
+                chunk = []
+                todo = 0
+        if chunk:
+            yield chunk
+
+    def _fingerprint(self):
+        # summary-only reports are stored apart from full ones
+        return self.config.fingerprint if self.detail else self.config.fingerprint + ":summary"
+
+    def _merge(self, chunk, records):
+        """Put fresh records in place of their paths and store them in the manifest"""
+        records = iter(records)
+        fingerprint = self._fingerprint()
+        for item in chunk:
+            if not isinstance(item, str):
+                yield item
+                continue
+            record = next(records)
+            stat = self._stats.pop(item, None)
+            if self.manifest is not None and "report" in record:
+                self.manifest.record(item, stat, record["hash"], fingerprint, record["report"])
+            yield record
+
+    def analyze(self, paths, ordered=True):
+        """
+        Yield {"path", "report"} or {"path", "error"} for every file under paths.
+        With ordered=False records come out as soon as their chunk is done.
+        """
+        try:
+            yield from self._analyze(paths, ordered)
+        finally:
+            if self.manifest is not None:
+                self.manifest.flush()
+
+    def _analyze(self, paths, ordered):
+        if self.workers == 1:
+            # no pool to pay for, handy for debugging and tiny batches
+            analyzer = CodeAnalyzer(self.config, detail=self.detail)
+            for chunk in self._chunks(paths):
+                todo = [item for item in chunk if isinstance(item, str)]
+                yield from self._merge(chunk, [analyze_path(analyzer, path) for path in todo])
+            return
+
+        chunks = self._chunks(paths)
+        # bounded number of chunks in flight so huge trees don't queue everything up front
+        window = self.workers * 4
+        # future -> (chunk, pool it went to)
+        pending = collections.OrderedDict()
+
+        def fill():
+            for chunk in chunks:
+                todo = [item for item in chunk if isinstance(item, str)]
+                if todo:
+                    pool = self._pool()
+                    pending[pool.submit(_analyze_chunk, todo)] = (chunk, pool)
+                else:
+                    pending[_finished([])] = (chunk, None)
+                if len(pending) >= window:
+                    break
+
+        fill()
+        while pending:
+            if ordered:
+                done = [next(iter(pending))]
+                wait(done)
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                chunk, pool = pending.pop(future)
+                todo = [item for item in chunk if isinstance(item, str)]
+                try:
+                    records = future.result()
+                except BrokenProcessPool:
+                    # a worker died (segfault, OOM kill) and took the pool and every
+                    # chunk in flight with it, retry this chunk one file at a time
+                    # so only the file that actually kills a worker is reported
+                    self._discard(pool)
+                    records = self._retry_alone(todo)
+                except Exception as e:
+                    records = [{"path": path, "error": f"{type(e).__name__}: {e}"} for path in todo]
+                yield from self._merge(chunk, records)
+            fill()
+
+    def _discard(self, pool):
+        if pool is self._executor:
+            pool.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _retry_alone(self, paths):
+        for path in paths:
+            pool = self._pool()
+            try:
+                yield from pool.submit(_analyze_chunk, [path]).result()
+            except BrokenProcessPool:
+                self._discard(pool)
+                yield {"path": path, "error": "worker process died"}
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,196 @@
+import hashlib
+import hmac
+import importlib.util
+import marshal
+import mmap
+import os
+import stat
+import tempfile
+import threading
+
+from .AnalysisRecords import plain_report
+
+MAGIC = importlib.util.MAGIC_NUMBER
+# entries are MAGIC + HMAC-SHA256 of the payload + marshalled (report, code)
+_DIGEST_SIZE = hashlib.sha256().digest_size
+_HEADER = len(MAGIC) + _DIGEST_SIZE
+_KEY_FILE = ".key"
+
+
+def _check_private(path, st):
+    """Refuse cache files other users could have written"""
+    if st.st_uid != os.getuid() or st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise PermissionError(f"{path} must be owned by the current user and not writable by others")
+
+
+class BytecodeCache:
+    """
+    Optional on-disk store of sanitized, compiled snippets that survives restarts.
+    Like __pycache__, entries are marshalled and tagged with the interpreter magic
+    number; each file holds (report, code object) for one
+    (source hash, policy fingerprint) key.
+    Writers go through a temp file and an atomic rename so concurrent workers
+    never see partial files. Total size is kept under max_bytes by dropping the
+    least recently used files.
+
+    A cached code object runs without being analyzed again, so entries are
+    signed: every file carries an HMAC of its payload under a secret key
+    (random per cache directory, kept in .key, or passed as key) and files
+    that don't verify are dropped unread. The directory must belong to the
+    current user and not be writable by others.
+    """
+    SUFFIX = ".sbxc"
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024, key=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        _check_private(directory, os.stat(directory))
+        self._key = key if key is not None else self._load_key()
+        self._lock = threading.Lock()
+        self._bytes = None  # lazily counted, other processes write here too
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    def _load_key(self):
+        """The directory's signing key, created on first use"""
+        path = os.path.join(self.directory, _KEY_FILE)
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            pass
+        else:
+            with os.fdopen(fd, "wb") as f:
+                f.write(os.urandom(32))
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            _check_private(path, st)
+            if st.st_mode & (stat.S_IRGRP | stat.S_IROTH):
+                raise PermissionError(f"{path} must not be readable by others")
+            key = f.read()
+        if len(key) < 16:
+            raise ValueError(f"{path} holds no usable key")
+        return key
+
+    def _sign(self, payload):
+        return hmac.new(self._key, payload, hashlib.sha256).digest()
+
+    def _path(self, key):
+        source_hash, fingerprint = key
+        return os.path.join(self.directory, f"{source_hash}-{fingerprint[:16]}.{MAGIC.hex()}{self.SUFFIX}")
+
+    def get(self, key):
+        """Return (report, code) for key from disk, or None"""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    if mm[:len(MAGIC)] != MAGIC:
+                        raise ValueError("bad magic number")
+                    with memoryview(mm) as view, view[_HEADER:] as payload:
+                        if not hmac.compare_digest(mm[len(MAGIC):_HEADER], self._sign(payload)):
+                            # not written with our key: never unmarshal it
+                            raise ValueError("bad signature")
+                        report, code = marshal.loads(payload)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (ValueError, EOFError, TypeError, OSError):
+            # truncated, corrupt or forged file (or an empty one, which can't be mapped)
+            self._remove(path)
+            self.misses += 1
+            return None
+
+        # bump mtime so eviction keeps hot entries
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return report, code
+
+    def put(self, key, report, code):
+        """Atomically write an entry, then evict if the store is over budget"""
+        try:
+            payload = marshal.dumps((plain_report(report), code))
+        except ValueError:
+            # report holds something marshal can't store, skip disk caching
+            return False
+        data = MAGIC + self._sign(payload) + payload
+        if len(data) > self.max_bytes:
+            return False
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-", suffix=self.SUFFIX)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            self._remove(tmp_path)
+            return False
+
+        with self._lock:
+            self.writes += 1
+            if self._bytes is None:
+                self._bytes = self._scan()[0]
+            else:
+                self._bytes += len(data)
+            if self._bytes > self.max_bytes:
+                self._evict()
+        return True
+
+    def _scan(self):
+        """Return (total bytes, [(mtime, size, path)]) for the entries on disk"""
+        total = 0
+        files = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith(self.SUFFIX) or entry.name.startswith(".tmp-"):
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                total += st.st_size
+                files.append((st.st_mtime, st.st_size, entry.path))
+        return total, files
+
+    def _evict(self):
+        # rescan, another process may have added or removed files
+        total, files = self._scan()
+        # leave some headroom so we don't rescan on every put
+        target = self.max_bytes * 0.9
+        files.sort()
+        for _, size, path in files:
+            if total <= target:
+                break
+            if self._remove(path):
+                self.evictions += 1
+            total -= size
+        self._bytes = total
+
+    def clear(self):
+        with self._lock:
+            for _, _, path in self._scan()[1]:
+                self._remove(path)
+            self._bytes = 0
+
+    def stats(self):
+        """Counters for monitoring"""
+        return {
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "evictions": self.evictions,
+        }
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.unlink(path)
+            return True
+        except OSError:
+            return False
@@ -6,31 +6,62 @@ import json
 import contextlib
 import io
 from .AnalyzerConfig import AnalyzerConfig
+from .Instrumentation import span
+from .ReportSink import JSONFileSink
+from .AnalysisRecords import CallRecord, LoopRecord, ConditionalRecord, TryRecord, ExceptRecord
+from . import Events
+
+
+def _dotted_name(node):
+    """Source text of a call target or exception type, skipping ast.unparse for the usual name / name.attr"""
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name):
+        return f"{node.value.id}.{node.attr}"
+    return ast.unparse(node)
+
+
+def _kept(records):
+    return records
+
+
+def _dicts(records):
+    return [record.to_dict() for record in records]
 
 
 class CodeAnalyzer(ast.NodeTransformer):
     """
     A comprehensive Python code analyzer using AST.
     Extracts various metrics and information from Python source code.
+    analyze_code is reentrant: each call works on its own context() and only
+    reads the analyzer's config, policy and events, so one analyzer can be
+    shared by any number of threads.
     """
     
-    def __init__(self, config=AnalyzerConfig()):
-        self.config=config
+    def __init__(self, config=None, events=None, detail=True):
+        # a config of its own, a default shared by every analyzer would be shared mutable state
+        self.config = config if config is not None else AnalyzerConfig()
+        # detail=False only counts calls, loops, conditionals etc. and reports the
+        # summary and metrics, for large batches where the per-node lists aren't needed
+        self.detail = detail
+        # structured alerts/debug info instead of prints, see Events
+        self.events = events or Events.default_stream
         self.reset()
-        # TODO: maybe a better way to hold these values but KISS for now
-        self.bad_functions = []
-        self.bad_imports = []
-        self.bad_statements = []
-        self.alert = False
-        self.alert_types = []
     
     def reset(self):
         """Reset all analysis data"""
+        # policy is immutable, per-analysis additions live in blocked_names
+        self.policy = self.config.policy
+        self.blocked_names = set()
         self.functions = []
         self.classes = []
         self.imports = []
         self.variables = set()
         self.function_calls = []
+        self.call_count = 0
+        self.loop_count = 0
+        self.conditional_count = 0
+        self.exception_count = 0
         self.complexity_score = 0
         self.line_count = 0
         self.docstrings = []
@@ -41,11 +72,25 @@ class CodeAnalyzer(ast.NodeTransformer):
         self.current_class = None
         self.current_function = None
         self.scope_stack = []
+        # context string of each enclosing scope, built once per scope instead of per record
+        self.context_stack = []
+        self.class_stack = []
+        self.complexity_stack = []
+        # TODO: maybe a better way to hold these values but KISS for now
+        # reset with the rest, a reused analyzer must not carry alerts over
+        self.bad_functions = []
+        self.bad_imports = []
+        self.bad_statements = []
+        self.alert = False
+        self.alert_types = []
 
     def check_complexity_score(self):
-        if self.complexity_score > self.config.allowed_complexity:
+        if self.complexity_score > self.policy.allowed_complexity:
             self.alert = True
             self.alert_types.append("Complexity")
+            if self.events.min_level <= Events.ALERT:
+                self.events.emit(Events.COMPLEXITY, Events.ALERT, score=self.complexity_score,
+                                 allowed=self.policy.allowed_complexity)
     
     def analyze_file(self, filepath: str) -> Dict[str, Any]:
         """Analyze a Python file and return comprehensive metrics"""
@@ -57,20 +102,51 @@ class CodeAnalyzer(ast.NodeTransformer):
         except Exception as e:
             return {"error": f"Failed to analyze {filepath}: {str(e)}"}
     
+    def context(self):
+        """
+        Fresh per-call analysis state: an analyzer of the same class sharing
+        this one's config, events and detail, with everything else reset.
+        """
+        context = object.__new__(type(self))
+        context.__dict__.update(self.__dict__)
+        context.reset()
+        return context
+
     def analyze_code(self, source_code: str, filename: str = "None") -> Dict[str, Any]:
         """
         Analyze Python source code and return comprehensive metrics
         TODO: also take in config for what is allowed 
         TODO: return sanitized code that has what is not allowed taken out
         """
+        return self.context().analyze_in_context(source_code, filename)
+
+    def analyze_records(self, source_code, filename="None"):
+        """
+        analyze_code, except that function_calls, loops, conditionals and
+        exceptions hold the AnalysisRecords as collected. No dict is built per
+        node unless the report is serialized (json_default) or plain_report()
+        asks for them, for callers that only read the flags and summary.
+        """
+        return self.context().analyze_in_context(source_code, filename, records=True)
+
+    def analyze_in_context(self, source_code, filename="None", records=False):
+        """analyze_code on this very instance, for a context() whose state the caller wants to read afterwards"""
         self.reset()
         
         # try:
-        tree = ast.parse(source_code, mode='exec')
-        self.line_count = len(source_code.splitlines())
-        self.visit(tree)
+        with span("parse") as s:
+            tree = ast.parse(source_code, mode='exec')
+            self.line_count = len(source_code.splitlines())
+            s.set(lines=self.line_count, chars=len(source_code))
+        with span("analyze") as s:
+            self.visit(tree)
+            if s.enabled:
+                s.set(nodes=sum(1 for _ in ast.walk(tree)), lines=self.line_count)
+        with span("report") as s:
+            results = self._compile_results(records)
+            s.set(alert=self.alert)
         
-        return self._compile_results(), tree
+        return results, tree
             
         # except SyntaxError as e:
         #     print(f"Syntax error: {str(e)}")
@@ -83,121 +159,116 @@ class CodeAnalyzer(ast.NodeTransformer):
         #     print(f"Analysis failed: {str(e)}")
         #     return {"error": f"Analysis failed: {str(e)}"}, None
     
-    # def visit_FunctionDef(self, node):
-    #     """Analyze function definitions"""
-    #     func_info = {
-    #         "name": node.name,
-    #         "line": node.lineno,
-    #         "args": [arg.arg for arg in node.args.args],
-    #         "returns": ast.unparse(node.returns) if node.returns else None,
-    #         "decorators": [ast.unparse(dec) for dec in node.decorator_list],
-    #         "docstring": ast.get_docstring(node),
-    #         "complexity": self._calculate_function_complexity(node),
-    #         "class": self.current_class
-    #     }
+    def visit_FunctionDef(self, node):
+        """Analyze function definitions"""
+        func_info = {
+            "name": node.name,
+            "line": node.lineno,
+            "args": [arg.arg for arg in node.args.args],
+            "returns": ast.unparse(node.returns) if node.returns else None,
+            "decorators": [ast.unparse(dec) for dec in node.decorator_list],
+            "docstring": ast.get_docstring(node),
+            "complexity": 1,
+            "class": self.current_class
+        }
+        self.functions.append(func_info)
+        if self.class_stack and self.scope_stack[-1].startswith("class:"):
+            self.class_stack[-1]["methods"].append(node.name)
 
-    #     # sand boxing logic
-    #     if node.name in self.config.blacklisted_functions:
-    #         # TODO: remove function from tree. 
-    #         # TODO: reassign function within the AST to a default func.
-    #         node.name = "this"
-    #     # elif node.name not in self.config.allowed_functions:
-    #     #     # need to work out logic between blacklist and allowed
-    #     #     node.name = "NOPE"
-    #     else:
-    #         self.functions.append(func_info)
+        # Track decorators
+        if self.detail:
+            for decorator in node.decorator_list:
+                self.decorators.append({
+                    "decorator": ast.unparse(decorator),
+                    "target": node.name,
+                    "line": decorator.lineno
+                })
         
-    #         # Track decorators
-    #         for decorator in node.decorator_list:
-    #             self.decorators.append({
-    #                 "decorator": ast.unparse(decorator),
-    #                 "target": node.name,
-    #                 "line": decorator.lineno
-    #             })
-            
-    #         # Track docstrings
-    #         if func_info["docstring"]:
-    #             self.docstrings.append({
-    #                 "type": "function",
-    #                 "name": node.name,
-    #                 "docstring": func_info["docstring"],
-    #                 "line": node.lineno
-    #             })
-            
-    #         old_function = self.current_function
-    #         self.current_function = node.name
-    #         self.scope_stack.append(f"function:{node.name}")
+        # Track docstrings
+        if self.detail and func_info["docstring"]:
+            self.docstrings.append({
+                "type": "function",
+                "name": node.name,
+                "docstring": func_info["docstring"],
+                "line": node.lineno
+            })
         
-    #     # TODO: work out continuing when function is taken out
+        old_function = self.current_function
+        self.current_function = node.name
+        self._enter_scope(f"function:{node.name}")
+        # decision points found while visiting the body land on top of this stack
+        self.complexity_stack.append(0)
 
-    #     self.current_function = old_function
-    #     self.scope_stack.pop()
+        self.generic_visit(node)
 
-    #     return self.generic_visit(node)
+        decisions = self.complexity_stack.pop()
+        func_info["complexity"] = 1 + decisions
+        # nested functions count towards their parents, like walking the whole subtree would
+        if self.complexity_stack:
+            self.complexity_stack[-1] += decisions
+        self.current_function = old_function
+        self._exit_scope()
+        return node
     
-    # def visit_AsyncFunctionDef(self, node):
-    #     """Handle async function definitions"""
-    #     self.visit_FunctionDef(node)  # Same analysis as regular functions
+    def visit_AsyncFunctionDef(self, node):
+        """Handle async function definitions"""
+        return self.visit_FunctionDef(node)  # Same analysis as regular functions
     
-    # def visit_ClassDef(self, node):
-    #     """Analyze class definitions"""
-    #     class_info = {
-    #         "name": node.name,
-    #         "line": node.lineno,
-    #         "bases": [ast.unparse(base) for base in node.bases],
-    #         "decorators": [ast.unparse(dec) for dec in node.decorator_list],
-    #         "docstring": ast.get_docstring(node),
-    #         "methods": []
-    #     }
+    def visit_ClassDef(self, node):
+        """Analyze class definitions"""
+        class_info = {
+            "name": node.name,
+            "line": node.lineno,
+            "bases": [ast.unparse(base) for base in node.bases],
+            "decorators": [ast.unparse(dec) for dec in node.decorator_list],
+            "docstring": ast.get_docstring(node),
+            "methods": []
+        }
         
-    #     self.classes.append(class_info)
+        self.classes.append(class_info)
         
-    #     # Track docstrings
-    #     if class_info["docstring"]:
-    #         self.docstrings.append({
-    #             "type": "class",
-    #             "name": node.name,
-    #             "docstring": class_info["docstring"],
-    #             "line": node.lineno
-    #         })
+        # Track docstrings
+        if self.detail and class_info["docstring"]:
+            self.docstrings.append({
+                "type": "class",
+                "name": node.name,
+                "docstring": class_info["docstring"],
+                "line": node.lineno
+            })
         
-    #     old_class = self.current_class
-    #     self.current_class = node.name
-    #     self.scope_stack.append(f"class:{node.name}")
+        old_class = self.current_class
+        self.current_class = node.name
+        self.class_stack.append(class_info)
+        self._enter_scope(f"class:{node.name}")
         
-    #     self.generic_visit(node)
+        self.generic_visit(node)
         
-    #     self.current_class = old_class
-    #     self.scope_stack.pop()
+        self.current_class = old_class
+        self.class_stack.pop()
+        self._exit_scope()
+        return node
+
+    def _add_decisions(self, count=1):
+        """Add decision points to the innermost function being visited"""
+        if self.complexity_stack:
+            self.complexity_stack[-1] += count
     
     def visit_Import(self, node):
         """Track import statements"""
         # TODO: when an import is taken out 
         # find all references OR create a std import to 
         # replace it with that just doesn't run
+        policy = self.policy
         for alias in node.names:
-            if self.config.allowed_imports:
+            if policy.allowed_imports:
                 # first check if there is a whitelist
-                if alias.name not in self.config.allowed_imports:
-                    self.config.blacklist.append(alias.asname) # WHY IS THIS - asname not name
-                    self.bad_imports.append(alias.name) 
-                    self.config.blacklist.extend("this")
-                    alias.name = "this"
-                    self.alert = True
-                    self.alert_types.append("Imports")
+                if alias.name not in policy.allowed_imports:
+                    self._block_import(alias, node)
                     
-            elif alias.name in self.config.blacklist_imports or alias.asname in self.config.blacklist_imports:
+            elif alias.name in policy.blacklist_imports or alias.asname in policy.blacklist_imports:
                 # TODO: take out import from tree
                 # replace import with this library
-                print(f"name: {alias.name} as: {alias.asname}")
-                self.config.blacklist.append(alias.asname)
-                self.bad_imports.append(alias.name) 
-                self.config.blacklist.extend("this")
-                alias.name = "this"
-                
-                self.alert = True
-                self.alert_types.append("Imports")
-
+                self._block_import(alias, node)
 
             else:
                 self.imports.append({
@@ -211,25 +282,14 @@ class CodeAnalyzer(ast.NodeTransformer):
     
     def visit_ImportFrom(self, node):
         """Track from...import statements"""
+        policy = self.policy
         for alias in node.names:
-            if self.config.allowed_imports:
-                if alias.name not in self.config.allowed_imports:
-                    self.config.blacklist.append(alias.asname)
-                    self.bad_imports.append(alias.name) 
-                    self.config.blacklist.extend("this")
-                    alias.name = "this"
-
-                    self.alert = True
-                    self.alert_types.append("Imports")
-            elif alias.name in self.config.blacklist_imports or alias.asname in self.config.blacklist_imports:
+            if policy.allowed_imports:
+                if alias.name not in policy.allowed_imports:
+                    self._block_import(alias, node)
+            elif alias.name in policy.blacklist_imports or alias.asname in policy.blacklist_imports:
                 alias.asname = alias.name
-                self.config.blacklist.append(alias.asname)
-                self.bad_imports.append(alias.name) 
-                self.config.blacklist.extend("this")
-                alias.name = "this"
-
-                self.alert = True
-                self.alert_types.append("Imports")
+                self._block_import(alias, node)
             
             self.imports.append({
                 "type": "from_import",
@@ -239,67 +299,77 @@ class CodeAnalyzer(ast.NodeTransformer):
                 "line": node.lineno
             })
         return self.generic_visit(node)
+
+    def _block_import(self, alias, node):
+        """Swap a disallowed import for `this` and block the names it binds for this analysis"""
+        if self.events.min_level <= Events.ALERT:
+            self.events.emit(Events.BLOCKED_IMPORT, Events.ALERT, line=node.lineno,
+                             module=getattr(node, "module", None), name=alias.name, alias=alias.asname)
+        # WHY IS THIS - asname not name
+        if alias.asname:
+            self.blocked_names.add(alias.asname)
+        self.blocked_names.add("this")
+        self.bad_imports.append(alias.name)
+        alias.name = "this"
+        self.alert = True
+        self.alert_types.append("Imports")
+
+    def _is_blocked(self, name):
+        """O(1) check against the compiled blacklist and the names blocked so far"""
+        return name in self.policy.blacklist or name in self.blocked_names
     
     def visit_Call(self, node):
         """Track function calls"""
+        events = self.events
         
         if isinstance(node.func, ast.Name):
-            print(f"Func name: {node.func.id}")
-            if self.config.allowed_functions:
-                if node.func.id not in self.config.allowed_functions:
+            if events.min_level <= Events.DEBUG:
+                events.emit(Events.CALL, Events.DEBUG, line=node.lineno, name=node.func.id)
+            if self.policy.allowed_functions:
+                if node.func.id not in self.policy.allowed_functions:
                         # TODO organize this
-                        self.alert = True
-                        self.alert_types.append("Function")
-                        return ast.copy_location(
-                            ast.Call(func=ast.Name(id="alertFunc", ctx=ast.Load()),
-                                    args=node.args, keywords=node.keywords),
-                            node
-                        )
-            elif node.func.id in self.config.blacklist: # and node.func.attr == self.target_func:
-                self.alert = True
-                self.alert_types.append("Function")
-                return ast.copy_location(
-                    ast.Call(func=ast.Name(id="alertFunc", ctx=ast.Load()),
-                                args=node.args, keywords=node.keywords),
-                    node
-                )
+                        return self._rewrite_call(node, node.func.id)
+            elif self._is_blocked(node.func.id): # and node.func.attr == self.target_func:
+                return self._rewrite_call(node, node.func.id)
         
         elif isinstance(node.func, ast.Attribute) and isinstance(node.func.value, ast.Name):
-            print(f"Visit Call: valueid:{node.func.value.id} attr:{node.func.attr} {node.func._attributes}")
-            if self.config.allowed_functions:
-                if node.func.value.id not in self.config.allowed_functions:
-                    self.alert = True
-                    self.alert_types.append("Function")
-                    return ast.copy_location(
-                        ast.Call(func=ast.Name(id="alertFunc", ctx=ast.Load()),
-                                args=node.args, keywords=node.keywords),
-                        node
-                    )
-            elif node.func.value.id in self.config.blacklist: # and node.func.attr == self.target_func:
-                self.alert = True
-                self.alert_types.append("Function")
-                return ast.copy_location(
-                    ast.Call(func=ast.Name(id="alertFunc", ctx=ast.Load()),
-                                args=node.args, keywords=node.keywords),
-                    node
-                )
+            if events.min_level <= Events.DEBUG:
+                events.emit(Events.CALL, Events.DEBUG, line=node.lineno, name=node.func.value.id, attr=node.func.attr)
+            if self.policy.allowed_functions:
+                if node.func.value.id not in self.policy.allowed_functions:
+                    return self._rewrite_call(node, node.func.value.id, node.func.attr)
+            elif self._is_blocked(node.func.value.id): # and node.func.attr == self.target_func:
+                return self._rewrite_call(node, node.func.value.id, node.func.attr)
 
+        self.call_count += 1
+        if not self.detail:
+            return self.generic_visit(node)
         try:
-            func_name = ast.unparse(node.func)
-            self.function_calls.append({
-                "function": func_name,
-                "line": node.lineno,
-                "args": len(node.args),
-                "kwargs": len(node.keywords),
-                "context": self._get_current_context()
-            })
+            self.function_calls.append(CallRecord(
+                _dotted_name(node.func), node.lineno, len(node.args), len(node.keywords),
+                self._get_current_context()))
         except:
             # TODO: which types of functions are complex?
             self.alert = True
             self.alert_types.append("Complex Function")
+            if events.min_level <= Events.WARNING:
+                events.emit(Events.COMPLEX_CALL, Events.WARNING, line=node.lineno)
             pass  # Skip complex calls that can't be unparsed
         
         return self.generic_visit(node)
+
+    def _rewrite_call(self, node, name, attr=None):
+        """Replace a disallowed call with a call to alertFunc keeping its arguments"""
+        self.alert = True
+        self.alert_types.append("Function")
+        if self.events.min_level <= Events.ALERT:
+            self.events.emit(Events.REWRITTEN_CALL, Events.ALERT, line=node.lineno, name=name, attr=attr)
+        # located like the call so the tree compiles without fix_missing_locations
+        return ast.copy_location(
+            ast.Call(func=ast.copy_location(ast.Name(id="alertFunc", ctx=ast.Load()), node.func),
+                        args=node.args, keywords=node.keywords),
+            node
+        )
     
     def visit_Name(self, node):
         """Track variable names"""
@@ -312,111 +382,118 @@ class CodeAnalyzer(ast.NodeTransformer):
     
     def visit_Attribute(self, node):
         # Handles things like requests.get, requests.post, etc.
-        if isinstance(node.value, ast.Name) and node.value.id in self.config.blacklist:
+        if isinstance(node.value, ast.Name) and self._is_blocked(node.value.id):
             self.alert = True
             self.alert_types.append("Function From Bad Import")
+            if self.events.min_level <= Events.ALERT:
+                self.events.emit(Events.BLOCKED_ATTRIBUTE, Events.ALERT, line=node.lineno,
+                                 name=node.value.id, attr=node.attr)
             node.value.id = 'this-attr'
         return self.generic_visit(node)
     
     def visit_For(self, node):
         """Track for loops"""
-        self.loops.append({
-            "type": "for",
-            "line": node.lineno,
-            "context": self._get_current_context()
-        })
+        self.loop_count += 1
+        if self.detail:
+            self.loops.append(LoopRecord("for", node.lineno, self._get_current_context()))
         self.complexity_score += 1
+        self._add_decisions()
         return self.generic_visit(node)
     
     def visit_While(self, node):
         """Track while loops"""
-        self.loops.append({
-            "type": "while",
-            "line": node.lineno,
-            "context": self._get_current_context()
-        })
+        self.loop_count += 1
+        if self.detail:
+            self.loops.append(LoopRecord("while", node.lineno, self._get_current_context()))
         self.complexity_score += 1
+        self._add_decisions()
         return self.generic_visit(node)
     
     def visit_If(self, node):
         """Track if statements"""
-        self.conditionals.append({
-            "type": "if",
-            "line": node.lineno,
-            "has_else": bool(node.orelse),
-            "context": self._get_current_context()
-        })
+        self.conditional_count += 1
+        if self.detail:
+            self.conditionals.append(ConditionalRecord(node.lineno, bool(node.orelse), self._get_current_context()))
         self.complexity_score += 1
+        self._add_decisions()
         return self.generic_visit(node)
     
     def visit_Try(self, node):
         """Track try-except blocks"""
-        self.exceptions.append({
-            "type": "try",
-            "line": node.lineno,
-            "handlers": len(node.handlers),
-            "has_finally": bool(node.finalbody),
-            "context": self._get_current_context()
-        })
+        self.exception_count += 1
+        if self.detail:
+            self.exceptions.append(TryRecord(
+                node.lineno, len(node.handlers), bool(node.finalbody), self._get_current_context()))
         self.complexity_score += 1
         return self.generic_visit(node)
     
     def visit_ExceptHandler(self, node):
         """Track exception handlers"""
-        exc_type = ast.unparse(node.type) if node.type else "Exception"
-        self.exceptions.append({
-            "type": "except",
-            "exception": exc_type,
-            "line": node.lineno,
-            "context": self._get_current_context()
-        })
+        self.exception_count += 1
+        if self.detail:
+            exc_type = _dotted_name(node.type) if node.type else "Exception"
+            self.exceptions.append(ExceptRecord(exc_type, node.lineno, self._get_current_context()))
+        self._add_decisions()
+        return self.generic_visit(node)
+
+    def visit_BoolOp(self, node):
+        """Each extra operand of and/or is another branch"""
+        self._add_decisions(len(node.values) - 1)
         return self.generic_visit(node)
     
-    def _calculate_function_complexity(self, func_node):
-        """Calculate cyclomatic complexity for a function"""
-        complexity = 1  # Base complexity
-        
-        for node in ast.walk(func_node):
-            if isinstance(node, (ast.If, ast.While, ast.For, ast.ExceptHandler)):
-                complexity += 1
-            elif isinstance(node, ast.BoolOp):
-                complexity += len(node.values) - 1
-        
-        return complexity
-    
+    def _enter_scope(self, scope):
+        self.scope_stack.append(scope)
+        parent = self.context_stack[-1] if self.context_stack else None
+        self.context_stack.append(sys.intern(f"{parent}::{scope}" if parent else scope))
+
+    def _exit_scope(self):
+        self.scope_stack.pop()
+        self.context_stack.pop()
+
     def _get_current_context(self):
         """Get the current scope context"""
-        return "::".join(self.scope_stack) if self.scope_stack else "global"
+        return self.context_stack[-1] if self.context_stack else "global"
     
-    def _compile_results(self):
+    def _compile_results(self, records=False):
         """Compile all analysis results into a comprehensive report"""
+        summary = {
+            "total_lines": self.line_count,
+            "functions": len(self.functions),
+            "classes": len(self.classes),
+            "imports": len(self.imports),
+            "variables": len(self.variables),
+            "function_calls": self.call_count,
+            "complexity_score": self.complexity_score,
+            "loops": self.loop_count,
+            "conditionals": self.conditional_count,
+            "exceptions": self.exception_count
+        }
+        if not self.detail:
+            return {
+                "summary": summary,
+                "metrics": self._calculate_metrics(),
+                "alert": self.alert,
+                "alert_types": self.alert_types,
+                "config_no_exec": self.policy.no_exec
+            }
+        # records are kept while walking the tree, analyze_code's report is the plain dict it always was
+        listed = _kept if records else _dicts
         return {
-            "summary": {
-                "total_lines": self.line_count,
-                "functions": len(self.functions),
-                "classes": len(self.classes),
-                "imports": len(self.imports),
-                "variables": len(self.variables),
-                "function_calls": len(self.function_calls),
-                "complexity_score": self.complexity_score,
-                "loops": len(self.loops),
-                "conditionals": len(self.conditionals),
-                "exceptions": len(self.exceptions)
-            },
+            "summary": summary,
             "functions": self.functions,
             "classes": self.classes,
             "imports": self.imports,
             "variables": sorted(list(self.variables)),
-            "function_calls": self.function_calls,
+            "function_calls": listed(self.function_calls),
             "decorators": self.decorators,
             "docstrings": self.docstrings,
-            "loops": self.loops,
-            "conditionals": self.conditionals,
-            "exceptions": self.exceptions,
+            "loops": listed(self.loops),
+            "conditionals": listed(self.conditionals),
+            "exceptions": listed(self.exceptions),
             "metrics": self._calculate_metrics(),
             "alert": self.alert,
             "alert_types": self.alert_types,
-            "config_no_exec": self.config.no_exec
+            "config_no_exec": self.policy.no_exec
         }
     
     def _calculate_metrics(self):
@@ -429,11 +506,11 @@ class CodeAnalyzer(ast.NodeTransformer):
             "average_function_complexity": sum(f["complexity"] for f in self.functions) / total_funcs if total_funcs > 0 else 0,
             "most_complex_function": max(self.functions, key=lambda f: f["complexity"]) if self.functions else None,
             "import_diversity": len(set(imp["module"] for imp in self.imports if imp["module"])),
-            "decorator_usage": len(self.decorators),
-            "exception_handling_ratio": len(self.exceptions) / self.line_count if self.line_count > 0 else 0
+            "decorator_usage": sum(len(f["decorators"]) for f in self.functions),
+            "exception_handling_ratio": self.exception_count / self.line_count if self.line_count > 0 else 0
         }
 
-    def pretty_print(self, results):
+    def pretty_print(self, results, output_file=None):
         if "error" in results:
             print(f"Error: {results['error']}")
             return
@@ -475,7 +552,7 @@ class CodeAnalyzer(ast.NodeTransformer):
                 print(f"  {cls['name']} (line {cls['line']})")
         
         # Save detailed results to JSON
-        output_file = sys.argv[1].replace('.py', '_analysis.json')
-        with open(output_file, 'w') as f:
-            json.dump(results, f, indent=2)
-        print(f"\nDetailed analysis saved to: {output_file}")
+        if output_file:
+            with JSONFileSink(output_file) as sink:
+                sink.write(results)
+            print(f"\nDetailed analysis saved to: {output_file}")
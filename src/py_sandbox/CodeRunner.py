@@ -1,63 +1,261 @@
-import io
-import contextlib
 import ast
+import contextlib
+import threading
 
-from .ResourceLimiter import ResourceLimiter
+from .ResourceLimiter import ResourceLimiter, StepLimitExceeded
+from .OutputCapture import OutputCapture, redirect_thread_stdout
+from .AnalysisCache import AnalysisCache
+from .CodeAnalyzer import CodeAnalyzer
+from .Instrumentation import span, profile_execution
+from .PreScreen import PreScreen
+from .SandboxNamespace import SandboxNamespace
+from .StepBudget import STEP_NAME, StepCounter, instrument
+from .RunAccounting import UsageMeter
 
-# TODO: sanitize this class as much as possible
+_NO_METER = contextlib.nullcontext()
 
-def create_alertFunc():
-    # When this is called something went wrong: an escaped happened
-    # TODO this function could have more logic around alerting
-    return ast.FunctionDef(
-        name="alertFunc",
-        args=ast.arguments(
-            posonlyargs=[],
-            args=[],
-            vararg=ast.arg(arg="args"),
-            kwonlyargs=[],
-            kw_defaults=[],
-            kwarg=ast.arg(arg="kwargs"),
-            defaults=[]
-        ),
-        body=[
-            ast.Expr(value=ast.Call(
-                func=ast.Name(id='print', ctx=ast.Load()),
-                args=[ast.Constant(value='AlertFuncCalled')],
-                keywords=[]
-            )),
-            ast.Return(value=ast.Constant(value='ALERT'))
-        ],
-        decorator_list=[]
-    )
+# TODO: sanitize this class as much as possible
 
 class CodeRunner:
 
-    def __init__(self):
-        pass
+    def __init__(self, cache=None, bytecode_cache=None, limiter=None, profile=None, prescreen=False,
+                 policy=None, accounting=None, ledger=None):
+        # optional AnalysisCache shared between runners
+        self.cache = cache
+        # optional BytecodeCache so cold runners can skip analysis after a restart
+        self.bytecode_cache = bytecode_cache
+        # budgets applied only around the exec of untrusted code
+        self.limiter = limiter or ResourceLimiter()
+        # opt-in "cprofile" or "tracemalloc" around the untrusted exec, see last_profile
+        self.profile = profile
+        # last_profile, last_steps and last_usage are per thread, runners are shared
+        # by daemon, scheduler and executor threads
+        self._last = threading.local()
+        # let prepare() compile snippets that can't touch the policy without analyzing them
+        self.prescreen = prescreen
+        # policy whose SandboxNamespace (restricted builtins and imports) code runs in,
+        # None runs with the real builtins and relies on the analyzer's rewriting alone
+        self.policy = policy
+        # True measures every run (see run_accounted and last_usage), "tracemalloc" also
+        # traces the peak memory; records go into the optional UsageLedger too
+        self.accounting = accounting
+        self.ledger = ledger
+
+    @property
+    def last_profile(self):
+        """Profile summary of this thread's last run, with profile on"""
+        return getattr(self._last, "profile", None)
+
+    @property
+    def last_steps(self):
+        """Steps this thread's last run used, None without a step budget"""
+        return getattr(self._last, "steps", None)
 
-    def run_code(self, code_string):
-        output_buffer = io.StringIO()
+    @property
+    def last_usage(self):
+        """RunUsage of this thread's last accounted run"""
+        return getattr(self._last, "usage", None)
+
+    def run_code(self, code_string, output=None):
+        output_buffer = output or self.output_capture()
         captured_vars = {}
+        namespace = SandboxNamespace.for_policy(self.policy).globals()
         # Redirect stdout to the buffer while executing code
-        with contextlib.redirect_stdout(output_buffer):
-            exec(code_string , {}, captured_vars)
-        captured_output = output_buffer.getvalue()
-        output_buffer.close()
+        try:
+            with redirect_thread_stdout(output_buffer), self.limiter.limit():
+                exec(code_string , namespace, captured_vars)
+            captured_output = output_buffer.getvalue()
+        finally:
+            output_buffer.close()
         return captured_output, captured_vars
-    
-    def run_tree(self, code_tree, recurring_vars={}):
-        output_buffer = io.StringIO()
-        # captured_vars = {}
-        code_tree.body.insert(0, create_alertFunc())
-        ast.fix_missing_locations(code_tree)
-        # print(ast.dump(code_tree))
-        # print(f"GLOBALS: {globals_dict}")
 
-        with contextlib.redirect_stdout(output_buffer):
+    def compile_tree(self, code_tree):
+        """
+        Compile a sanitized tree, alertFunc comes from the SandboxNamespace at run time.
+        With a step budget a copy of the tree is instrumented and compiled,
+        code_tree itself isn't changed by that.
+        """
+        with span("compile") as s:
+            if self.limiter.max_steps:
+                code_tree = instrument(code_tree)
+                s.set(steps=True)
+            # trees built or edited by callers may lack line numbers
+            ast.fix_missing_locations(code_tree)
             compiled = compile(code_tree, '<string>', 'exec')
-            result = exec(compiled, {}, recurring_vars)
-        
-        captured_output = output_buffer.getvalue()
-        output_buffer.close()
+            s.set(statements=len(code_tree.body))
+        return compiled
+
+    def cache_key(self, source_code, policy):
+        """AnalysisCache / BytecodeCache key of what prepare() makes of source_code"""
+        # instrumented code must not be served to runners without a step budget and back
+        return AnalysisCache.key(source_code, policy, "steps" if self.limiter.max_steps else None)
+
+    def prepare(self, source_code, config, analyzer=None):
+        """
+        Analyze and compile source_code under config.
+        Returns (report, code object); with a cache, repeated snippets skip
+        parse, transform and compile entirely. The in-memory cache is checked
+        first, then the on-disk bytecode cache.
+        With prescreen on, snippets that PreScreen finds clean are compiled
+        straight from source and get a minimal report (alert, alert_types,
+        config_no_exec, prescreened) instead of the full analysis.
+        analyzer is a CodeAnalyzer for config to reuse instead of building one.
+        The report comes from analyze_records: its per-node lists hold records,
+        json_default or plain_report() turn them into dicts.
+        """
+        with span("prepare") as s:
+            key = None
+            if self.cache is not None or self.bytecode_cache is not None:
+                key = self.cache_key(source_code, config.policy)
+                hit = self.lookup(key)
+                if hit is not None:
+                    s.set(cache=hit[2])
+                    return hit[0], hit[1]
+
+            s.set(cache="miss")
+            if self.prescreen and PreScreen.for_policy(config.policy).is_clean(source_code):
+                s.set(prescreen="clean")
+                report = {"alert": False, "alert_types": [], "config_no_exec": config.policy.no_exec,
+                          "prescreened": True}
+                if self.limiter.max_steps:
+                    compiled = self.compile_tree(ast.parse(source_code))
+                else:
+                    with span("compile"):
+                        compiled = compile(source_code, '<string>', 'exec')
+            else:
+                report, tree = (analyzer or CodeAnalyzer(config)).analyze_records(source_code)
+                compiled = self.compile_tree(tree)
+            self.store(key, report, compiled)
+            return report, compiled
+
+    def lookup(self, key):
+        """(report, code object, "memory" or "disk") for a cache_key from the caches, None on a miss"""
+        if self.cache is not None:
+            entry = self.cache.get(key)
+            if entry is not None:
+                return entry.report, entry.code, "memory"
+        if self.bytecode_cache is not None:
+            stored = self.bytecode_cache.get(key)
+            if stored is not None:
+                report, compiled = stored
+                if self.cache is not None:
+                    self.cache.put(key, report, compiled)
+                return report, compiled, "disk"
+        return None
+
+    def store(self, key, report, compiled):
+        """Put what prepare() made of a snippet into the caches the runner has"""
+        if self.cache is not None:
+            self.cache.put(key, report, compiled)
+        if self.bytecode_cache is not None:
+            self.bytecode_cache.put(key, report, compiled)
+
+    def output_capture(self, callback=None, keep=True):
+        """Bounded stdout sink for one run, pass it to run_compiled to stream output"""
+        return OutputCapture(
+            max_bytes=self.limiter.output_bytes,
+            on_overflow=self.limiter.output_overflow,
+            callback=callback,
+            keep=keep,
+        )
+
+    def run_compiled(self, compiled, recurring_vars=None, output=None, policy=None, sandbox_globals=None):
+        """
+        Execute an already compiled code object.
+        output is an optional OutputCapture to stream chunks while the code runs,
+        it is closed when the run ends. policy overrides the runner's policy for
+        this run's namespace.
+        sandbox_globals is a globals dict to run in (see SandboxSession) instead
+        of fresh globals from the policy's SandboxNamespace, without
+        recurring_vars the code runs in it like a module.
+        """
+        if self.accounting:
+            return self.run_accounted(compiled, recurring_vars, output, policy, sandbox_globals)[:3]
+        return self._run(compiled, recurring_vars, output, policy, sandbox_globals, None)
+
+    def run_accounted(self, compiled, recurring_vars=None, output=None, policy=None, sandbox_globals=None,
+                      alerts=0, session=None):
+        """
+        run_compiled that also returns what the run cost: (output, vars, result, RunUsage).
+        alerts is the analysis' alert count to put on the record, session the
+        key the ledger totals it under. A failed run still gets its record, on
+        the exception's usage attribute.
+        """
+        policy = policy or self.policy
+        if output is None:
+            output = self.output_capture()
+        meter = UsageMeter(trace_memory=self.accounting == "tracemalloc")
+        try:
+            outcome = self._run(compiled, recurring_vars, output, policy, sandbox_globals, meter)
+        except BaseException as e:
+            usage = self._account(meter, policy, type(e).__name__, output, alerts, session)
+            try:
+                e.usage = usage
+            except AttributeError:
+                pass
+            raise
+        return outcome + (self._account(meter, policy, "ok", output, alerts, session),)
+
+    def _account(self, meter, policy, status, output, alerts, session):
+        usage = meter.usage(policy.fingerprint if policy is not None else None, status, output.bytes_written, alerts)
+        self._last.usage = usage
+        if self.ledger is not None:
+            self.ledger.add(usage, session)
+        return usage
+
+    def _run(self, compiled, recurring_vars, output, policy, sandbox_globals, meter):
+        if sandbox_globals is None:
+            sandbox_globals = SandboxNamespace.for_policy(policy or self.policy).globals()
+            if recurring_vars is None:
+                recurring_vars = {}
+        elif recurring_vars is None:
+            recurring_vars = sandbox_globals
+        if output is None:
+            output = self.output_capture()
+        try:
+            with span("exec") as s:
+                if self.profile:
+                    profile = self._last.profile = {}
+                    with profile_execution(self.profile, profile):
+                        result = self._exec(compiled, sandbox_globals, recurring_vars, output, meter)
+                    s.set(profile=profile)
+                else:
+                    result = self._exec(compiled, sandbox_globals, recurring_vars, output, meter)
+                s.set(output_bytes=output.bytes_written, steps=self.last_steps)
+            captured_output = output.getvalue()
+        finally:
+            output.close()
         return captured_output, recurring_vars, result
+
+    def _exec(self, compiled, sandbox_globals, recurring_vars, output, meter=None):
+        # the globals are set up by the caller, outside the limits, they aren't the snippet's cost
+        # instrumented code always finds a counter, an unbounded one without max_steps
+        counter = StepCounter(self.limiter.max_steps)
+        sandbox_globals[STEP_NAME] = counter.step
+        try:
+            with redirect_thread_stdout(output), self.limiter.limit(), meter or _NO_METER:
+                result = exec(compiled, sandbox_globals, recurring_vars)
+        except Exception as e:
+            # the spent counter raises StopIteration (RuntimeError out of a generator),
+            # whatever the snippet turned that into, the budget is why it stopped
+            if counter.exhausted:
+                raise StepLimitExceeded(f"step limit of {counter.limit} exceeded") from e
+            raise
+        finally:
+            self._last.steps = counter.used
+            if meter is not None:
+                meter.steps = counter.used
+        if counter.exhausted:
+            # the snippet swallowed the StopIteration, the budget is still spent
+            raise StepLimitExceeded(f"step limit of {counter.limit} exceeded")
+        if counter.limit and (sandbox_globals.get(STEP_NAME) is not counter.step
+                              or (recurring_vars is not None and STEP_NAME in recurring_vars)):
+            # rebound through a name the instrumenter couldn't see, nothing it ran was counted
+            raise StepLimitExceeded("step counter was tampered with")
+        return result
+    
+    def run_tree(self, code_tree, recurring_vars=None, output=None, policy=None):
+        # print(ast.dump(code_tree))
+        # print(f"GLOBALS: {globals_dict}")
+        compiled = self.compile_tree(code_tree)
+        return self.run_compiled(compiled, recurring_vars, output, policy)
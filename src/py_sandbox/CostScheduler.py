@@ -0,0 +1,243 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+
+from .AnalysisCache import AnalysisCache
+from .AnalyzerConfig import AnalyzerConfig
+from .CodeRunner import CodeRunner
+
+# starting weights (seconds per unit) for base, lines, loops, calls, complexity,
+# rough figures for plain CPython until measurements come in
+_PRIOR = (1e-4, 2e-5, 1e-3, 5e-5, 1e-4)
+
+
+class JobRejected(Exception):
+    """The scheduler refused a job, it was too expensive or the queue was full"""
+
+
+def static_features(report, source_code):
+    """
+    Cost signals of a snippet: (1, lines, loops, calls, complexity).
+    Summary-less reports (prescreened snippets) get lexical estimates instead.
+    """
+    summary = report.get("summary")
+    if summary is not None:
+        return (1.0, summary["total_lines"], summary["loops"], summary["function_calls"],
+                summary["complexity_score"])
+    loops = source_code.count("for ") + source_code.count("while ")
+    return (1.0, source_code.count("\n") + 1, loops, source_code.count("("), loops)
+
+
+class CostModel:
+    """
+    Predicts a snippet's run time in seconds from its static features.
+    A linear model whose weights are nudged towards every measured run
+    (normalized LMS, weights kept non-negative), plus an exact history per
+    (source, policy) since REPL and agent traffic repeats itself a lot.
+    """
+
+    def __init__(self, weights=_PRIOR, learning_rate=0.05, history=4096, smoothing=0.3):
+        self.weights = list(weights)
+        self.learning_rate = learning_rate
+        self.smoothing = smoothing
+        self.max_history = history
+        self._history = OrderedDict()
+        self._lock = threading.Lock()
+        self.observed = 0
+
+    def predict(self, features, key=None):
+        if key is not None:
+            seconds = self._history.get(key)
+            if seconds is not None:
+                return seconds
+        return sum(w * x for w, x in zip(self.weights, features))
+
+    def observe(self, features, key, seconds):
+        """Learn from one measured run"""
+        with self._lock:
+            self.observed += 1
+            error = seconds - sum(w * x for w, x in zip(self.weights, features))
+            norm = sum(x * x for x in features)
+            step = self.learning_rate * error / norm
+            self.weights = [max(w + step * x, 0.0) for w, x in zip(self.weights, features)]
+            if key is not None:
+                previous = self._history.pop(key, None)
+                if previous is not None:
+                    seconds = previous + self.smoothing * (seconds - previous)
+                self._history[key] = seconds
+                if len(self._history) > self.max_history:
+                    self._history.popitem(last=False)
+
+
+class _ScheduledJob:
+    __slots__ = ("report", "compiled", "policy", "recurring_vars", "features", "key", "predicted",
+                 "future", "submitted")
+
+    def __init__(self, report, compiled, policy, recurring_vars, features, key, predicted):
+        self.report = report
+        self.compiled = compiled
+        self.policy = policy
+        self.recurring_vars = recurring_vars
+        self.features = features
+        self.key = key
+        self.predicted = predicted
+        self.future = Future()
+        self.submitted = time.perf_counter()
+
+
+class CostScheduler:
+    """
+    Job queue in front of CodeRunner (or a WorkerPool) ordered by predicted cost.
+    Snippets are analyzed on submit, the analyzer's loops, calls, lines and
+    complexity score give a predicted run time, and the cheapest job goes
+    first. Waiting ages a job: every second in the queue takes `aging` seconds
+    off its predicted cost, so heavy jobs still get their turn.
+
+    Admission, in predicted seconds:
+    - reject_above: jobs predicted to take longer are refused outright.
+    - max_queued_seconds: the queue's total predicted work. A job that would
+      go over it is refused, unless it is predicted at defer_above or more,
+      then it is parked until the queue is down to half and admitted then
+      (at most max_deferred parked jobs).
+    Measured run times are fed back into the CostModel.
+    """
+
+    def __init__(self, runner=None, config=None, pool=None, workers=1, model=None, aging=0.5,
+                 reject_above=None, max_queued_seconds=None, defer_above=None, max_deferred=1000):
+        self.runner = runner or CodeRunner(cache=AnalysisCache())
+        self.config = config or AnalyzerConfig()
+        # optional WorkerPool, jobs then run in its processes instead of on the scheduler's threads
+        self.pool = pool
+        self.model = model or CostModel()
+        self.aging = aging
+        self.reject_above = reject_above
+        self.max_queued_seconds = max_queued_seconds
+        self.defer_above = defer_above
+        self.max_deferred = max_deferred
+        self._queue = []
+        self._deferred = deque()
+        self._order = itertools.count()
+        self._ready = threading.Condition()
+        self._closed = False
+        self.queued_seconds = 0.0
+        self.admitted = 0
+        self.deferred = 0
+        self.rejected = 0
+        self.completed = 0
+        self._threads = [threading.Thread(target=self._work, daemon=True) for _ in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, source_code, config=None, recurring_vars=None):
+        """
+        Analyze source_code and queue it, returns a Future resolving to
+        (report, output, vars, result) like AsyncSandbox.sandbox_async.
+        Raises JobRejected when admission control refuses it.
+        """
+        if self._closed:
+            raise RuntimeError("CostScheduler is closed")
+        config = config or self.config
+        report, compiled = self.runner.prepare(source_code, config)
+        features = static_features(report, source_code)
+        key = AnalysisCache.key(source_code, config.policy)
+        job = _ScheduledJob(report, compiled, config.policy, recurring_vars, features, key,
+                            self.model.predict(features, key))
+
+        if report["config_no_exec"] and report["alert"]:
+            # nothing to run, don't make it queue
+            job.future.set_result((report, None, None, None))
+            return job.future
+        with self._ready:
+            if self.reject_above is not None and job.predicted > self.reject_above:
+                self.rejected += 1
+                raise JobRejected(f"predicted {job.predicted:.3f}s is over the {self.reject_above}s limit")
+            if self.max_queued_seconds is None or self.queued_seconds + job.predicted <= self.max_queued_seconds:
+                self._enqueue(job)
+            elif self.defer_above is not None and job.predicted >= self.defer_above \
+                    and len(self._deferred) < self.max_deferred:
+                self._deferred.append(job)
+                self.deferred += 1
+            else:
+                self.rejected += 1
+                raise JobRejected(f"queue is full ({self.queued_seconds:.3f}s of predicted work)")
+        return job.future
+
+    def run(self, source_code, config=None, recurring_vars=None):
+        """Blocking version of submit"""
+        return self.submit(source_code, config, recurring_vars).result()
+
+    def _enqueue(self, job):
+        # predicted - aging * waited orders jobs the same way at any moment as this fixed key
+        heapq.heappush(self._queue, (job.predicted + self.aging * job.submitted, next(self._order), job))
+        self.queued_seconds += job.predicted
+        self.admitted += 1
+        self._ready.notify()
+
+    def _next(self):
+        with self._ready:
+            while True:
+                if self._deferred and (not self._queue or self.max_queued_seconds is None
+                                       or self.queued_seconds <= self.max_queued_seconds / 2):
+                    self._enqueue(self._deferred.popleft())
+                if self._queue:
+                    job = heapq.heappop(self._queue)[2]
+                    self.queued_seconds = max(self.queued_seconds - job.predicted, 0.0)
+                    return job
+                if self._closed:
+                    return None
+                self._ready.wait()
+
+    def _work(self):
+        while True:
+            job = self._next()
+            if job is None:
+                return
+            if not job.future.set_running_or_notify_cancel():
+                continue
+            started = time.perf_counter()
+            try:
+                if self.pool is not None:
+                    outcome = self.pool.run(job.compiled, job.recurring_vars, policy=job.policy)
+                else:
+                    outcome = self.runner.run_compiled(job.compiled, job.recurring_vars, policy=job.policy)
+            except BaseException as e:
+                # budget overruns are run times too, the model should know about them
+                self.model.observe(job.features, job.key, time.perf_counter() - started)
+                job.future.set_exception(e)
+            else:
+                self.model.observe(job.features, job.key, time.perf_counter() - started)
+                job.future.set_result((job.report,) + tuple(outcome))
+            with self._ready:
+                self.completed += 1
+
+    def stats(self):
+        with self._ready:
+            return {
+                "queued": len(self._queue),
+                "queued_seconds": self.queued_seconds,
+                "parked": len(self._deferred),
+                "admitted": self.admitted,
+                "deferred": self.deferred,
+                "rejected": self.rejected,
+                "completed": self.completed,
+                "observed": self.model.observed,
+            }
+
+    def close(self):
+        """Stop accepting jobs, finish the queued and parked ones and stop the threads"""
+        with self._ready:
+            if self._closed:
+                return
+            self._closed = True
+            self._ready.notify_all()
+        for thread in self._threads:
+            thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,104 @@
+import logging
+import threading
+
+# Levels, same spacing as the logging module so they map over directly
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ALERT = 40
+LEVEL_NAMES = {DEBUG: "debug", INFO: "info", WARNING: "warning", ALERT: "alert"}
+_LOGGING_LEVELS = {DEBUG: logging.DEBUG, INFO: logging.INFO, WARNING: logging.WARNING, ALERT: logging.ERROR}
+
+# Event types
+CALL = "call"
+BLOCKED_IMPORT = "blocked-import"
+REWRITTEN_CALL = "rewritten-call"
+BLOCKED_ATTRIBUTE = "blocked-attribute"
+COMPLEX_CALL = "complex-call"
+COMPLEXITY = "complexity"
+CONFIG_LOADED = "config-loaded"
+# emitted while sandboxed code runs, by SandboxNamespace stubs
+RUNTIME_BLOCKED = "runtime-blocked"
+
+_DISABLED = float("inf")
+
+
+class Event:
+    """One structured analyzer event"""
+    __slots__ = ("type", "level", "line", "data")
+
+    def __init__(self, type, level, line=None, data=None):
+        self.type = type
+        self.level = level
+        self.line = line
+        self.data = data or {}
+
+    def to_dict(self):
+        return {"type": self.type, "level": LEVEL_NAMES.get(self.level, self.level), "line": self.line, **self.data}
+
+    def __repr__(self):
+        return f"Event({self.type!r}, {LEVEL_NAMES.get(self.level, self.level)}, line={self.line}, {self.data})"
+
+
+class _Subscriber:
+    __slots__ = ("callback", "level", "types")
+
+    def __init__(self, callback, level, types):
+        self.callback = callback
+        self.level = level
+        self.types = frozenset(types) if types else None
+
+
+class EventStream:
+    """
+    Fan-out of analyzer events to subscribers filtered by level and type.
+    Emitters check `stream.min_level <= level` before building anything, so a
+    stream without (interested) subscribers costs a single comparison.
+    """
+
+    def __init__(self):
+        self._subscribers = []
+        self.min_level = _DISABLED
+        # emit() reads the list without locking, changes swap in a new one
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback, level=INFO, types=None):
+        """callback(event) for events at or above level, optionally only of the given types"""
+        subscriber = _Subscriber(callback, level, types)
+        with self._lock:
+            self._subscribers = self._subscribers + [subscriber]
+            self._update()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers = [s for s in self._subscribers if s is not subscriber]
+            self._update()
+
+    def _update(self):
+        self.min_level = min((s.level for s in self._subscribers), default=_DISABLED)
+
+    def enabled_for(self, level):
+        return self.min_level <= level
+
+    def emit(self, type, level, line=None, **data):
+        if self.min_level > level:
+            return
+        event = None
+        for subscriber in self._subscribers:
+            if level < subscriber.level or (subscriber.types is not None and type not in subscriber.types):
+                continue
+            if event is None:
+                event = Event(type, level, line, data)
+            subscriber.callback(event)
+
+
+def log_events(logger, stream=None, level=INFO, types=None):
+    """Forward events to a logging.Logger, e.g. one wired to a monitoring handler"""
+    def forward(event):
+        logger.log(_LOGGING_LEVELS.get(event.level, logging.INFO), "%s", event.type, extra={"sandbox_event": event.to_dict()})
+    return (stream or default_stream).subscribe(forward, level, types)
+
+
+# used by analyzers and configs that aren't given their own stream
+default_stream = EventStream()
@@ -0,0 +1,138 @@
+import cProfile
+import contextlib
+import io
+import pstats
+import time
+import tracemalloc
+
+# Called with every finished Span. Empty means instrumentation is off and
+# span() hands back a shared no-op object.
+_hooks = []
+
+
+def add_hook(hook):
+    """Register hook(span), called when each pipeline phase finishes"""
+    if hook not in _hooks:
+        _hooks.append(hook)
+    return hook
+
+
+def remove_hook(hook):
+    if hook in _hooks:
+        _hooks.remove(hook)
+
+
+class Span:
+    """Timing of one phase (parse, analyze, report, compile, exec, prepare) plus counters"""
+    __slots__ = ("phase", "attrs", "start_ns", "end_ns")
+    enabled = True
+
+    def __init__(self, phase, attrs):
+        self.phase = phase
+        self.attrs = attrs
+        self.start_ns = 0
+        self.end_ns = 0
+
+    @property
+    def duration_ns(self):
+        return self.end_ns - self.start_ns
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.perf_counter_ns()
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        for hook in tuple(_hooks):
+            try:
+                hook(self)
+            except Exception:
+                # a broken hook must not break the sandbox
+                pass
+        return False
+
+    def __repr__(self):
+        return f"Span({self.phase!r}, {self.duration_ns / 1000:.1f}us, {self.attrs})"
+
+
+class _NullSpan:
+    """Stand-in when no hooks are registered, every call is a no-op"""
+    __slots__ = ()
+    enabled = False
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(phase, **attrs):
+    """Context manager timing a phase, only allocates anything when hooks are registered"""
+    if not _hooks:
+        return _NULL_SPAN
+    return Span(phase, attrs)
+
+
+@contextlib.contextmanager
+def profile_execution(mode, summary, limit=20):
+    """
+    Profile the block with "cprofile" or "tracemalloc" and fill summary (a dict)
+    once it ends. Meant to wrap only the untrusted exec.
+    """
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield summary
+        finally:
+            profiler.disable()
+            stream = io.StringIO()
+            stats = pstats.Stats(profiler, stream=stream)
+            summary["mode"] = "cprofile"
+            summary["total_calls"] = stats.total_calls
+            summary["total_time"] = stats.total_tt
+            summary["functions"] = [
+                {
+                    "function": f"{filename}:{line}({name})",
+                    "calls": calls,
+                    "tottime": tottime,
+                    "cumtime": cumtime,
+                }
+                for (filename, line, name), (_, calls, tottime, cumtime, _) in
+                sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+            ]
+    elif mode == "tracemalloc":
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        start_snapshot = tracemalloc.take_snapshot()
+        try:
+            yield summary
+        finally:
+            current, peak = tracemalloc.get_traced_memory()
+            stats = tracemalloc.take_snapshot().compare_to(start_snapshot, "lineno")
+            if started:
+                tracemalloc.stop()
+            summary["mode"] = "tracemalloc"
+            summary["peak_bytes"] = peak - before
+            summary["net_bytes"] = current - before
+            summary["top_allocations"] = [
+                {"location": str(stat.traceback), "size_diff": stat.size_diff, "count_diff": stat.count_diff}
+                for stat in stats[:limit]
+            ]
+    else:
+        raise ValueError(f"unknown profile mode {mode!r}, expected 'cprofile' or 'tracemalloc'")
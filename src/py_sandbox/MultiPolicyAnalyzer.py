@@ -0,0 +1,271 @@
+import ast
+import copy
+import sys
+
+from .CodeAnalyzer import CodeAnalyzer
+from .Policy import Policy
+
+_EMPTY = frozenset()
+
+
+class _Unrestricted:
+    """Config stand-in whose policy allows everything, so the shared pass rewrites nothing"""
+    policy = Policy(
+        allowed_imports=_EMPTY, blacklist_imports=_EMPTY, allowed_functions=_EMPTY,
+        blacklisted_functions=_EMPTY, allowed_statements=_EMPTY, blacklist_statements=_EMPTY,
+        blacklist=_EMPTY, allowed_complexity=sys.maxsize, no_exec=False, fingerprint="unrestricted",
+    )
+
+
+class _Site:
+    """A node some policy might rewrite, in the order CodeAnalyzer would visit it"""
+    __slots__ = ("kind", "node", "name", "asname", "is_from", "parent_call", "ancestors")
+
+    def __init__(self, kind, node, name, asname, is_from, parent_call, ancestors):
+        self.kind = kind
+        self.node = node
+        self.name = name
+        self.asname = asname
+        self.is_from = is_from
+        # index of the closest enclosing call site, its rewrite hides this site
+        self.parent_call = parent_call
+        self.ancestors = ancestors
+
+
+class _SiteCollector(CodeAnalyzer):
+    """
+    Policy-free CodeAnalyzer pass that also records every import alias, call
+    and attribute a policy could act on, plus the path of nodes leading to it.
+    """
+
+    def reset(self):
+        super().reset()
+        self.sites = []
+        self._path = []
+        self._calls = []
+
+    def visit(self, node):
+        self._path.append(node)
+        try:
+            return super().visit(node)
+        finally:
+            self._path.pop()
+
+    def _site(self, kind, node, name, asname=None, is_from=False):
+        self.sites.append(_Site(kind, node, name, asname, is_from,
+                                self._calls[-1] if self._calls else None, tuple(self._path)))
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            self._site("import", alias, alias.name, alias.asname)
+        return super().visit_Import(node)
+
+    def visit_ImportFrom(self, node):
+        for alias in node.names:
+            self._site("import", alias, alias.name, alias.asname, is_from=True)
+        return super().visit_ImportFrom(node)
+
+    def visit_Call(self, node):
+        func = node.func
+        if isinstance(func, ast.Name):
+            name = func.id
+        elif isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name):
+            name = func.value.id
+        else:
+            return super().visit_Call(node)
+        self._site("call", node, name)
+        self._calls.append(len(self.sites) - 1)
+        try:
+            return super().visit_Call(node)
+        finally:
+            self._calls.pop()
+
+    def visit_Attribute(self, node):
+        if isinstance(node.value, ast.Name):
+            self._site("attribute", node.value, node.value.id)
+        return super().visit_Attribute(node)
+
+
+class PolicyVerdict:
+    """
+    Outcome of one policy: alerts like a CodeAnalyzer report, and the rewritten
+    tree. The tree is only built when read, and only copied at all when the
+    policy changes something; unchanged subtrees are shared with the original.
+    """
+    __slots__ = ("alert", "alert_types", "bad_imports", "config_no_exec", "_original", "_changes", "_tree")
+
+    def __init__(self, policy, original, alert_types, bad_imports, changes):
+        self.alert = bool(alert_types)
+        self.alert_types = alert_types
+        self.bad_imports = bad_imports
+        self.config_no_exec = policy.no_exec
+        self._original = original
+        self._changes = changes
+        self._tree = None
+
+    @property
+    def modified(self):
+        return bool(self._changes)
+
+    @property
+    def tree(self):
+        if self._tree is None:
+            if not self._changes:
+                self._tree = self._original
+            else:
+                dirty = set()
+                for node, _, ancestors in self._changes.values():
+                    dirty.update(id(ancestor) for ancestor in ancestors)
+                self._tree = _rebuild(self._original, dirty, self._changes)
+        return self._tree
+
+    def as_dict(self):
+        return {"alert": self.alert, "alert_types": self.alert_types, "bad_imports": self.bad_imports,
+                "config_no_exec": self.config_no_exec, "modified": self.modified}
+
+
+def _rebuild(node, dirty, changes):
+    """Copy only the nodes on the paths to changed nodes, applying the changes"""
+    change = changes.get(id(node))
+    if change is not None and change[1][0] == "call":
+        return ast.copy_location(
+            ast.Call(func=ast.copy_location(ast.Name(id="alertFunc", ctx=ast.Load()), node.func),
+                     args=node.args, keywords=node.keywords),
+            node)
+    if change is None and id(node) not in dirty:
+        return node
+    new = copy.copy(node)
+    for field, value in ast.iter_fields(node):
+        if isinstance(value, list):
+            setattr(new, field, [_rebuild(item, dirty, changes) if isinstance(item, ast.AST) else item
+                                 for item in value])
+        elif isinstance(value, ast.AST):
+            setattr(new, field, _rebuild(value, dirty, changes))
+    if change is not None:
+        action = change[1]
+        if action[0] == "alias":
+            new.name = "this"
+            new.asname = action[1]
+        elif action[0] == "rename":
+            new.id = action[1]
+    return new
+
+
+class MultiPolicyAnalyzer:
+    """
+    Check one snippet against many policies with a single parse and a single
+    walk. The walk records the nodes any policy could act on; each policy then
+    only replays those sites (most are ruled out with a few set operations),
+    instead of walking the whole tree again.
+    Verdicts and trees match what CodeAnalyzer(config).analyze_code gives for
+    each config on its own; the metrics report is shared and describes the
+    unmodified code.
+    """
+
+    def __init__(self, events=None):
+        self.events = events
+
+    def analyze_code(self, source_code, configs):
+        """
+        configs maps a name (e.g. tenant) to an AnalyzerConfig.
+        Returns (report, {name: PolicyVerdict}).
+        """
+        collector = _SiteCollector(_Unrestricted, events=self.events)
+        report, tree = collector.analyze_in_context(source_code)
+        sites = collector.sites
+
+        import_names = set()
+        call_names = set()
+        attribute_names = set()
+        for site in sites:
+            if site.kind == "import":
+                import_names.add(site.name)
+            elif site.kind == "call":
+                call_names.add(site.name)
+            else:
+                attribute_names.add(site.name)
+        import_aliases = import_names | {site.asname for site in sites if site.kind == "import" and site.asname}
+        site_names = import_aliases | call_names | attribute_names
+
+        verdicts = {}
+        # policies that only differ in names this snippet never uses behave the
+        # same here, so the number of replays follows the distinct behaviours
+        by_effect = {}
+        for name, config in configs.items():
+            policy = config.policy
+            effect = (
+                policy.allowed_imports & import_names if policy.allowed_imports else None,
+                policy.blacklist_imports & import_aliases,
+                policy.allowed_functions & call_names if policy.allowed_functions else None,
+                policy.blacklist & site_names,
+                policy.no_exec,
+            )
+            verdict = by_effect.get(effect)
+            if verdict is None:
+                if self._untouched(policy, import_names, import_aliases, call_names, attribute_names):
+                    verdict = PolicyVerdict(policy, tree, [], [], {})
+                else:
+                    verdict = self._replay(policy, tree, sites)
+                by_effect[effect] = verdict
+            verdicts[name] = verdict
+        return report, verdicts
+
+    @staticmethod
+    def _untouched(policy, import_names, import_aliases, call_names, attribute_names):
+        """True when no site can trip the policy, decided without looking at the sites"""
+        if policy.allowed_imports:
+            if not import_names <= policy.allowed_imports:
+                return False
+        elif not policy.blacklist_imports.isdisjoint(import_aliases):
+            return False
+        if policy.allowed_functions:
+            if not call_names <= policy.allowed_functions:
+                return False
+        elif not policy.blacklist.isdisjoint(call_names):
+            return False
+        # no import is blocked, so only the compiled blacklist applies to attributes
+        return policy.blacklist.isdisjoint(attribute_names)
+
+    @staticmethod
+    def _replay(policy, tree, sites):
+        """Apply the policy to the recorded sites in visiting order, like CodeAnalyzer would"""
+        alert_types = []
+        bad_imports = []
+        blocked_names = set()
+        changes = {}
+        hidden = set()
+        blacklist = policy.blacklist
+        for index, site in enumerate(sites):
+            if site.parent_call is not None and site.parent_call in hidden:
+                # inside a rewritten call, CodeAnalyzer never visits it
+                if site.kind == "call":
+                    hidden.add(index)
+                continue
+            if site.kind == "import":
+                asname = site.asname
+                if policy.allowed_imports:
+                    blocked = site.name not in policy.allowed_imports
+                else:
+                    blocked = site.name in policy.blacklist_imports or asname in policy.blacklist_imports
+                    if blocked and site.is_from:
+                        asname = site.name
+                if blocked:
+                    if asname:
+                        blocked_names.add(asname)
+                    blocked_names.add("this")
+                    bad_imports.append(site.name)
+                    alert_types.append("Imports")
+                    changes[id(site.node)] = (site.node, ("alias", asname), site.ancestors)
+            elif site.kind == "call":
+                if policy.allowed_functions:
+                    rewrite = site.name not in policy.allowed_functions
+                else:
+                    rewrite = site.name in blacklist or site.name in blocked_names
+                if rewrite:
+                    alert_types.append("Function")
+                    hidden.add(index)
+                    changes[id(site.node)] = (site.node, ("call",), site.ancestors)
+            elif site.name in blacklist or site.name in blocked_names:
+                alert_types.append("Function From Bad Import")
+                changes[id(site.node)] = (site.node, ("rename", "this-attr"), site.ancestors)
+        return PolicyVerdict(policy, tree, alert_types, bad_imports, changes)
@@ -0,0 +1,169 @@
+import asyncio
+import contextlib
+import io
+import sys
+import threading
+
+from .ResourceLimiter import OutputLimitExceeded
+
+
+class OutputCapture(io.TextIOBase):
+    """
+    Bounded, streaming replacement for io.StringIO as the stdout of untrusted code.
+    Every write is forwarded as a chunk to an optional callback (and to async
+    iterators from aiter()), and is counted against max_bytes. Past the cap the
+    output is either truncated (writes are dropped) or the run is aborted with
+    OutputLimitExceeded.
+    Set keep=False when only streaming, nothing is retained then.
+    """
+
+    def __init__(self, max_bytes=None, on_overflow="abort", callback=None, keep=True):
+        if on_overflow not in ("abort", "truncate"):
+            raise ValueError(f"on_overflow must be 'abort' or 'truncate', not {on_overflow!r}")
+        self.max_bytes = max_bytes
+        self.on_overflow = on_overflow
+        self.callback = callback
+        self.keep = keep
+        self.bytes_written = 0
+        self.truncated = False
+        self._chunks = []
+        self._value = None
+        self._listeners = []
+
+    def writable(self):
+        return True
+
+    def write(self, s):
+        written = len(s)
+        if self.truncated or not s:
+            return written
+        size = len(s) if s.isascii() else len(s.encode("utf-8", "replace"))
+        if self.max_bytes is not None and self.bytes_written + size > self.max_bytes:
+            if self.on_overflow == "abort":
+                raise OutputLimitExceeded(f"output exceeded {self.max_bytes} bytes")
+            room = self.max_bytes - self.bytes_written
+            s = s.encode("utf-8", "replace")[:room].decode("utf-8", "ignore")
+            size = room
+            self.truncated = True
+        self.bytes_written += size
+        if s:
+            self._emit(s)
+        # report everything as written so print() doesn't fail when truncating
+        return written
+
+    def _emit(self, chunk):
+        if self.keep:
+            self._chunks.append(chunk)
+            self._value = None
+        if self.callback is not None:
+            self.callback(chunk)
+        for listener in self._listeners:
+            listener(chunk)
+
+    def getvalue(self):
+        """Everything retained so far, joined once and reused until the next write"""
+        if self._value is None:
+            self._value = "".join(self._chunks)
+            # keep the joined string as the only chunk so we never join it again
+            self._chunks = [self._value] if self._value else []
+        return self._value
+
+    def aiter(self, loop=None):
+        """
+        Async iterator over chunks as they are written, safe to consume from an
+        event loop while the code runs in another thread. Ends when the capture
+        is closed.
+        """
+        loop = loop or asyncio.get_running_loop()
+        chunks = asyncio.Queue()
+
+        def push(chunk):
+            loop.call_soon_threadsafe(chunks.put_nowait, chunk)
+
+        self._listeners.append(push)
+
+        async def iterate():
+            while True:
+                chunk = await chunks.get()
+                if chunk is None:
+                    return
+                yield chunk
+
+        return iterate()
+
+    def close(self):
+        if not self.closed:
+            for listener in self._listeners:
+                listener(None)
+            self._listeners = []
+        super().close()
+
+
+class _ThreadStdout(io.TextIOBase):
+    """sys.stdout stand-in that sends each thread's writes to its own capture"""
+
+    def __init__(self, default):
+        self.default = default
+        self.local = threading.local()
+
+    def _target(self):
+        return getattr(self.local, "target", None) or self.default
+
+    def writable(self):
+        return True
+
+    def write(self, s):
+        return self._target().write(s)
+
+    def flush(self):
+        return self._target().flush()
+
+    def isatty(self):
+        return self._target().isatty()
+
+    def fileno(self):
+        return self._target().fileno()
+
+    @property
+    def encoding(self):
+        return getattr(self._target(), "encoding", None)
+
+    @property
+    def errors(self):
+        return getattr(self._target(), "errors", None)
+
+    def __getattr__(self, name):
+        return getattr(self._target(), name)
+
+
+_stdout_lock = threading.Lock()
+# redirects currently active in any thread, the last one out puts sys.stdout back
+_redirects = 0
+
+
+@contextlib.contextmanager
+def redirect_thread_stdout(target):
+    """
+    Like contextlib.redirect_stdout, but only for the current thread, so
+    concurrent runs in a thread pool don't capture each other's (or the host's)
+    output. sys.stdout is a proxy while any redirect is active and the
+    original stream again once the last one exits.
+    """
+    global _redirects
+    with _stdout_lock:
+        proxy = sys.stdout
+        if not isinstance(proxy, _ThreadStdout):
+            proxy = _ThreadStdout(proxy)
+            sys.stdout = proxy
+        _redirects += 1
+    previous = getattr(proxy.local, "target", None)
+    proxy.local.target = target
+    try:
+        yield target
+    finally:
+        proxy.local.target = previous
+        with _stdout_lock:
+            _redirects -= 1
+            # unless the host swapped sys.stdout itself meanwhile
+            if not _redirects and sys.stdout is proxy:
+                sys.stdout = proxy.default
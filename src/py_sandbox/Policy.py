@@ -0,0 +1,73 @@
+import hashlib
+import json
+from dataclasses import dataclass, fields
+
+
+def _as_frozenset(values):
+    """Normalize a config value (list, scalar or None) into a frozenset of names"""
+    if not values:
+        return frozenset()
+    if isinstance(values, str):
+        return frozenset((values,))
+    names = set()
+    for value in values:
+        # yaml lets people write `- alias: module`, keep the module names
+        if isinstance(value, dict):
+            names.update(str(v) for v in value.values())
+        else:
+            names.add(str(value))
+    return frozenset(names)
+
+
+@dataclass(frozen=True)
+class Policy:
+    """
+    Immutable, compiled form of an AnalyzerConfig.
+    All rule lookups done by the analyzer go through these frozensets so they
+    are O(1) and never change while analyses are running.
+    """
+    allowed_imports: frozenset
+    blacklist_imports: frozenset
+    allowed_functions: frozenset
+    blacklisted_functions: frozenset
+    allowed_statements: frozenset
+    blacklist_statements: frozenset
+    blacklist: frozenset
+    allowed_complexity: int
+    no_exec: bool
+    resource_limits: tuple = ()
+    fingerprint: str = ""
+
+    @classmethod
+    def from_config(cls, config):
+        """Compile the (mutable) attributes of an AnalyzerConfig into a Policy"""
+        rules = {
+            "allowed_imports": _as_frozenset(config.allowed_imports),
+            "blacklist_imports": _as_frozenset(config.blacklist_imports),
+            "allowed_functions": _as_frozenset(config.allowed_functions),
+            "blacklisted_functions": _as_frozenset(config.blacklisted_functions),
+            "allowed_statements": _as_frozenset(config.allowed_statements),
+            "blacklist_statements": _as_frozenset(config.blacklist_statements),
+            "blacklist": _as_frozenset(config.blacklist),
+            "allowed_complexity": config.allowed_complexity,
+            "no_exec": bool(config.no_exec),
+            "resource_limits": tuple(sorted((getattr(config, "resource_limits", None) or {}).items())),
+        }
+        return cls(fingerprint=cls._fingerprint(rules), **rules)
+
+    @staticmethod
+    def _fingerprint(rules):
+        """Stable hash of the rules, independent of set ordering and process"""
+        canonical = {
+            key: sorted(value) if isinstance(value, frozenset) else value
+            for key, value in rules.items()
+        }
+        blob = json.dumps(canonical, sort_keys=True, default=str).encode("utf-8")
+        return hashlib.sha256(blob).hexdigest()
+
+    def as_dict(self):
+        """Plain, json friendly view of the policy"""
+        return {
+            f.name: sorted(getattr(self, f.name)) if isinstance(getattr(self, f.name), frozenset) else getattr(self, f.name)
+            for f in fields(self)
+        }
@@ -0,0 +1,60 @@
+import re
+import threading
+
+# compiled screens per policy, policies are immutable so these never go stale
+_screens = {}
+_screens_lock = threading.Lock()
+
+
+class PreScreen:
+    """
+    Lexical check that tells whether a snippet can possibly trip a policy.
+    A snippet is clean only if none of the words the analyzer reacts to appear
+    anywhere in its text (comments and strings included), so a clean verdict
+    means the full pass would neither alert nor rewrite anything and the
+    source can be compiled as is. Anything else, including non-ASCII source
+    (identifiers are NFKC normalized, so lookalikes could spell a blocked
+    name), goes through the full analysis.
+    """
+
+    def __init__(self, policy):
+        self.policy = policy
+        # names checked by visit_Call, visit_Attribute and the import visitors
+        words = {str(word) for word in policy.blacklist if word}
+        if policy.allowed_imports:
+            # with an import whitelist every import needs checking
+            words.add("import")
+        alternatives = [r"\b(?:%s)\b" % "|".join(sorted(map(re.escape, words)))] if words else []
+        if policy.allowed_functions:
+            # with a function whitelist every call does, so anything with a paren
+            alternatives.append(r"\(")
+        # nothing to look for means every ASCII snippet is clean
+        self.pattern = re.compile("|".join(alternatives)) if alternatives else None
+        self.screened = 0
+        self.skipped = 0
+
+    @classmethod
+    def for_policy(cls, policy):
+        screen = _screens.get(policy.fingerprint)
+        if screen is None:
+            with _screens_lock:
+                screen = _screens.get(policy.fingerprint)
+                if screen is None:
+                    screen = _screens[policy.fingerprint] = cls(policy)
+        return screen
+
+    def is_clean(self, source_code):
+        """True when source_code can't hit any rule of the policy"""
+        # counters are only statistics, a lost increment under threads is fine
+        self.screened += 1
+        if not source_code.isascii() or (self.pattern is not None and self.pattern.search(source_code)):
+            return False
+        self.skipped += 1
+        return True
+
+    @property
+    def skip_rate(self):
+        return self.skipped / self.screened if self.screened else 0
+
+    def stats(self):
+        return {"screened": self.screened, "skipped": self.skipped, "skip_rate": self.skip_rate}
@@ -0,0 +1,126 @@
+import re
+
+_OPEN = "([{"
+_CLOSE = ")]}"
+# statements that continue the block above them at the same indentation
+# (whole keywords, elsewhere = 1 starts a new statement)
+_CONTINUES = re.compile(r"(?:else|elif|except|finally)\b")
+
+
+class ReplBuffer:
+    """
+    Collects REPL input into complete blocks without re-parsing what was
+    already typed: every line is scanned once, keeping track of open brackets,
+    strings and backslash continuations, so a pasted block costs as much as
+    its length. Completeness follows the interactive interpreter: a simple
+    statement is complete at the end of its line, a compound one (a line
+    ending in ':' or a decorator) at the next blank line, or when an
+    unindented statement starts the next one, which is what makes pasting
+    several top level blocks at once work.
+    With blank_ends_block=False (input that isn't typed, e.g. a piped file)
+    blank lines are kept inside blocks and only the unindented statement, or
+    flush() at the end, finishes one.
+    The blocks handed out may still be invalid Python, the parse reports that.
+    """
+
+    def __init__(self, blank_ends_block=True):
+        self.blank_ends_block = blank_ends_block
+        self.reset()
+
+    def reset(self):
+        self.lines = []
+        self.depth = 0
+        self.string = None
+        self.continued = False
+        self.block = False
+        self.decorators_only = True
+
+    @property
+    def pending(self):
+        """True while a block is being collected, for the continuation prompt"""
+        return bool(self.lines)
+
+    def feed(self, line):
+        """Add one line of input, returns the blocks it completed (usually none or one)"""
+        statement_start = self.depth == 0 and self.string is None and not self.continued
+        stripped = line.strip()
+        done = []
+        if statement_start:
+            if not stripped:
+                # blank lines only matter between statements
+                if self.block:
+                    if self.blank_ends_block:
+                        done.append(self._take())
+                    else:
+                        self.lines.append(line)
+                return done
+            if self.block and not stripped.startswith("#") and not line[0].isspace() \
+                    and not _CONTINUES.match(stripped) and not self.decorators_only:
+                # back at column 0: the block above is finished, this line starts the next one
+                done.append(self._take())
+            if not stripped.startswith("#"):
+                self.decorators_only = self.decorators_only and stripped.startswith("@")
+        self.lines.append(line)
+        last = self._scan(line)
+
+        if self.depth == 0 and self.string is None and not self.continued:
+            if last == ":" or (statement_start and stripped.startswith("@")):
+                self.block = True
+            if not self.block:
+                done.append(self._take())
+        return done
+
+    def flush(self):
+        """Whatever was collected so far, e.g. at end of input; None if nothing"""
+        return self._take() if self.lines else None
+
+    def _take(self):
+        source = "\n".join(self.lines)
+        self.reset()
+        return source
+
+    def _scan(self, line):
+        """Track brackets and strings across line, returns its last significant character outside strings"""
+        last = None
+        i = 0
+        n = len(line)
+        self.continued = False
+        while i < n:
+            if self.string is not None:
+                quote = self.string
+                end = i
+                while end < n:
+                    c = line[end]
+                    if c == "\\":
+                        end += 2
+                        continue
+                    if line.startswith(quote, end):
+                        break
+                    end += 1
+                if end >= n:
+                    # a one quote string only goes on past a trailing backslash
+                    if len(quote) == 1 and not line.endswith("\\"):
+                        self.string = None
+                    return last
+                i = end + len(quote)
+                self.string = None
+                last = quote[-1]
+                continue
+            c = line[i]
+            if c == "#":
+                break
+            if c in "\"'":
+                self.string = c * 3 if line.startswith(c * 3, i) else c
+                i += len(self.string)
+                continue
+            if c in _OPEN:
+                self.depth += 1
+            elif c in _CLOSE:
+                self.depth = max(self.depth - 1, 0)
+            elif c == "\\" and i == n - 1:
+                self.continued = True
+                return last
+            if not c.isspace():
+                last = c
+            i += 1
+        return last
@@ -0,0 +1,68 @@
+import abc
+import json
+import sys
+
+from .AnalysisRecords import json_default
+
+
+class ReportSink(abc.ABC):
+    """
+    Destination for analysis reports, written one record at a time as they
+    are produced so nothing has to hold a whole batch in memory.
+    """
+
+    @abc.abstractmethod
+    def write(self, record):
+        """Write one report record"""
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class NDJSONSink(ReportSink):
+    """
+    One compact JSON document per line, to a path or an open text stream
+    (stdout by default), ready to pipe into a log pipeline.
+    """
+
+    def __init__(self, target=None, flush=True):
+        if target is None or hasattr(target, "write"):
+            self.stream = target or sys.stdout
+            self._owned = False
+        else:
+            self.stream = open(target, "w", encoding="utf-8")
+            self._owned = True
+        # flush per record so consumers at the other end of a pipe see it right away
+        self.flush = flush
+        self.records = 0
+
+    def write(self, record):
+        self.stream.write(json.dumps(record, separators=(",", ":"), default=json_default))
+        self.stream.write("\n")
+        if self.flush:
+            self.stream.flush()
+        self.records += 1
+
+    def close(self):
+        if self._owned:
+            self.stream.close()
+        else:
+            self.stream.flush()
+
+
+class JSONFileSink(ReportSink):
+    """A single indented JSON document, the format pretty_print used to save"""
+
+    def __init__(self, path, indent=2):
+        self.path = path
+        self.indent = indent
+
+    def write(self, record):
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(record, f, indent=self.indent, default=json_default)
@@ -0,0 +1,251 @@
+import contextlib
+import ctypes
+import os
+import resource
+import signal
+import threading
+
+
+class ResourceLimitExceeded(BaseException):
+    """
+    Untrusted code went over one of its budgets.
+    A BaseException, like KeyboardInterrupt, so `except Exception` in the
+    snippet doesn't stop it.
+    """
+    limit = None
+
+
+class CPULimitExceeded(ResourceLimitExceeded):
+    limit = "cpu"
+
+
+class MemoryLimitExceeded(ResourceLimitExceeded):
+    limit = "memory"
+
+
+class WallClockLimitExceeded(ResourceLimitExceeded):
+    limit = "wall"
+
+
+class OutputLimitExceeded(ResourceLimitExceeded):
+    limit = "output"
+
+
+class StepLimitExceeded(ResourceLimitExceeded):
+    limit = "steps"
+
+
+def interrupt_thread(thread_id, exc_type):
+    """Ask the interpreter to raise exc_type in another thread (None clears a pending one)"""
+    exc = ctypes.py_object(exc_type) if exc_type is not None else ctypes.c_void_p(0)
+    return ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(thread_id), exc)
+
+
+# once a time budget is spent it fires again this often until the run ends,
+# a snippet that catches one limit exception gets the next
+_REFIRE_SECONDS = 0.05
+
+
+def _until_done(disarm):
+    """Run disarm to the end even if limit exceptions keep landing while it runs"""
+    while True:
+        try:
+            disarm()
+            return
+        except ResourceLimitExceeded:
+            continue
+
+
+def _address_space_in_use():
+    """Current virtual memory size of this process in bytes, None if unknown"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class ResourceLimiter:
+    """
+    Per-execution CPU, memory, wall clock and output budgets for untrusted code.
+    Limits are only armed around the exec of the snippet and restored right
+    after, so the host keeps its own limits.
+
+    - wall_seconds / cpu_seconds: interval timers (SIGALRM / SIGPROF) when running
+      on the main thread, otherwise a watchdog thread interrupts the running
+      thread once min(wall, cpu) seconds have passed. Either way the limit
+      exception is raised again every _REFIRE_SECONDS until the block exits,
+      and a block that swallowed it still ends with it.
+    - memory_bytes: address space the snippet may add on top of what the process
+      already uses (RLIMIT_AS). That limit is process wide, so it is refused
+      (RuntimeError) while other threads run: use a WorkerPool, whose workers
+      are single threaded processes of their own.
+    - output_bytes: cap on captured stdout, past it output is truncated or the
+      run aborted depending on output_overflow (see OutputCapture).
+    - max_steps: loop iterations, function calls and lambda calls the snippet may
+      make, counted by code StepBudget instruments at compile time (see CodeRunner).
+    In process the time limits are advisory: they are exceptions raised into
+    the snippet, and code that catches BaseException in a loop (a bare
+    except: does) catches every one of them and keeps going. For code that
+    may be hostile run it in a WorkerPool, which kills the worker once a job
+    is past its budget.
+    """
+
+    def __init__(self, cpu_seconds=None, memory_bytes=None, wall_seconds=None, output_bytes=None,
+                 output_overflow="abort", max_steps=None):
+        self.cpu_seconds = cpu_seconds
+        self.memory_bytes = memory_bytes
+        self.wall_seconds = wall_seconds
+        self.output_bytes = output_bytes
+        self.output_overflow = output_overflow
+        self.max_steps = max_steps
+
+    @classmethod
+    def from_config(cls, config):
+        """Build a limiter from the `resource_limits` mapping of an AnalyzerConfig"""
+        limits = getattr(config, "resource_limits", None) or {}
+        memory_mb = limits.get("memory_mb")
+        return cls(
+            cpu_seconds=limits.get("cpu_seconds"),
+            memory_bytes=int(memory_mb * 1024 * 1024) if memory_mb else limits.get("memory_bytes"),
+            wall_seconds=limits.get("wall_seconds"),
+            output_bytes=limits.get("output_bytes"),
+            output_overflow=limits.get("output_overflow", "abort"),
+            max_steps=limits.get("max_steps"),
+        )
+
+    @property
+    def enabled(self):
+        return bool(self.cpu_seconds or self.memory_bytes or self.wall_seconds or self.output_bytes
+                    or self.max_steps)
+
+    @contextlib.contextmanager
+    def limit(self):
+        """Arm the CPU, memory and wall clock limits for the duration of the block"""
+        if not (self.cpu_seconds or self.memory_bytes or self.wall_seconds):
+            yield
+            return
+
+        with contextlib.ExitStack() as stack:
+            if self.memory_bytes:
+                stack.enter_context(self._memory_limit())
+            if threading.current_thread() is threading.main_thread():
+                stack.enter_context(self._signal_timers())
+            else:
+                stack.enter_context(self._watchdog())
+            try:
+                yield
+            except MemoryError as e:
+                if self.memory_bytes:
+                    raise MemoryLimitExceeded(f"memory exceeded {self.memory_bytes} bytes") from e
+                raise
+
+    @contextlib.contextmanager
+    def _memory_limit(self):
+        if threading.active_count() > 1:
+            # another thread's run could restore our lowered limit as its own
+            # "previous" one, and the host would keep it
+            raise RuntimeError("memory_bytes is process wide (RLIMIT_AS) and other threads are running, "
+                               "run memory limited code in a WorkerPool")
+        in_use = _address_space_in_use()
+        if in_use is None:
+            yield
+            return
+        previous = resource.getrlimit(resource.RLIMIT_AS)
+        soft = in_use + self.memory_bytes
+        if previous[1] != resource.RLIM_INFINITY:
+            soft = min(soft, previous[1])
+        resource.setrlimit(resource.RLIMIT_AS, (soft, previous[1]))
+        try:
+            yield
+        finally:
+            resource.setrlimit(resource.RLIMIT_AS, previous)
+
+    @contextlib.contextmanager
+    def _signal_timers(self):
+        armed = []
+        fired = []
+
+        def arm(signum, timer, seconds, exc_type):
+            message = f"{exc_type.limit} limit of {seconds}s exceeded"
+
+            def handler(signum, frame):
+                fired.append((exc_type, message))
+                raise exc_type(message)
+            armed.append((signum, timer, signal.signal(signum, handler)))
+            signal.setitimer(timer, seconds, _REFIRE_SECONDS)
+
+        def disarm():
+            for signum, timer, previous in armed:
+                signal.setitimer(timer, 0)
+                signal.signal(signum, previous)
+
+        error = None
+        try:
+            if self.wall_seconds:
+                arm(signal.SIGALRM, signal.ITIMER_REAL, self.wall_seconds, WallClockLimitExceeded)
+            if self.cpu_seconds:
+                arm(signal.SIGPROF, signal.ITIMER_PROF, self.cpu_seconds, CPULimitExceeded)
+            yield
+        except ResourceLimitExceeded:
+            raise
+        except BaseException as e:
+            error = e
+        finally:
+            _until_done(disarm)
+        if fired:
+            # the snippet caught the limit exception and went on, the budget is still spent
+            exc_type, message = fired[0]
+            raise exc_type(message) from error
+        if error is not None:
+            raise error
+
+    @contextlib.contextmanager
+    def _watchdog(self):
+        # a single thread can't burn more CPU than wall time, so min() is a safe cap
+        budgets = [s for s in (self.wall_seconds, self.cpu_seconds) if s]
+        if not budgets:
+            yield
+            return
+        seconds = min(budgets)
+        exc_type = WallClockLimitExceeded if seconds == self.wall_seconds else CPULimitExceeded
+        thread_id = threading.get_ident()
+        lock = threading.Lock()
+        stop = threading.Event()
+        state = {"armed": True, "fired": False}
+
+        def fire():
+            if stop.wait(seconds):
+                return
+            while True:
+                with lock:
+                    if not state["armed"]:
+                        return
+                    state["fired"] = True
+                    interrupt_thread(thread_id, exc_type)
+                if stop.wait(_REFIRE_SECONDS):
+                    return
+
+        def disarm():
+            stop.set()
+            with lock:
+                state["armed"] = False
+                if state["fired"]:
+                    # don't let a late async exception escape into host code
+                    interrupt_thread(thread_id, None)
+
+        watchdog = threading.Thread(target=fire, name="sandbox-watchdog", daemon=True)
+        watchdog.start()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = e
+        finally:
+            _until_done(disarm)
+        if state["fired"] and not (isinstance(error, ResourceLimitExceeded) and error.args):
+            # the async exception carries no message, and may have been swallowed
+            limit = exc_type(f"{exc_type.limit} limit of {seconds}s exceeded")
+            raise limit.with_traceback(error.__traceback__ if error is not None else None) from None
+        if error is not None:
+            raise error
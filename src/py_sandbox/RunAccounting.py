@@ -0,0 +1,166 @@
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+
+# CPU time of the running thread where the platform has it, so runs on other threads don't count
+_RUSAGE = getattr(resource, "RUSAGE_THREAD", resource.RUSAGE_SELF)
+# ru_maxrss is in KiB on Linux, bytes on macOS
+_MAXRSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+class RunUsage:
+    """
+    What one execution cost. peak_memory is the peak traced bytes above the
+    start with tracemalloc on, otherwise how much the process's peak RSS grew
+    (0 when the run stayed under an earlier peak). net_blocks is how much
+    the interpreter's allocated block count changed over the run: what the
+    run left allocated minus what it freed, so it can be negative, and it's
+    process wide, other threads' allocations show up in it too.
+    """
+    __slots__ = ("policy", "status", "wall_ns", "user_cpu", "sys_cpu", "peak_memory", "net_blocks",
+                 "output_bytes", "alerts", "steps")
+
+    def __init__(self, policy, status, wall_ns, user_cpu, sys_cpu, peak_memory, net_blocks,
+                 output_bytes, alerts, steps):
+        self.policy = policy
+        self.status = status
+        self.wall_ns = wall_ns
+        self.user_cpu = user_cpu
+        self.sys_cpu = sys_cpu
+        self.peak_memory = peak_memory
+        self.net_blocks = net_blocks
+        self.output_bytes = output_bytes
+        self.alerts = alerts
+        self.steps = steps
+
+    def to_dict(self):
+        return {"policy": self.policy, "status": self.status, "wall_ns": self.wall_ns, "user_cpu": self.user_cpu,
+                "sys_cpu": self.sys_cpu, "peak_memory": self.peak_memory,
+                "net_blocks": self.net_blocks, "output_bytes": self.output_bytes,
+                "alerts": self.alerts, "steps": self.steps}
+
+
+class UsageMeter:
+    """
+    Measures the block it wraps: perf_counter_ns, getrusage and the allocated
+    block count, about a microsecond each; with trace_memory also tracemalloc,
+    which slows every allocation down while it is on.
+    """
+    __slots__ = ("trace_memory", "_started_tracing", "_wall", "_rusage", "_blocks", "_traced",
+                 "wall_ns", "user_cpu", "sys_cpu", "peak_memory", "net_blocks", "steps")
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.wall_ns = 0
+        self.user_cpu = 0.0
+        self.sys_cpu = 0.0
+        self.peak_memory = 0
+        self.net_blocks = 0
+        # filled in by the runner when the code was instrumented for a step budget
+        self.steps = None
+
+    def __enter__(self):
+        if self.trace_memory:
+            self._started_tracing = not tracemalloc.is_tracing()
+            if self._started_tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            self._traced = tracemalloc.get_traced_memory()[0]
+        self._blocks = sys.getallocatedblocks()
+        self._rusage = resource.getrusage(_RUSAGE)
+        self._wall = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.wall_ns = time.perf_counter_ns() - self._wall
+        rusage = resource.getrusage(_RUSAGE)
+        self.net_blocks = sys.getallocatedblocks() - self._blocks
+        self.user_cpu = rusage.ru_utime - self._rusage.ru_utime
+        self.sys_cpu = rusage.ru_stime - self._rusage.ru_stime
+        if self.trace_memory:
+            self.peak_memory = max(tracemalloc.get_traced_memory()[1] - self._traced, 0)
+            if self._started_tracing:
+                tracemalloc.stop()
+        else:
+            self.peak_memory = (rusage.ru_maxrss - self._rusage.ru_maxrss) * _MAXRSS_UNIT
+        return False
+
+    def usage(self, policy, status, output_bytes, alerts=0):
+        return RunUsage(policy, status, self.wall_ns, self.user_cpu, self.sys_cpu, self.peak_memory,
+                        self.net_blocks, output_bytes, alerts, self.steps)
+
+
+class UsageTotals:
+    """Sum of many RunUsage records, peak_memory is the largest single run's"""
+    __slots__ = ("runs", "errors", "wall_ns", "user_cpu", "sys_cpu", "peak_memory", "net_blocks",
+                 "output_bytes", "alerts", "steps")
+
+    def __init__(self):
+        self.runs = 0
+        self.errors = 0
+        self.wall_ns = 0
+        self.user_cpu = 0.0
+        self.sys_cpu = 0.0
+        self.peak_memory = 0
+        self.net_blocks = 0
+        self.output_bytes = 0
+        self.alerts = 0
+        self.steps = 0
+
+    def add(self, usage):
+        self.runs += 1
+        if usage.status != "ok":
+            self.errors += 1
+        self.wall_ns += usage.wall_ns
+        self.user_cpu += usage.user_cpu
+        self.sys_cpu += usage.sys_cpu
+        self.peak_memory = max(self.peak_memory, usage.peak_memory)
+        self.net_blocks += usage.net_blocks
+        self.output_bytes += usage.output_bytes
+        self.alerts += usage.alerts
+        self.steps += usage.steps or 0
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class UsageLedger:
+    """
+    Running totals of RunUsage records per policy (by fingerprint) and per
+    session, for billing or spotting heavy users. Safe to share between
+    threads and runners.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.total = UsageTotals()
+        self.by_policy = {}
+        self.by_session = {}
+
+    def add(self, usage, session=None):
+        with self._lock:
+            self.total.add(usage)
+            totals = self.by_policy.get(usage.policy)
+            if totals is None:
+                totals = self.by_policy[usage.policy] = UsageTotals()
+            totals.add(usage)
+            if session is not None:
+                totals = self.by_session.get(session)
+                if totals is None:
+                    totals = self.by_session[session] = UsageTotals()
+                totals.add(usage)
+
+    def forget_session(self, session):
+        """Drop a finished session's totals, returns them (None if it had none)"""
+        with self._lock:
+            return self.by_session.pop(session, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "total": self.total.to_dict(),
+                "by_policy": {policy: totals.to_dict() for policy, totals in self.by_policy.items()},
+                "by_session": {str(session): totals.to_dict() for session, totals in self.by_session.items()},
+            }
@@ -0,0 +1,102 @@
+import itertools
+import json
+import socket
+
+# pipeline() sends at most this much before reading the replies: a batch
+# fits in the socket buffer, so sendall never waits on a daemon that is
+# itself waiting for us to read replies (a single bigger request goes alone,
+# the daemon can't reply before it has read all of it)
+_BATCH_BYTES = 64 * 1024
+
+
+class SandboxDaemonError(Exception):
+    """The daemon replied with an error"""
+
+    def __init__(self, reply):
+        super().__init__(reply.get("error"))
+        self.reply = reply
+        self.type = reply.get("type")
+        self.limit = reply.get("limit")
+
+
+class SandboxClient:
+    """
+    Client for a SandboxDaemon. One connection, reused for every call.
+    analyze/run return the reply of one request; pipeline() sends many
+    requests before reading any reply, which is the fast way to push a lot of
+    snippets through (see also batch()). Not thread safe, use one per thread.
+    """
+
+    def __init__(self, socket_path, timeout=None):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(socket_path)
+        self._replies = self.sock.makefile("rb")
+        self._ids = itertools.count(1)
+
+    def request(self, request):
+        """Send one request object, returns its reply object, raises SandboxDaemonError on errors"""
+        return self.pipeline([request])[0]
+
+    def pipeline(self, requests, raise_errors=True):
+        """
+        Send all requests, then collect their replies (in order). Large
+        pipelines go out in batches. All replies are read before the first
+        error is raised, so the connection stays usable after one.
+        """
+        replies = []
+        batch = []
+        size = 0
+        for request in requests:
+            request = dict(request)
+            request.setdefault("id", next(self._ids))
+            line = json.dumps(request, separators=(",", ":")).encode("utf-8") + b"\n"
+            if batch and size + len(line) > _BATCH_BYTES:
+                self._exchange(batch, replies)
+                batch = []
+                size = 0
+            batch.append(line)
+            size += len(line)
+        if batch:
+            self._exchange(batch, replies)
+        if raise_errors:
+            for reply in replies:
+                if not reply.get("ok"):
+                    raise SandboxDaemonError(reply)
+        return replies
+
+    def _exchange(self, lines, replies):
+        self.sock.sendall(b"".join(lines))
+        for _ in lines:
+            line = self._replies.readline()
+            if not line:
+                raise ConnectionError("sandbox daemon closed the connection")
+            replies.append(json.loads(line))
+
+    def analyze(self, code, policy=None, summary=False):
+        """The analysis report of code"""
+        return self.request({"op": "analyze", "code": code, "policy": policy, "summary": summary})["report"]
+
+    def run(self, code, policy=None, recurring_vars=None):
+        """Analyze and run code, returns the reply (report, executed, output, vars, result)"""
+        return self.request({"op": "run", "code": code, "policy": policy, "vars": recurring_vars})
+
+    def batch(self, jobs):
+        """Several jobs in one request, returns their replies; failed jobs come back with ok false"""
+        return self.request({"op": "batch", "jobs": jobs})["results"]
+
+    def ping(self):
+        return self.request({"op": "ping"})["ok"]
+
+    def stats(self):
+        return self.request({"op": "stats"})["stats"]
+
+    def close(self):
+        self._replies.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,304 @@
+import json
+import os
+import socket
+import socketserver
+import stat
+import tempfile
+import threading
+
+from .AnalysisCache import AnalysisCache
+from .AnalysisRecords import json_default
+from .AnalyzerConfig import AnalyzerConfig
+from .CodeAnalyzer import CodeAnalyzer
+from .CodeRunner import CodeRunner
+from .ResourceLimiter import ResourceLimiter, ResourceLimitExceeded
+from .RunAccounting import UsageLedger
+
+# a request line longer than this closes the connection
+MAX_REQUEST_BYTES = 16 * 1024 * 1024
+# what a "summary" reply keeps of a report
+_SUMMARY_KEYS = ("summary", "metrics", "alert", "alert_types", "config_no_exec", "prescreened")
+
+
+def _reply(request_id, **fields):
+    fields["id"] = request_id
+    return fields
+
+
+def _encode(reply):
+    return json.dumps(reply, default=json_default, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+def _error(request_id, e):
+    reply = _reply(request_id, ok=False, error=str(e), type=type(e).__name__)
+    if isinstance(e, ResourceLimitExceeded):
+        reply["limit"] = e.limit
+    usage = getattr(e, "usage", None)
+    if usage is not None:
+        reply["usage"] = usage
+    return reply
+
+
+class _Connection(socketserver.BaseRequestHandler):
+    """
+    One client. Requests are read a socket buffer at a time and every complete
+    line in it is handled before the replies go out in a single send, so a
+    client that pipelines N requests costs one read and one write, not N.
+    Replies come back in request order.
+    """
+
+    def handle(self):
+        sandbox = self.server.sandbox
+        sock = self.request
+        pending = b""
+        while True:
+            try:
+                chunk = sock.recv(65536)
+            except OSError:
+                return
+            if not chunk:
+                return
+            lines = (pending + chunk).split(b"\n")
+            pending = lines.pop()
+            if len(pending) > MAX_REQUEST_BYTES:
+                return
+            replies = [sandbox.handle_line(line) for line in lines if line.strip()]
+            if replies:
+                try:
+                    sock.sendall(b"".join(replies))
+                except OSError:
+                    return
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class SandboxDaemon:
+    """
+    Long running sandbox serving JSON lines jobs on a Unix domain socket, so
+    other local processes skip interpreter startup, imports and config
+    parsing on every call. Policies are loaded once, analyzers stay warm (one
+    per policy, shared by the connection threads) and all policies share an
+    AnalysisCache.
+
+    Requests are one JSON object per line:
+        {"id": 1, "op": "analyze", "code": "...", "policy": "name", "summary": true}
+        {"id": 2, "op": "run", "code": "...", "vars": {...}, "session": "tenant-7"}
+        {"id": 3, "op": "batch", "jobs": [{"op": "analyze", ...}, ...]}
+        {"id": 4, "op": "ping"} / {"op": "stats"}
+    and every reply carries the request's id and "ok". Errors are replied
+    with ok false, error and type, they never close the connection.
+    Code runs in the connection's thread under the policy's resource limits,
+    or in a WorkerPool when one is given; policies with a memory limit need
+    the pool, the address space limit can't be set for one thread.
+    With accounting (True or "tracemalloc", see CodeRunner) runs, in process
+    or in the pool, reply with their usage record, and stats totals it per
+    policy and per "session" (any key a client sends along, e.g. a tenant).
+    """
+
+    def __init__(self, socket_path, configs=None, default=None, pool=None, prescreen=False,
+                 cache=None, accounting=None):
+        self.socket_path = socket_path
+        self.configs = dict(configs or {})
+        if default is None:
+            default = next(iter(self.configs)) if self.configs else "default"
+        if default not in self.configs:
+            self.configs[default] = AnalyzerConfig()
+        self.default = default
+        self.pool = pool
+        self.cache = cache or AnalysisCache()
+        self.ledger = UsageLedger() if accounting else None
+        self.runners = {
+            name: CodeRunner(cache=self.cache, limiter=ResourceLimiter.from_config(config),
+                             prescreen=prescreen, policy=config.policy, accounting=accounting,
+                             ledger=self.ledger)
+            for name, config in self.configs.items()
+        }
+        if pool is None:
+            for name, runner in self.runners.items():
+                if runner.limiter.memory_bytes:
+                    raise ValueError(f"policy {name!r} has a memory limit, which needs a WorkerPool (pool=)")
+        self.analyzers = {name: CodeAnalyzer(config) for name, config in self.configs.items()}
+        self.requests = 0
+        self.errors = 0
+        self._server = None
+
+    def handle_line(self, line):
+        """One request line in, one reply line out"""
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            reply = _error(None, e)
+        else:
+            if isinstance(request, dict):
+                reply = self.handle(request)
+            else:
+                reply = _error(None, TypeError("request must be a JSON object"))
+        try:
+            return _encode(reply)
+        except (ValueError, TypeError, RecursionError) as e:
+            # vars or result the snippet left behind (a cycle, an int too long for str())
+            self.errors += 1
+            return _encode(_reply(reply.get("id"), ok=False, error=f"reply could not be encoded: {e}",
+                                  type=type(e).__name__))
+
+    def handle(self, request):
+        """Handle one request object, returns the reply object"""
+        # counters are only statistics, a lost increment under threads is fine
+        self.requests += 1
+        request_id = request.get("id")
+        try:
+            op = request.get("op", "analyze")
+            if op == "batch":
+                return _reply(request_id, ok=True, results=[self.handle(job) for job in request["jobs"]])
+            if op == "ping":
+                return _reply(request_id, ok=True)
+            if op == "stats":
+                return _reply(request_id, ok=True, stats=self.stats())
+            if op not in ("analyze", "run"):
+                raise ValueError(f"unknown op {op!r}")
+
+            name = request.get("policy") or self.default
+            if name not in self.configs:
+                raise KeyError(f"unknown policy {name!r}")
+            config = self.configs[name]
+            runner = self.runners[name]
+            report, compiled = runner.prepare(request["code"], config, analyzer=self.analyzers[name])
+            if request.get("summary"):
+                report = {key: report[key] for key in _SUMMARY_KEYS if key in report}
+            if op == "analyze":
+                return _reply(request_id, ok=True, report=report)
+
+            if report["config_no_exec"] and report["alert"]:
+                return _reply(request_id, ok=True, report=report, executed=False)
+            recurring_vars = request.get("vars") or {}
+            if runner.accounting:
+                alerts = len(report["alert_types"])
+                if self.pool is not None:
+                    output, captured_vars, result, usage = self._run_pooled(
+                        compiled, recurring_vars, runner, config, alerts, request.get("session"))
+                else:
+                    output, captured_vars, result, usage = runner.run_accounted(
+                        compiled, recurring_vars, alerts=alerts, session=request.get("session"))
+                return _reply(request_id, ok=True, report=report, executed=True, output=output,
+                              vars=captured_vars, result=result, usage=usage)
+            if self.pool is not None:
+                output, captured_vars, result = self.pool.run(compiled, recurring_vars, runner.limiter,
+                                                              policy=config.policy)
+            else:
+                output, captured_vars, result = runner.run_compiled(compiled, recurring_vars)
+            return _reply(request_id, ok=True, report=report, executed=True, output=output,
+                          vars=captured_vars, result=result)
+        except (Exception, ResourceLimitExceeded) as e:
+            self.errors += 1
+            return _error(request_id, e)
+
+    def _run_pooled(self, compiled, recurring_vars, runner, config, alerts, session):
+        """pool.run with accounting, the usage (also of failed runs) goes into the ledger like in process"""
+        try:
+            outcome = self.pool.run(compiled, recurring_vars, runner.limiter, policy=config.policy,
+                                    accounting=runner.accounting)
+        except BaseException as e:
+            usage = getattr(e, "usage", None)
+            if usage is not None:
+                usage.alerts = alerts
+                self.ledger.add(usage, session)
+            raise
+        usage = outcome[3]
+        usage.alerts = alerts
+        self.ledger.add(usage, session)
+        return outcome
+
+    def stats(self):
+        stats = {
+            "requests": self.requests,
+            "errors": self.errors,
+            "policies": sorted(self.configs),
+            "cache": self.cache.stats(),
+        }
+        if self.ledger is not None:
+            usage = self.ledger.stats()
+            # the ledger knows policies by fingerprint, clients by name
+            by_fingerprint = usage.pop("by_policy")
+            usage["by_policy"] = {name: by_fingerprint[config.policy.fingerprint]
+                                  for name, config in self.configs.items()
+                                  if config.policy.fingerprint in by_fingerprint}
+            stats["usage"] = usage
+        return stats
+
+    def _bind(self):
+        try:
+            if stat.S_ISSOCK(os.stat(self.socket_path).st_mode):
+                probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                try:
+                    probe.connect(self.socket_path)
+                except OSError:
+                    # left over from a daemon that didn't shut down cleanly
+                    os.unlink(self.socket_path)
+                else:
+                    raise OSError(f"a sandbox daemon is already serving on {self.socket_path}")
+                finally:
+                    probe.close()
+        except FileNotFoundError:
+            pass
+        # other users' processes have no business running code in here: bind in
+        # a private directory, make the socket 0600 and only then move it in
+        # place, so it is never reachable with looser permissions
+        directory = tempfile.mkdtemp(prefix=".sandbox-", dir=os.path.dirname(os.path.abspath(self.socket_path)))
+        path = os.path.join(directory, "socket")
+        try:
+            server = _Server(path, _Connection)
+            try:
+                os.chmod(path, 0o600)
+                os.replace(path, self.socket_path)
+            except BaseException:
+                server.server_close()
+                raise
+        finally:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            os.rmdir(directory)
+        server.sandbox = self
+        return server
+
+    def serve_forever(self):
+        self._server = self._bind()
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            try:
+                os.unlink(self.socket_path)
+            except OSError:
+                pass
+
+    def start(self):
+        """Serve on a background thread, returns once the socket accepts connections"""
+        self._server = self._bind()
+
+        def serve():
+            try:
+                self._server.serve_forever()
+            finally:
+                self._server.server_close()
+
+        thread = threading.Thread(target=serve, name="sandbox-daemon", daemon=True)
+        thread.start()
+        return thread
+
+    def shutdown(self):
+        if self._server is not None:
+            self._server.shutdown()
+            try:
+                os.unlink(self.socket_path)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
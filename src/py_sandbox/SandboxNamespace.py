@@ -0,0 +1,91 @@
+import builtins
+import threading
+import types
+
+from . import Events
+
+_real_import = builtins.__import__
+
+
+def alertFunc(*args, **kwargs):
+    # When this is called something went wrong: an escape happened
+    # TODO this function could have more logic around alerting
+    print('AlertFuncCalled')
+    return 'ALERT'
+
+
+def _blocked(name):
+    """Alerting stand-in for a builtin the policy doesn't allow"""
+    def stub(*args, **kwargs):
+        if Events.default_stream.min_level <= Events.ALERT:
+            Events.default_stream.emit(Events.RUNTIME_BLOCKED, Events.ALERT, name=name)
+        return alertFunc(*args, **kwargs)
+    stub.__name__ = stub.__qualname__ = name
+    return stub
+
+
+def _restricted_import(policy):
+    """__import__ that enforces allowed_imports / blacklist_imports at runtime"""
+    allowed = policy.allowed_imports
+    blacklist = policy.blacklist_imports
+
+    def __import__(name, globals=None, locals=None, fromlist=(), level=0):
+        # "this" is what the analyzer swaps blocked imports for
+        if level == 0 and name != "this":
+            top = name.partition(".")[0]
+            if (allowed and name not in allowed and top not in allowed) or \
+                    name in blacklist or top in blacklist:
+                if Events.default_stream.min_level <= Events.ALERT:
+                    Events.default_stream.emit(Events.RUNTIME_BLOCKED, Events.ALERT, name=name, kind="import")
+                raise ImportError(f"import of {name!r} is not allowed")
+        return _real_import(name, globals, locals, fromlist, level)
+    return __import__
+
+
+# namespaces per policy fingerprint, None is the unrestricted one
+_namespaces = {}
+_namespaces_lock = threading.Lock()
+
+
+class SandboxNamespace:
+    """
+    Globals for running sandboxed code under a policy, built once per policy.
+    Blocked builtins are swapped for alerting stubs (with a function whitelist,
+    every builtin function that isn't listed), __import__ checks the import
+    rules, and alertFunc is predefined so rewritten trees don't need to carry
+    its definition. The shared builtins are a read-only mapping; every run gets
+    its own copy from globals(), so what one run does to its builtins can't
+    reach the next.
+    """
+
+    def __init__(self, policy=None):
+        self.policy = policy
+        table = dict(vars(builtins))
+        self.blocked = frozenset()
+        if policy is not None:
+            names = {name for name in policy.blacklist if name in table}
+            if policy.allowed_functions:
+                names.update(
+                    name for name, value in table.items()
+                    if isinstance(value, types.BuiltinFunctionType) and not name.startswith("_")
+                    and name not in policy.allowed_functions)
+            for name in names:
+                table[name] = _blocked(name)
+            table["__import__"] = _restricted_import(policy)
+            self.blocked = frozenset(names)
+        self.builtins = types.MappingProxyType(table)
+
+    @classmethod
+    def for_policy(cls, policy):
+        key = policy.fingerprint if policy is not None else None
+        namespace = _namespaces.get(key)
+        if namespace is None:
+            with _namespaces_lock:
+                namespace = _namespaces.get(key)
+                if namespace is None:
+                    namespace = _namespaces[key] = cls(policy)
+        return namespace
+
+    def globals(self):
+        """Fresh globals for one run, a plain dict copy so lookups stay on the fast path"""
+        return {"__builtins__": self.builtins.copy(), "__name__": "__sandbox__", "alertFunc": alertFunc}
@@ -0,0 +1,164 @@
+import itertools
+import types
+
+from .AnalysisCache import AnalysisCache
+from .AnalyzerConfig import AnalyzerConfig
+from .CodeAnalyzer import CodeAnalyzer
+from .CodeRunner import CodeRunner
+from .ResourceLimiter import ResourceLimiter
+from .RunAccounting import UsageTotals
+from .SandboxNamespace import SandboxNamespace
+from .StepBudget import STEP_NAME
+
+# names the sandbox puts into a session's globals, not the snippet's variables
+_RESERVED = frozenset(("__builtins__", "__name__", "alertFunc", STEP_NAME))
+_session_ids = itertools.count(1)
+
+
+def _copy_globals(sandbox_globals):
+    """
+    Copy of a session namespace that shares every value but none of the bindings:
+    rebinding a name (or a builtin) in the copy leaves the original as it was.
+    Only the name tables are copied, in C, values are never touched, except
+    for functions defined at the top level of the session: a function looks
+    its globals up in the dict it was defined in, so those are rebound to the
+    copy (same code, defaults and closure cells).
+    Functions kept anywhere else (methods of classes, in lists, wrapped by a
+    decorator's closure) still see the namespace they were defined in.
+    """
+    copied = sandbox_globals.copy()
+    copied["__builtins__"] = sandbox_globals["__builtins__"].copy()
+    for name, value in copied.items():
+        if isinstance(value, types.FunctionType) and value.__globals__ is sandbox_globals:
+            copied[name] = _rebind(value, copied)
+    return copied
+
+
+def _rebind(function, new_globals):
+    rebound = types.FunctionType(function.__code__, new_globals, function.__name__,
+                                 function.__defaults__, function.__closure__)
+    rebound.__kwdefaults__ = function.__kwdefaults__
+    rebound.__dict__.update(function.__dict__)
+    rebound.__qualname__ = function.__qualname__
+    rebound.__doc__ = function.__doc__
+    rebound.__module__ = function.__module__
+    rebound.__annotations__ = function.__annotations__
+    return rebound
+
+
+class SessionSnapshot:
+    """Frozen namespace of a SandboxSession, to restore it or fork new sessions from"""
+    __slots__ = ("config", "runner", "analyzer", "_globals")
+
+    def __init__(self, config, runner, analyzer, sandbox_globals):
+        self.config = config
+        self.runner = runner
+        self.analyzer = analyzer
+        self._globals = sandbox_globals
+
+    @property
+    def names(self):
+        return sorted(name for name in self._globals if name not in _RESERVED)
+
+    def fork(self, runner=None, session_id=None):
+        """A new session starting from this snapshot, sharing the runner of the session it was taken from"""
+        return SandboxSession(self.config, runner=runner or self.runner, snapshot=self, session_id=session_id)
+
+
+class SandboxSession:
+    """
+    A long lived sandbox: one warm analyzer, and one namespace that every
+    snippet runs in like the lines of a module, so functions see the names
+    earlier snippets defined. alertFunc and the policy's restricted builtins
+    are installed once, when the session starts.
+
+    snapshot() freezes the namespace, restore() goes back to a snapshot and
+    fork() / SessionSnapshot.fork() start new sessions from one, e.g. many
+    agent sessions from a single warmed up state. Forks share every value and
+    only copy the name tables, so a fork costs about as much as the number of
+    names, not the size of the data behind them. Values themselves aren't
+    copied: mutating a shared list in place is seen by every fork that holds it,
+    rebinding a name is not. Top level functions are rebound to the
+    fork's names, _copy_globals says which ones aren't.
+
+    Forks share the runner (and its AnalysisCache) and the analyzer, which is
+    reentrant, so different sessions can run on different threads.
+
+    With a runner that does accounting, every run's RunUsage is kept in
+    last_usage and summed up in usage (and in the runner's ledger under
+    session_id).
+    """
+
+    def __init__(self, config=None, runner=None, snapshot=None, session_id=None):
+        self.config = config or AnalyzerConfig()
+        self.runner = runner or CodeRunner(cache=AnalysisCache(), limiter=ResourceLimiter.from_config(self.config),
+                                           policy=self.config.policy)
+        self.analyzer = snapshot.analyzer if snapshot is not None else CodeAnalyzer(self.config)
+        if snapshot is not None:
+            self.globals = _copy_globals(snapshot._globals)
+        else:
+            self.globals = SandboxNamespace.for_policy(self.config.policy).globals()
+        self.runs = 0
+        self.session_id = session_id if session_id is not None else next(_session_ids)
+        self.usage = UsageTotals()
+        self.last_usage = None
+
+    def prepare(self, source_code):
+        """Analyze and compile source_code with the session's analyzer, returns (report, code object)"""
+        return self.runner.prepare(source_code, self.config, analyzer=self.analyzer)
+
+    def run(self, source_code, output=None):
+        """
+        Analyze and run source_code in the session.
+        Returns (report, output, result); when the policy is no_exec and the
+        analysis alerted, the code isn't run and the last two are None.
+        """
+        report, compiled = self.prepare(source_code)
+        if report["config_no_exec"] and report["alert"]:
+            return report, None, None
+        captured_output, result = self._run(compiled, output, len(report["alert_types"]))
+        return report, captured_output, result
+
+    def run_compiled(self, compiled, output=None):
+        """Run an already prepared code object in the session, returns (output, vars, result)"""
+        captured_output, result = self._run(compiled, output)
+        return captured_output, self.variables, result
+
+    def _run(self, compiled, output, alerts=0):
+        self.runs += 1
+        if not self.runner.accounting:
+            captured_output, _, result = self.runner.run_compiled(
+                compiled, output=output, policy=self.config.policy, sandbox_globals=self.globals)
+            return captured_output, result
+        try:
+            captured_output, _, result, usage = self.runner.run_accounted(
+                compiled, output=output, policy=self.config.policy, sandbox_globals=self.globals,
+                alerts=alerts, session=self.session_id)
+        except BaseException as e:
+            usage = getattr(e, "usage", None)
+            if usage is not None:
+                self._add_usage(usage)
+            raise
+        self._add_usage(usage)
+        return captured_output, result
+
+    def _add_usage(self, usage):
+        self.last_usage = usage
+        self.usage.add(usage)
+
+    @property
+    def variables(self):
+        """What the snippets defined so far"""
+        return {name: value for name, value in self.globals.items() if name not in _RESERVED}
+
+    def snapshot(self):
+        return SessionSnapshot(self.config, self.runner, self.analyzer, _copy_globals(self.globals))
+
+    def restore(self, snapshot):
+        """Put the namespace back to how it was at snapshot"""
+        self.globals = _copy_globals(snapshot._globals)
+
+    def fork(self, session_id=None):
+        """A new session starting from this one's current namespace"""
+        return SandboxSession(self.config, runner=self.runner, session_id=session_id,
+                              snapshot=SessionSnapshot(self.config, self.runner, self.analyzer, self.globals))
@@ -0,0 +1,117 @@
+import ast
+import copy
+import itertools
+
+# global the instrumented code calls, SandboxNamespace-style runs bind it per exec
+STEP_NAME = "__sandbox_step__"
+
+# for instrumented code run without a budget, counts forever and never raises
+_unbounded = itertools.count(1).__next__
+
+
+def _step_call(node):
+    return ast.copy_location(
+        ast.Call(func=ast.copy_location(ast.Name(id=STEP_NAME, ctx=ast.Load()), node), args=[], keywords=[]),
+        node)
+
+
+# ways to reach the namespace the counter is bound in (or a frame's), a
+# snippet that can rebind the counter can switch the budget off
+_NAMESPACE_NAMES = frozenset({STEP_NAME, "globals", "locals", "vars", "__builtins__",
+                              "eval", "exec", "compile"})
+_NAMESPACE_ATTRS = frozenset({"globals", "locals", "vars", "__globals__", "__builtins__", "__code__",
+                              "f_globals", "f_locals", "f_builtins", "f_back",
+                              "gi_frame", "cr_frame", "ag_frame", "tb_frame"})
+
+
+def _reserved(node, what):
+    return SyntaxError(f"{what} is not allowed with a step budget", ("<string>", node.lineno, node.col_offset + 1, None))
+
+
+class StepInstrumenter(ast.NodeTransformer):
+    """
+    Inserts a step counter call at the top of every loop body and function, in
+    every comprehension filter and in front of every lambda body, so that
+    runaway Python level loops and recursion run into a step budget in process.
+    Work done inside a single C call (sum(range(10**12))) isn't counted, the
+    CPU limit is still the backstop for that.
+    Code that names the counter, or the namespaces and frames it could be
+    rebound through, is refused with a SyntaxError. eval/exec/compile are
+    refused too, the code they run isn't instrumented. Names put together at
+    run time (getattr(f, "__glob" + "als__")) get past this, CodeRunner checks
+    the counter is still bound after the run for those.
+    Modifies the tree in place, see instrument().
+    """
+
+    def visit_Name(self, node):
+        if node.id in _NAMESPACE_NAMES:
+            raise _reserved(node, node.id)
+        return node
+
+    def visit_Attribute(self, node):
+        if node.attr in _NAMESPACE_ATTRS:
+            raise _reserved(node, f".{node.attr}")
+        return self.generic_visit(node)
+
+    def visit_Constant(self, node):
+        # getattr(f, "__globals__"), namespace["__sandbox_step__"]
+        if isinstance(node.value, str) and (node.value in _NAMESPACE_ATTRS or STEP_NAME in node.value):
+            raise _reserved(node, repr(node.value))
+        return node
+
+    def _count_body(self, node):
+        self.generic_visit(node)
+        node.body.insert(0, ast.copy_location(ast.Expr(value=_step_call(node)), node))
+        return node
+
+    visit_For = visit_AsyncFor = visit_While = _count_body
+    visit_FunctionDef = visit_AsyncFunctionDef = _count_body
+
+    def visit_comprehension(self, node):
+        self.generic_visit(node)
+        # step() returns 1, 2, ... so as a filter it always passes
+        node.ifs.insert(0, _step_call(node.iter))
+        return node
+
+    def visit_Lambda(self, node):
+        self.generic_visit(node)
+        body = node.body
+        node.body = ast.copy_location(ast.BoolOp(op=ast.And(), values=[_step_call(body), body]), body)
+        return node
+
+
+def instrument(tree):
+    """
+    Return an instrumented copy of tree, the caller's tree is left alone so
+    it can be compiled again (with or without a budget).
+    """
+    return StepInstrumenter().visit(copy.deepcopy(tree))
+
+
+class StepCounter:
+    """
+    One run's step budget. step is a C level callable (a range iterator's
+    __next__) so a counted step costs a global lookup and a call, and once the
+    budget is spent every further step raises again, so caught exceptions
+    can't keep a loop going.
+    """
+    __slots__ = ("limit", "_steps", "step")
+
+    def __init__(self, limit=None):
+        self.limit = limit
+        if limit:
+            self._steps = iter(range(1, limit + 1))
+            self.step = self._steps.__next__
+        else:
+            self._steps = None
+            self.step = _unbounded
+
+    @property
+    def exhausted(self):
+        return self._steps is not None and self._steps.__length_hint__() == 0
+
+    @property
+    def used(self):
+        if self._steps is None:
+            return None
+        return self.limit - self._steps.__length_hint__()
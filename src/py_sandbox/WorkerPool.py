@@ -0,0 +1,398 @@
+import marshal
+import multiprocessing
+import os
+import pickle
+import queue
+import resource
+import signal
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from .CodeRunner import CodeRunner
+from .ResourceLimiter import CPULimitExceeded, ResourceLimiter, ResourceLimitExceeded, WallClockLimitExceeded
+from .RunAccounting import RunUsage
+
+
+class WorkerError(Exception):
+    """A job could not be completed by its worker process"""
+
+
+class JobTimeout(WorkerError, WallClockLimitExceeded):
+    """A job ran past its wall clock limit, the worker was killed"""
+
+
+class JobCPUTimeout(WorkerError, CPULimitExceeded):
+    """A job ran past its CPU limit, the worker was killed"""
+
+
+class JobCancelled(WorkerError):
+    """A running job was cancelled, the worker was killed"""
+
+
+def _picklable_vars(captured_vars):
+    """Keep what can cross the process boundary, repr() the rest"""
+    out = {}
+    for name, value in captured_vars.items():
+        if name == "alertFunc":
+            continue
+        try:
+            pickle.dumps(value)
+            out[name] = value
+        except Exception:
+            out[name] = repr(value)
+    return out
+
+
+# how often the dispatcher checks a limited job's budgets while it waits for the reply
+_POLL_SECONDS = 0.1
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+def _process_cpu(pid):
+    """CPU seconds process pid has used so far, None where /proc can't tell"""
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            # fields after the parenthesised command name, utime and stime are 14 and 15
+            fields = f.read().rsplit(b")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _set_cpu_limit(soft):
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    if hard != resource.RLIM_INFINITY and (soft == resource.RLIM_INFINITY or soft > hard):
+        soft = hard
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def _worker_main(conn):
+    """Loop run by every worker: receive a marshalled code object, run it, send back the result"""
+    # the pool already holds sockets/threads we don't want to touch from here
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    runner = CodeRunner()
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            break
+        if job is None:
+            break
+        code_bytes, recurring_vars, limiter, policy, accounting = job
+        # workers run jobs on their main thread, so the limiter uses precise signal timers
+        runner.limiter = limiter
+        runner.accounting = accounting
+        if limiter.cpu_seconds:
+            # the timer's exception can be caught by the snippet, SIGXCPU up to a second
+            # later isn't an exception and ends the worker (RLIMIT_CPU counts the whole process)
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            _set_cpu_limit(int(usage.ru_utime + usage.ru_stime + limiter.cpu_seconds) + 1)
+        try:
+            if accounting:
+                # a failed run's usage rides along on the exception
+                output, captured_vars, result, usage = runner.run_accounted(
+                    marshal.loads(code_bytes), recurring_vars, policy=policy)
+                reply = ("ok", output, _picklable_vars(captured_vars), result, usage)
+            else:
+                output, captured_vars, result = runner.run_compiled(marshal.loads(code_bytes), recurring_vars,
+                                                                    policy=policy)
+                reply = ("ok", output, _picklable_vars(captured_vars), result)
+        except ResourceLimitExceeded as e:
+            reply = ("limit", e)
+        except BaseException as e:
+            reply = ("error", e)
+        finally:
+            if limiter.cpu_seconds:
+                _set_cpu_limit(resource.RLIM_INFINITY)
+        try:
+            conn.send(reply)
+        except Exception:
+            conn.send(("error", RuntimeError(repr(reply[1]))))
+        if reply[0] == "limit":
+            # don't reuse a process that just hit a budget
+            break
+    conn.close()
+
+
+class _Job:
+    __slots__ = ("code_bytes", "recurring_vars", "limiter", "policy", "accounting", "future", "submitted",
+                 "cancelled")
+
+    def __init__(self, code_bytes, recurring_vars, limiter, policy=None, accounting=None):
+        self.code_bytes = code_bytes
+        self.recurring_vars = recurring_vars
+        self.limiter = limiter
+        self.policy = policy
+        self.accounting = accounting
+        self.future = Future()
+        self.submitted = time.perf_counter()
+        self.cancelled = False
+
+
+class _Worker:
+    """One pre-forked process plus the pipe the dispatcher talks to it on"""
+
+    def __init__(self, ctx):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.jobs = 0
+
+    def stop(self, timeout=1.0):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout)
+        self.kill()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class WorkerPool:
+    """
+    Pool of pre-forked, pre-imported worker processes for isolated execution.
+    Jobs are compiled code objects (see CodeRunner.prepare), each is handed to
+    an idle worker and run under per-job CPU, memory, wall clock and output
+    limits taken from a ResourceLimiter.
+    A job kill_grace seconds past its wall or CPU budget has its worker killed
+    (JobTimeout / JobCPUTimeout), so code that catches the limit exceptions
+    or is stuck in a C call still stops; RLIMIT_CPU in the worker backs the
+    CPU budget up.
+    Workers are recycled after max_jobs_per_worker jobs or when a limit is hit.
+    The first workers are forked from the caller, replacements come from a
+    forkserver (with the sandbox preloaded) since the dispatcher threads that
+    recycle them run alongside other threads, whose locks a fork would copy.
+    Variables only round trip if they can be pickled, others come back as repr().
+    With accounting (True or "tracemalloc", see CodeRunner) the worker
+    measures the run and the job also returns its RunUsage; a failed job's
+    exception carries it as usage. Jobs whose worker had to be killed only
+    get their wall time, CPU and memory of a killed process aren't known.
+    """
+
+    def __init__(self, workers=None, max_jobs_per_worker=1000, limiter=None,
+                 start_method="fork", latency_window=4096, kill_grace=1.0):
+        self.size = workers or os.cpu_count() or 1
+        self.max_jobs_per_worker = max_jobs_per_worker
+        # default per-job budgets, can be overridden per submit
+        self.limiter = limiter or ResourceLimiter()
+        self.kill_grace = kill_grace
+        self._ctx = multiprocessing.get_context(start_method)
+        self._respawn_ctx = self._ctx
+        if start_method == "fork":
+            if "forkserver" in multiprocessing.get_all_start_methods():
+                self._respawn_ctx = multiprocessing.get_context("forkserver")
+                # only takes effect if the forkserver isn't running yet, it's one per process
+                self._respawn_ctx.set_forkserver_preload([__name__])
+            else:
+                self._respawn_ctx = multiprocessing.get_context("spawn")
+        self._jobs = queue.Queue()
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=latency_window)
+        self._waits = deque(maxlen=latency_window)
+        self.completed = 0
+        self.failed = 0
+        self.recycled = 0
+        self.busy = 0
+        self._running = {}
+        self._closed = False
+
+        # fork the first workers before the pool starts any thread of its own
+        workers = [_Worker(self._ctx) for _ in range(self.size)]
+        self._threads = []
+        for worker in workers:
+            thread = threading.Thread(target=self._dispatch, args=(worker,), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, compiled, recurring_vars=None, limiter=None, policy=None, accounting=None):
+        """
+        Queue a code object, returns a Future resolving to (output, vars, result),
+        or (output, vars, result, RunUsage) with accounting.
+        policy picks the SandboxNamespace the worker runs it in.
+        """
+        job = _Job(marshal.dumps(compiled), recurring_vars or {}, limiter or self.limiter, policy, accounting)
+        with self._lock:
+            # checked under the lock so nothing is queued behind close()'s sentinels
+            if self._closed:
+                raise RuntimeError("WorkerPool is closed")
+            self._jobs.put(job)
+        return job.future
+
+    def run(self, compiled, recurring_vars=None, limiter=None, policy=None, accounting=None):
+        """Blocking version of submit"""
+        return self.submit(compiled, recurring_vars, limiter, policy, accounting).result()
+
+    def cancel(self, future):
+        """Cancel a queued job, or stop a running one by killing its worker"""
+        if future.cancel():
+            return True
+        with self._lock:
+            running = self._running.get(future)
+            if running is None:
+                return False
+            worker, job = running
+            job.cancelled = True
+            # under the lock: _finish drops the entry under it too, so the worker
+            # can't have moved on to another job yet
+            worker.process.kill()
+        return True
+
+    def _dispatch(self, worker):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                worker.stop()
+                return
+            if not job.future.set_running_or_notify_cancel():
+                continue
+
+            with self._lock:
+                self.busy += 1
+                self._running[job.future] = (worker, job)
+            started = time.perf_counter()
+            recycle = False
+            limiter = job.limiter
+            try:
+                worker.conn.send((job.code_bytes, job.recurring_vars, limiter, job.policy, job.accounting))
+                self._wait_reply(worker, limiter)
+                reply = worker.conn.recv()
+            except (EOFError, OSError):
+                recycle = True
+                worker.process.join(1.0)
+                if job.cancelled:
+                    self._finish(job, started, error=JobCancelled("job cancelled"))
+                elif worker.process.exitcode == -signal.SIGXCPU:
+                    self._finish(job, started, error=JobCPUTimeout(
+                        f"job exceeded CPU limit of {limiter.cpu_seconds}s"))
+                else:
+                    self._finish(job, started, error=WorkerError(f"worker died (exit code {worker.process.exitcode})"))
+            except (JobTimeout, JobCPUTimeout) as e:
+                recycle = True
+                self._finish(job, started, error=e)
+            else:
+                status = reply[0]
+                if status == "ok":
+                    self._finish(job, started, result=reply[1:])
+                elif status == "limit":
+                    recycle = True
+                    self._finish(job, started, error=reply[1])
+                else:
+                    self._finish(job, started, error=reply[1])
+
+            if job.cancelled:
+                # killed after it replied, before _finish let go of it
+                recycle = True
+            worker.jobs += 1
+            if recycle or worker.jobs >= self.max_jobs_per_worker:
+                if recycle:
+                    worker.kill()
+                else:
+                    worker.stop()
+                with self._lock:
+                    self.recycled += 1
+                    if self._closed:
+                        # close() fails whatever this dispatcher leaves in the queue
+                        return
+                worker = _Worker(self._respawn_ctx)
+
+    def _wait_reply(self, worker, limiter):
+        """
+        Wait until the worker replies, raise JobTimeout / JobCPUTimeout once the
+        job is kill_grace past its wall or CPU budget. The worker enforces the
+        limits itself, this is for code stuck in C calls or catching the limit
+        exceptions.
+        """
+        wall, cpu = limiter.wall_seconds, limiter.cpu_seconds
+        if not (wall or cpu):
+            return
+        pid = worker.process.pid
+        started = time.monotonic()
+        cpu_start = _process_cpu(pid) if cpu else None
+        while not worker.conn.poll(_POLL_SECONDS):
+            elapsed = time.monotonic() - started
+            if wall and elapsed > wall + self.kill_grace:
+                raise JobTimeout(f"job exceeded wall clock limit of {wall}s")
+            if cpu:
+                used = _process_cpu(pid) if cpu_start is not None else None
+                # without /proc wall time stands in, a job can't use more CPU than that
+                spent = used - cpu_start if used is not None else elapsed
+                if spent > cpu + self.kill_grace:
+                    raise JobCPUTimeout(f"job exceeded CPU limit of {cpu}s")
+
+    def _finish(self, job, started, result=None, error=None):
+        done = time.perf_counter()
+        if error is not None and job.accounting and getattr(error, "usage", None) is None:
+            # the worker was killed (or never replied), all we know is how long it took
+            policy = job.policy.fingerprint if job.policy is not None else None
+            error.usage = RunUsage(policy, type(error).__name__, int((done - started) * 1e9), 0.0, 0.0, 0, 0, 0, 0,
+                                   None)
+        with self._lock:
+            self.busy -= 1
+            self._running.pop(job.future, None)
+            self._latencies.append(done - started)
+            self._waits.append(started - job.submitted)
+            if error is None:
+                self.completed += 1
+            else:
+                self.failed += 1
+        if error is None:
+            job.future.set_result(result)
+        else:
+            job.future.set_exception(error)
+
+    @property
+    def queue_depth(self):
+        return self._jobs.qsize()
+
+    def stats(self):
+        """Queue depth, counters and per-job latency percentiles (seconds)"""
+        with self._lock:
+            latencies = sorted(self._latencies)
+            waits = sorted(self._waits)
+            stats = {
+                "workers": self.size,
+                "busy": self.busy,
+                "queue_depth": self._jobs.qsize(),
+                "completed": self.completed,
+                "failed": self.failed,
+                "recycled": self.recycled,
+            }
+        for name, values in (("latency", latencies), ("wait", waits)):
+            for pct in (50, 95, 99):
+                stats[f"{name}_p{pct}"] = values[min(len(values) - 1, len(values) * pct // 100)] if values else 0
+        return stats
+
+    def close(self):
+        """
+        Stop accepting jobs and shut the workers down once the queue drains.
+        Jobs no dispatcher is left to run fail with WorkerError.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        for _ in self._threads:
+            self._jobs.put(None)
+        for thread in self._threads:
+            thread.join()
+        while True:
+            try:
+                job = self._jobs.get_nowait()
+            except queue.Empty:
+                break
+            if job is not None and job.future.set_running_or_notify_cancel():
+                job.future.set_exception(WorkerError("pool closed before the job ran"))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
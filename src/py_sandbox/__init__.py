@@ -1,3 +1 @@
 __version__ = "0.1.0"
-
-from .experimental.visitor import FunctionFinderVisitor
\ No newline at end of file
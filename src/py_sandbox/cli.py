@@ -1,55 +1,83 @@
 import argparse
-import code
+import json
+import os
+import sys
 from py_sandbox.CodeAnalyzer import CodeAnalyzer
+from py_sandbox.BatchAnalyzer import BatchAnalyzer
+from py_sandbox.AnalysisManifest import AnalysisManifest
+from py_sandbox.ReportSink import NDJSONSink
 from py_sandbox.AnalyzerConfig import AnalyzerConfig
 from py_sandbox.CodeRunner import CodeRunner
+from py_sandbox.ResourceLimiter import ResourceLimiter, ResourceLimitExceeded
+from py_sandbox.SandboxSession import SandboxSession
+from py_sandbox.ReplBuffer import ReplBuffer
+from py_sandbox.SandboxDaemon import SandboxDaemon
+from py_sandbox.WorkerPool import WorkerPool
+from py_sandbox import Events
 
 
-def multiline_repl():
-    console = code.InteractiveConsole()
-    buffer = []
-    while True:
-        try:
-            prompt = '........ ' if buffer else 'sandbox$ '
-            line = input(prompt)
-            buffer.append(line)
-            source = '\n'.join(buffer)
-            if console.push(source):
-                # Incomplete — keep collecting input
-                print("incomplete")
-                continue
-            else:
-                # Complete — reset buffer
-                print("completed")
-                buffer.clear()
-        except (EOFError, KeyboardInterrupt):
-            print("\nExiting REPL.")
-            break
-        except Exception as e:
-            print(f"Error: {e}")
-            buffer.clear()
+def run_block(session, source):
+    """Analyze, compile and run one finished REPL block in the session"""
+    compiled_results, compiled = session.prepare(source)
+    if compiled_results["alert"]:
+        print(f"Alerts: {compiled_results['alert_types']}")
+        if compiled_results["config_no_exec"]:
+            print("Not Executing Code")
+            return
+    captured_output, captured_vars, result = session.run_compiled(compiled)
+    if captured_output:
+        print(f"output: {captured_output}")
+    if captured_vars:
+        print(f"vars: {captured_vars}")
+    if result is not None:
+        print(f"result: {result}")
+
 
 def repl(ac):
-    recurring_vars = {}
+    session = SandboxSession(ac)
+    # typed input ends blocks at a blank line, piped input keeps blank lines inside them
+    buffer = ReplBuffer(blank_ends_block=sys.stdin.isatty())
     while True:
         try:
-            line = input("sandbox$ ")
-            compiled_results, tree = CodeAnalyzer(ac).analyze_code(source_code=line)
-            if compiled_results["alert"]:
-                print(f"Alerts: {compiled_results['alert_types']}")
-            captured_output, captured_vars, result = CodeRunner().run_tree(code_tree=tree, recurring_vars=recurring_vars)  
-            if captured_output:
-                print(f"output: {captured_output}")
-            if captured_vars:
-                print(f"vars: {captured_vars}")
-            if result is not None:
-                print(f"result: {result}")
-            recurring_vars = captured_vars
-        except (EOFError, KeyboardInterrupt):
+            line = input('........ ' if buffer.pending else 'sandbox$ ')
+            blocks = buffer.feed(line)
+        except KeyboardInterrupt:
+            # like the interactive interpreter: drop what was being typed, keep going
+            buffer.flush()
+            print()
+            continue
+        except EOFError:
+            # run what was still being typed, like the end of a file
+            blocks = [buffer.flush()] if buffer.pending else []
+            line = None
+        for source in blocks:
+            try:
+                run_block(session, source)
+            except (Exception, ResourceLimitExceeded) as e:
+                print(f"Error: {e}")
+        if line is None:
             print("\nExiting REPL.")
             break
-        except Exception as e:
-            print(f"Error: {e}")
+
+
+def analyze_files(ac, paths, jobs=None, ordered=True, manifest_path=None, summary=False, output=None):
+    """Analyze every file under paths as NDJSON records, returns 1 if any file alerted or failed"""
+    status = 0
+    manifest = AnalysisManifest(manifest_path) if manifest_path else None
+    try:
+        with BatchAnalyzer(ac, workers=jobs, manifest=manifest, detail=not summary) as batch, \
+                NDJSONSink(output) as sink:
+            for record in batch.analyze(paths, ordered=ordered):
+                if "error" in record or record["report"]["alert"]:
+                    status = 1
+                sink.write(record)
+    except BrokenPipeError:
+        # the reader went away (| head), stop quietly instead of a traceback at exit
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    finally:
+        if manifest is not None:
+            manifest.close()
+    return status
 
 
 def main():
@@ -60,29 +88,100 @@ def main():
 
     parser.add_argument(
         "-f", "--file", 
-        help="path to python file",
+        help="python files, directories or globs to analyze (one JSON line per file)",
+        type=str,
+        nargs="+",
+        required=False)
+
+    parser.add_argument(
+        "-j", "--jobs",
+        help="worker processes for --file, defaults to all cores",
+        type=int,
+        required=False)
+
+    parser.add_argument(
+        "--unordered",
+        help="with --file, print each file as soon as it is done instead of in input order",
+        action="store_true")
+
+    parser.add_argument(
+        "--summary",
+        help="with --file, only report each file's summary, metrics and alerts",
+        action="store_true")
+
+    parser.add_argument(
+        "-o", "--output",
+        help="with --file, write the NDJSON records here instead of stdout",
+        type=str,
+        required=False)
+
+    parser.add_argument(
+        "--manifest",
+        help="with --file, manifest of previous results, only changed files are analyzed again",
         type=str,
         required=False)
     
+    parser.add_argument(
+        "--serve",
+        help="run as a daemon taking JSON lines jobs on this Unix socket",
+        type=str,
+        required=False)
+
+    parser.add_argument(
+        "--policy",
+        help="with --serve, an extra policy clients can pick by name, NAME=CONFIG_PATH (repeatable)",
+        action="append",
+        default=[])
+
     parser.add_argument(
         "-c", "--config", 
         help="Config File for sandbox",
         type=str,
         required=False)
+
+    parser.add_argument(
+        "-v", "--verbose",
+        help="print analyzer events to stderr (-v alerts, -vv everything)",
+        action="count",
+        default=0)
     args = parser.parse_args()
 
+    if args.verbose:
+        Events.default_stream.subscribe(
+            lambda event: print(json.dumps(event.to_dict(), default=str), file=sys.stderr),
+            level=Events.DEBUG if args.verbose > 1 else Events.WARNING)
+
     if args.config:
         ac = AnalyzerConfig(config_path=args.config)
     else:
         ac = AnalyzerConfig()
 
+    if args.serve:
+        configs = {"default": ac}
+        for policy in args.policy:
+            name, _, path = policy.partition("=")
+            configs[name] = AnalyzerConfig(config_path=path)
+        # memory limits only work in processes of their own
+        pool = None
+        if any(ResourceLimiter.from_config(config).memory_bytes for config in configs.values()):
+            pool = WorkerPool()
+        print(f"serving on {args.serve}", file=sys.stderr)
+        try:
+            SandboxDaemon(args.serve, configs, default="default", pool=pool).serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if pool is not None:
+                pool.close()
+        sys.exit(0)
+
     if args.interactive:
-        # multiline_repl()
         repl(ac)
 
     # TODO: returned sanitized code
     if args.file:
-        pass
+        sys.exit(analyze_files(ac, args.file, args.jobs, not args.unordered, args.manifest,
+                               args.summary, args.output))
     elif args.code:
         compiled_results, tree= CodeAnalyzer(ac).analyze_code(source_code=args.code)
         # TODO: Do this better and in a more generic place:
@@ -90,7 +189,7 @@ def main():
             print("Not Executing Code")
             print(compiled_results["alert_types"])
         else:
-            captured_output, captured_vars, result = CodeRunner().run_tree(code_tree=tree)
+            captured_output, captured_vars, result = CodeRunner(limiter=ResourceLimiter.from_config(ac), policy=ac.policy).run_tree(code_tree=tree)
             if captured_output:
                 print(f"output: {captured_output}")
             if captured_vars:
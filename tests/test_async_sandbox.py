@@ -0,0 +1,122 @@
+import ast
+import asyncio
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytest
+
+from py_sandbox.AnalysisCache import AnalysisCache
+from py_sandbox.AsyncSandbox import AsyncSandbox
+from py_sandbox.BytecodeCache import BytecodeCache
+from py_sandbox.CodeRunner import CodeRunner
+from py_sandbox.ResourceLimiter import ResourceLimiter, StepLimitExceeded
+from py_sandbox.WorkerPool import WorkerPool
+
+CATCHING_LOOP = "while True:\n    try:\n        while True:\n            pass\n    except Exception:\n        pass"
+
+
+def test_timeout_stops_a_job_that_catches_exceptions():
+    sandbox = AsyncSandbox(executor=ThreadPoolExecutor(max_workers=1))
+
+    async def main():
+        report, compiled = await sandbox.analyze_async(CATCHING_LOOP)
+        with pytest.raises(asyncio.TimeoutError):
+            await sandbox.run_compiled_async(compiled, timeout=0.2)
+        # the only executor thread must be free again for this one to run
+        _, quick = await sandbox.analyze_async("x = 1")
+        return await sandbox.run_compiled_async(quick, timeout=5)
+
+    try:
+        _, captured_vars, _ = asyncio.run(main())
+        assert captured_vars == {"x": 1}
+    finally:
+        sandbox.close()
+
+
+def test_idle_tenants_are_forgotten():
+    sandbox = AsyncSandbox()
+
+    async def main():
+        await asyncio.gather(*(sandbox.sandbox_async("x = 1", tenant=f"tenant-{i}") for i in range(50)))
+
+    try:
+        asyncio.run(main())
+        assert sandbox._tenants == {}
+    finally:
+        sandbox.close()
+
+
+def test_process_executor_analysis_keeps_the_step_budget():
+    runner = CodeRunner(cache=AnalysisCache(), limiter=ResourceLimiter(max_steps=1000))
+    sandbox = AsyncSandbox(runner=runner, executor=ProcessPoolExecutor(max_workers=1))
+
+    async def main():
+        return await sandbox.sandbox_async("for i in range(10 ** 6):\n    pass")
+
+    try:
+        with pytest.raises(StepLimitExceeded):
+            asyncio.run(main())
+        assert runner.cache.get(runner.cache_key("for i in range(10 ** 6):\n    pass",
+                                                 sandbox.config.policy)) is not None
+    finally:
+        sandbox.close()
+
+
+SWALLOWING_LOOP = "while True:\n    try:\n        while True:\n            pass\n    except BaseException:\n        pass"
+
+
+def test_timeout_stops_a_job_that_catches_everything_in_a_pool():
+    with WorkerPool(workers=1) as pool:
+        sandbox = AsyncSandbox(pool=pool)
+
+        async def main():
+            _, compiled = await sandbox.analyze_async(SWALLOWING_LOOP)
+            with pytest.raises(asyncio.TimeoutError):
+                await sandbox.run_compiled_async(compiled, timeout=0.2)
+            # the worker was killed and replaced, the pool keeps serving
+            _, quick = await sandbox.analyze_async("x = 1")
+            return await sandbox.run_compiled_async(quick, timeout=10)
+
+        try:
+            assert asyncio.run(main())[1] == {"x": 1}
+        finally:
+            sandbox.close()
+
+
+def test_trees_are_compiled_off_the_loop():
+    runner = CodeRunner(limiter=ResourceLimiter(max_steps=1000))
+    sandbox = AsyncSandbox(runner=runner)
+    threads = []
+    compile_tree = runner.compile_tree
+
+    def recording(tree):
+        threads.append(threading.current_thread())
+        return compile_tree(tree)
+
+    runner.compile_tree = recording
+
+    async def main():
+        return await sandbox.run_tree_async(ast.parse("y = sum(i for i in range(10))"), timeout=5)
+
+    try:
+        assert asyncio.run(main())[1] == {"y": 45}
+        assert threads and threads[0] is not threading.main_thread()
+    finally:
+        sandbox.close()
+
+
+def test_process_executor_analysis_uses_the_runners_caches(tmp_path):
+    def sandbox():
+        runner = CodeRunner(cache=AnalysisCache(), bytecode_cache=BytecodeCache(str(tmp_path / "bc")),
+                            prescreen=True)
+        return AsyncSandbox(runner=runner, executor=ProcessPoolExecutor(max_workers=1))
+
+    first, second = sandbox(), sandbox()
+    try:
+        report, _ = asyncio.run(first.analyze_async("x = 1"))
+        assert report.get("prescreened")
+        asyncio.run(second.analyze_async("x = 1"))
+        assert second.runner.bytecode_cache.hits == 1
+    finally:
+        first.close()
+        second.close()
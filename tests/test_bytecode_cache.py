@@ -0,0 +1,53 @@
+import marshal
+import os
+
+import pytest
+
+from py_sandbox.AnalysisCache import AnalysisCache
+from py_sandbox.AnalyzerConfig import AnalyzerConfig
+from py_sandbox.BytecodeCache import BytecodeCache, MAGIC
+
+
+def _entry(cache, source):
+    config = AnalyzerConfig()
+    key = AnalysisCache.key(source, config.policy)
+    cache.put(key, {"alert": False}, compile(source, "<string>", "exec"))
+    return key
+
+
+def test_round_trip(tmp_path):
+    cache = BytecodeCache(str(tmp_path / "cache"))
+    key = _entry(cache, "x = 1")
+    report, code = cache.get(key)
+    assert report == {"alert": False}
+    namespace = {}
+    exec(code, namespace)
+    assert namespace["x"] == 1
+
+
+def test_forged_entry_is_not_loaded(tmp_path):
+    cache = BytecodeCache(str(tmp_path / "cache"))
+    key = _entry(cache, "x = 1")
+    path = cache._path(key)
+    with open(path, "rb") as f:
+        data = f.read()
+    # same layout, payload swapped for code that never went through analysis
+    forged = marshal.dumps(({"alert": False}, compile("x = 'pwned'", "<string>", "exec")))
+    with open(path, "wb") as f:
+        f.write(data[:len(MAGIC) + 32] + forged)
+    assert cache.get(key) is None
+    assert not os.path.exists(path)
+
+
+def test_entries_from_another_key_are_rejected(tmp_path):
+    directory = str(tmp_path / "cache")
+    key = _entry(BytecodeCache(directory, key=b"k" * 32), "x = 1")
+    assert BytecodeCache(directory).get(key) is None
+
+
+def test_shared_directory_is_refused(tmp_path):
+    directory = tmp_path / "cache"
+    directory.mkdir()
+    directory.chmod(0o777)
+    with pytest.raises(PermissionError):
+        BytecodeCache(str(directory))
@@ -0,0 +1,60 @@
+import json
+
+from py_sandbox.AnalysisCache import AnalysisCache
+from py_sandbox.AnalysisRecords import LoopRecord, json_default, plain_report
+from py_sandbox.AnalyzerConfig import AnalyzerConfig
+from py_sandbox.BytecodeCache import BytecodeCache
+from py_sandbox.CodeAnalyzer import CodeAnalyzer
+from py_sandbox.CodeRunner import CodeRunner
+
+SOURCE = """
+def f(x):
+    for i in range(x):
+        if i:
+            print(i)
+    try:
+        pass
+    except ValueError:
+        pass
+"""
+
+
+def test_report_is_a_plain_dict():
+    report, _ = CodeAnalyzer(AnalyzerConfig()).analyze_code(SOURCE)
+    assert type(report) is dict
+    # old callers serialize without default= and edit reports in place
+    decoded = json.loads(json.dumps(report))
+    assert decoded["loops"] == [{"type": "for", "line": 3, "context": "function:f"}]
+    report["reviewed"] = True
+    assert report["function_calls"][0]["function"] == "range"
+
+
+def test_records_report_matches_analyze_code():
+    analyzer = CodeAnalyzer(AnalyzerConfig())
+    report, _ = analyzer.analyze_code(SOURCE)
+    records, _ = analyzer.analyze_records(SOURCE)
+    assert isinstance(records["loops"][0], LoopRecord)
+    assert json.dumps(records, default=json_default) == json.dumps(report)
+    assert plain_report(records) == report
+
+
+def test_prepare_builds_no_dicts_until_serialized(tmp_path, monkeypatch):
+    def fail(self):
+        raise AssertionError("to_dict called")
+
+    monkeypatch.setattr(LoopRecord, "to_dict", fail)
+    runner = CodeRunner(cache=AnalysisCache())
+    report, _ = runner.prepare(SOURCE, AnalyzerConfig())
+    assert not report["alert"]
+    monkeypatch.undo()
+    # the disk cache stores the plain form
+    runner = CodeRunner(bytecode_cache=BytecodeCache(str(tmp_path / "bc")))
+    runner.prepare(SOURCE, AnalyzerConfig())
+    stored, _ = runner.bytecode_cache.get(runner.cache_key(SOURCE, AnalyzerConfig().policy))
+    assert stored["loops"] == [{"type": "for", "line": 3, "context": "function:f"}]
+
+
+def test_reused_analyzer_does_not_carry_alerts_over():
+    analyzer = CodeAnalyzer(AnalyzerConfig())
+    assert analyzer.analyze_code("import os")[0]["alert"]
+    assert not analyzer.analyze_code("x = 1")[0]["alert"]
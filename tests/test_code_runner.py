@@ -0,0 +1,27 @@
+import threading
+
+from py_sandbox.AnalyzerConfig import AnalyzerConfig
+from py_sandbox.CodeRunner import CodeRunner
+from py_sandbox.ResourceLimiter import ResourceLimiter
+
+
+def test_per_run_results_are_per_thread():
+    runner = CodeRunner(limiter=ResourceLimiter(max_steps=10 ** 6), accounting=True)
+    config = AnalyzerConfig()
+    loops = {n: runner.prepare(f"for i in range({n}):\n    pass", config)[1] for n in (10, 1000)}
+    barrier = threading.Barrier(2)
+    seen = {}
+
+    def run(n):
+        for _ in range(50):
+            barrier.wait()
+            runner.run_compiled(loops[n])
+            barrier.wait()
+            seen.setdefault(n, set()).add((runner.last_steps, runner.last_usage.steps))
+
+    threads = [threading.Thread(target=run, args=(n,)) for n in loops]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert seen == {10: {(10, 10)}, 1000: {(1000, 1000)}}
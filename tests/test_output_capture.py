@@ -0,0 +1,62 @@
+import sys
+import threading
+
+import pytest
+
+from py_sandbox.OutputCapture import OutputCapture, redirect_thread_stdout
+from py_sandbox.ResourceLimiter import OutputLimitExceeded
+
+
+def test_truncate_reports_the_full_length_written():
+    capture = OutputCapture(max_bytes=5, on_overflow="truncate")
+    assert capture.write("hello world") == len("hello world")
+    assert capture.getvalue() == "hello"
+    assert capture.truncated
+    assert capture.write("more") == 4
+
+
+def test_abort_past_the_cap():
+    capture = OutputCapture(max_bytes=5)
+    with pytest.raises(OutputLimitExceeded):
+        capture.write("hello world")
+
+
+def test_callback_gets_every_chunk():
+    chunks = []
+    capture = OutputCapture(callback=chunks.append, keep=False)
+    capture.write("a")
+    capture.write("b")
+    assert chunks == ["a", "b"]
+    assert capture.getvalue() == ""
+
+
+def test_stdout_is_restored_after_the_last_redirect():
+    original = sys.stdout
+    outer, inner = OutputCapture(), OutputCapture()
+    with redirect_thread_stdout(outer):
+        with redirect_thread_stdout(inner):
+            print("inner")
+        print("outer")
+        assert sys.stdout is not original
+    assert sys.stdout is original
+    assert inner.getvalue() == "inner\n"
+    assert outer.getvalue() == "outer\n"
+
+
+def test_threads_capture_their_own_output():
+    captures = [OutputCapture() for _ in range(4)]
+    barrier = threading.Barrier(len(captures))
+
+    def run(i):
+        with redirect_thread_stdout(captures[i]):
+            barrier.wait()
+            for _ in range(100):
+                print(i)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(len(captures))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for i, capture in enumerate(captures):
+        assert capture.getvalue() == f"{i}\n" * 100
@@ -0,0 +1,44 @@
+import dataclasses
+
+import pytest
+
+from py_sandbox.AnalyzerConfig import AnalyzerConfig
+from py_sandbox.CodeAnalyzer import CodeAnalyzer
+from py_sandbox.Policy import Policy
+
+
+def test_policy_is_frozen():
+    policy = AnalyzerConfig().policy
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        policy.no_exec = True
+    assert isinstance(policy.blacklist_imports, frozenset)
+
+
+def test_fingerprint_ignores_rule_order():
+    first = AnalyzerConfig()
+    second = AnalyzerConfig()
+    first.blacklist_imports = ["os", "sys", "socket"]
+    second.blacklist_imports = ["socket", "os", "sys"]
+    assert first.compile().fingerprint == second.compile().fingerprint
+
+
+def test_fingerprint_changes_with_rules():
+    config = AnalyzerConfig()
+    before = config.fingerprint
+    config.blacklist_imports = config.blacklist_imports + ["subprocess"]
+    assert config.compile().fingerprint != before
+
+
+def test_single_name_is_not_split_into_characters():
+    config = AnalyzerConfig()
+    config.blacklist_imports = "subprocess"
+    assert config.compile().blacklist_imports == frozenset({"subprocess"})
+    assert Policy.from_config(config).blacklist_imports == frozenset({"subprocess"})
+
+
+def test_analysis_does_not_mutate_the_config():
+    config = AnalyzerConfig()
+    blacklist = list(config.blacklist)
+    report, _ = CodeAnalyzer(config).analyze_code("import os\nos.getcwd()")
+    assert report["alert"]
+    assert config.blacklist == blacklist
@@ -0,0 +1,53 @@
+import builtins
+
+from py_sandbox import cli
+from py_sandbox.AnalyzerConfig import AnalyzerConfig
+from py_sandbox.ReplBuffer import ReplBuffer
+
+
+def _feed(buffer, text):
+    blocks = []
+    for line in text.split("\n"):
+        blocks.extend(buffer.feed(line))
+    return blocks
+
+
+def test_simple_statements_complete_at_end_of_line():
+    assert _feed(ReplBuffer(), "x = 1\nprint(x)") == ["x = 1", "print(x)"]
+
+
+def test_else_continues_the_block():
+    source = "if x:\n    y = 1\nelse:\n    y = 2"
+    buffer = ReplBuffer()
+    assert _feed(buffer, source) == []
+    assert buffer.flush() == source
+
+
+def test_names_starting_with_keywords_start_a_new_statement():
+    buffer = ReplBuffer()
+    blocks = _feed(buffer, "if x:\n    y = 1\nelsewhere = 1\nfinally_done = True")
+    assert blocks == ["if x:\n    y = 1", "elsewhere = 1", "finally_done = True"]
+    assert buffer.flush() is None
+
+
+def test_open_brackets_and_strings_continue():
+    buffer = ReplBuffer()
+    assert _feed(buffer, "x = (1,\n     2)") == ["x = (1,\n     2)"]
+    assert _feed(buffer, 's = """a\nb"""') == ['s = """a\nb"""']
+
+
+def test_ctrl_c_discards_the_pending_block(monkeypatch, capsys):
+    lines = iter(["for i in range(3):", KeyboardInterrupt, "print('after')", EOFError])
+
+    def fake_input(prompt):
+        line = next(lines)
+        if isinstance(line, type):
+            raise line()
+        return line
+
+    monkeypatch.setattr(builtins, "input", fake_input)
+    cli.repl(AnalyzerConfig())
+    out = capsys.readouterr().out
+    assert "after" in out
+    assert "Error" not in out
+    assert "Exiting REPL." in out
@@ -0,0 +1,95 @@
+import resource
+import threading
+
+import pytest
+
+from py_sandbox.CodeRunner import CodeRunner
+from py_sandbox.ResourceLimiter import (CPULimitExceeded, MemoryLimitExceeded, OutputLimitExceeded,
+                                        ResourceLimiter, ResourceLimitExceeded, WallClockLimitExceeded)
+
+# catches the first limit exception it would see if limits were plain Exceptions
+CATCHING_LOOP = "while True:\n    try:\n        while True:\n            pass\n    except Exception:\n        pass"
+# swallows the limit exception and then finishes normally
+SWALLOWING = "try:\n    while True:\n        pass\nexcept BaseException:\n    pass\ndone = True"
+
+
+def _run(limiter, source):
+    return CodeRunner(limiter=limiter).run_code(source)
+
+
+def _on_thread(fn):
+    outcome = {}
+
+    def target():
+        try:
+            outcome["result"] = fn()
+        except BaseException as e:
+            outcome["error"] = e
+    thread = threading.Thread(target=target)
+    thread.start()
+    thread.join(10)
+    assert not thread.is_alive(), "run didn't stop"
+    return outcome
+
+
+def test_limits_are_not_plain_exceptions():
+    assert not issubclass(ResourceLimitExceeded, Exception)
+
+
+@pytest.mark.parametrize("limits, exc_type", [
+    ({"wall_seconds": 0.2}, WallClockLimitExceeded),
+    ({"cpu_seconds": 0.2}, CPULimitExceeded),
+])
+@pytest.mark.parametrize("source", [CATCHING_LOOP, SWALLOWING])
+def test_time_limits_on_the_main_thread(limits, exc_type, source):
+    with pytest.raises(exc_type):
+        _run(ResourceLimiter(**limits), source)
+
+
+@pytest.mark.parametrize("source", [CATCHING_LOOP, SWALLOWING])
+def test_time_limits_on_another_thread(source):
+    outcome = _on_thread(lambda: _run(ResourceLimiter(wall_seconds=0.2), source))
+    assert isinstance(outcome.get("error"), WallClockLimitExceeded)
+
+
+def test_timers_are_disarmed_after_the_run():
+    limiter = ResourceLimiter(wall_seconds=0.1, cpu_seconds=0.1)
+    _run(limiter, "x = 1")
+    # a late tick would land here
+    total = 0
+    for i in range(3_000_000):
+        total += i
+
+
+def test_output_limit():
+    with pytest.raises(OutputLimitExceeded):
+        _run(ResourceLimiter(output_bytes=10), "print('x' * 100)")
+
+
+def test_memory_limit_is_restored():
+    before = resource.getrlimit(resource.RLIMIT_AS)
+    with pytest.raises(MemoryLimitExceeded):
+        _run(ResourceLimiter(memory_bytes=64 * 1024 * 1024), "blob = bytearray(512 * 1024 * 1024)")
+    assert resource.getrlimit(resource.RLIMIT_AS) == before
+
+
+def test_memory_limit_is_refused_with_other_threads_running():
+    before = resource.getrlimit(resource.RLIMIT_AS)
+    release = threading.Event()
+    other = threading.Thread(target=release.wait)
+    other.start()
+    try:
+        with pytest.raises(RuntimeError):
+            _run(ResourceLimiter(memory_bytes=64 * 1024 * 1024), "x = 1")
+    finally:
+        release.set()
+        other.join()
+    assert resource.getrlimit(resource.RLIMIT_AS) == before
+
+
+def test_from_config():
+    class Config:
+        resource_limits = {"cpu_seconds": 1, "memory_mb": 2, "wall_seconds": 3, "output_bytes": 4}
+    limiter = ResourceLimiter.from_config(Config())
+    assert (limiter.cpu_seconds, limiter.memory_bytes, limiter.wall_seconds, limiter.output_bytes) == \
+        (1, 2 * 1024 * 1024, 3, 4)
@@ -0,0 +1,25 @@
+import pytest
+
+from py_sandbox.AnalyzerConfig import AnalyzerConfig
+from py_sandbox.CodeRunner import CodeRunner
+from py_sandbox.RunAccounting import UsageLedger
+
+
+def test_runs_are_accounted_and_totalled_per_session():
+    ledger = UsageLedger()
+    runner = CodeRunner(accounting=True, ledger=ledger)
+    config = AnalyzerConfig()
+    keep = runner.prepare("data = [object() for _ in range(1000)]", config)[1]
+    fail = runner.prepare("1 / 0", config)[1]
+    _, _, _, usage = runner.run_accounted(keep, session="a")
+    assert usage.status == "ok"
+    # the objects stay alive in the returned vars
+    assert usage.net_blocks >= 1000
+    with pytest.raises(ZeroDivisionError) as info:
+        runner.run_accounted(fail, session="b")
+    assert info.value.usage.status == "ZeroDivisionError"
+    stats = ledger.stats()
+    assert stats["total"]["runs"] == 2
+    assert stats["total"]["errors"] == 1
+    assert {name: totals["runs"] for name, totals in stats["by_session"].items()} == {"a": 1, "b": 1}
+    assert "net_blocks" in stats["total"]
@@ -0,0 +1,74 @@
+import os
+import stat
+
+import pytest
+
+from py_sandbox.AnalyzerConfig import AnalyzerConfig
+from py_sandbox.SandboxClient import SandboxClient, SandboxDaemonError
+from py_sandbox.SandboxDaemon import SandboxDaemon
+from py_sandbox.WorkerPool import WorkerPool
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    limited = AnalyzerConfig()
+    limited.resource_limits = {"wall_seconds": 0.2}
+    with SandboxDaemon(str(tmp_path / "d.sock"), {"default": AnalyzerConfig(), "limited": limited}) as daemon:
+        daemon.start()
+        yield daemon
+
+
+def test_socket_is_private(daemon):
+    assert stat.S_IMODE(os.stat(daemon.socket_path).st_mode) == 0o600
+    # nothing left over from binding in a private directory
+    assert os.listdir(os.path.dirname(daemon.socket_path)) == ["d.sock"]
+
+
+def test_pipeline_reads_every_reply_before_raising(daemon):
+    with SandboxClient(daemon.socket_path, timeout=10) as client:
+        with pytest.raises(SandboxDaemonError):
+            client.pipeline([{"op": "run", "code": "1 / 0"}, {"op": "ping"}, {"op": "ping"}])
+        # the replies to the pings were read, the next request gets its own reply
+        assert client.run("x = 2")["vars"] == {"x": 2}
+
+
+def test_large_pipeline_goes_through(daemon):
+    code = "x = '" + "a" * 1000 + "'\nprint(x * 50)"
+    with SandboxClient(daemon.socket_path, timeout=30) as client:
+        replies = client.pipeline([{"op": "run", "code": code}] * 500)
+    assert len(replies) == 500
+    assert all(reply["ok"] for reply in replies)
+
+
+def test_limit_errors_are_replies(daemon):
+    with SandboxClient(daemon.socket_path, timeout=10) as client:
+        with pytest.raises(SandboxDaemonError) as info:
+            client.run("while True:\n    pass", policy="limited")
+        assert info.value.type == "WallClockLimitExceeded"
+        assert info.value.limit == "wall"
+        assert client.ping()
+
+
+
+@pytest.mark.parametrize("code", ["x = []\nx.append(x)", "x = 10 ** 5000"])
+def test_unencodable_replies_are_errors(daemon, code):
+    with SandboxClient(daemon.socket_path, timeout=10) as client:
+        replies = client.pipeline([{"op": "run", "code": code}, {"op": "ping"}], raise_errors=False)
+        assert [reply["ok"] for reply in replies] == [False, True]
+        assert replies[0]["type"] == "ValueError"
+        assert client.run("y = 1")["vars"] == {"y": 1}
+
+def test_pool_runs_are_accounted(tmp_path):
+    with WorkerPool(workers=1) as pool, \
+            SandboxDaemon(str(tmp_path / "d.sock"), pool=pool, accounting=True) as daemon:
+        daemon.start()
+        with SandboxClient(daemon.socket_path, timeout=30) as client:
+            reply = client.request({"op": "run", "code": "print(1)", "session": "tenant"})
+            assert reply["usage"]["status"] == "ok"
+            with pytest.raises(SandboxDaemonError) as info:
+                client.request({"op": "run", "code": "1 / 0", "session": "tenant"})
+            assert info.value.reply["usage"]["status"] == "ZeroDivisionError"
+            usage = client.stats()["usage"]
+    assert usage["by_session"]["tenant"]["runs"] == 2
+    assert usage["by_session"]["tenant"]["errors"] == 1
+    assert usage["by_policy"]["default"]["runs"] == 2
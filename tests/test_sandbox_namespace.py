@@ -0,0 +1,51 @@
+import ast
+
+import pytest
+
+from py_sandbox.AnalyzerConfig import AnalyzerConfig
+from py_sandbox.CodeRunner import CodeRunner
+from py_sandbox.SandboxNamespace import SandboxNamespace
+
+
+def _policy(**rules):
+    config = AnalyzerConfig()
+    for name, value in rules.items():
+        setattr(config, name, value)
+    config.blacklist = config.blacklist_imports + config.blacklist_statements + config.blacklisted_functions
+    return config.compile()
+
+
+def test_blocked_builtin_is_an_alerting_stub():
+    runner = CodeRunner(policy=_policy(blacklisted_functions=["open"]))
+    output, captured_vars = runner.run_code("handle = open('/etc/passwd')")
+    assert captured_vars["handle"] == "ALERT"
+    assert "AlertFuncCalled" in output
+
+
+def test_import_rules_hold_at_runtime():
+    runner = CodeRunner(policy=_policy())
+    # __import__ is reached without an import statement, the analyzer never sees it
+    with pytest.raises(ImportError):
+        runner.run_code("__import__('os')")
+    runner.run_code("import math")
+
+
+def test_runs_cannot_change_each_others_builtins():
+    runner = CodeRunner(policy=_policy())
+    runner.run_code("__builtins__['len'] = lambda x: 42")
+    _, captured_vars = runner.run_code("n = len('abc')")
+    assert captured_vars["n"] == 3
+
+
+def test_shared_builtins_are_read_only():
+    namespace = SandboxNamespace.for_policy(_policy())
+    with pytest.raises(TypeError):
+        namespace.builtins["len"] = None
+    assert SandboxNamespace.for_policy(_policy()) is namespace
+
+
+def test_trees_without_locations_compile():
+    tree = ast.Module(body=[ast.Assign(targets=[ast.Name(id="x", ctx=ast.Store())], value=ast.Constant(1))],
+                      type_ignores=[])
+    _, captured_vars, _ = CodeRunner().run_tree(tree, {})
+    assert captured_vars["x"] == 1
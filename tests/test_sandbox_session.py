@@ -0,0 +1,38 @@
+from py_sandbox.SandboxSession import SandboxSession
+
+COUNTER = "n = 0\ndef inc():\n    global n\n    n += 1\n    return n"
+
+
+def test_fork_functions_use_the_forks_names():
+    session = SandboxSession()
+    session.run(COUNTER)
+    fork = session.fork()
+    fork.run("inc()")
+    assert fork.variables["n"] == 1
+    assert session.variables["n"] == 0
+    session.run("inc()\ninc()")
+    assert (session.variables["n"], fork.variables["n"]) == (2, 1)
+
+
+def test_restore_goes_back_for_functions_too():
+    session = SandboxSession()
+    session.run(COUNTER)
+    snapshot = session.snapshot()
+    session.run("inc()")
+    session.restore(snapshot)
+    assert session.variables["n"] == 0
+    session.run("inc()")
+    assert session.variables["n"] == 1
+    # the snapshot itself is untouched by runs after the restore
+    session.restore(snapshot)
+    assert session.variables["n"] == 0
+
+
+def test_functions_kept_elsewhere_are_not_rebound():
+    session = SandboxSession()
+    session.run(COUNTER + "\nclass C:\n    inc = staticmethod(inc)\nfuncs = [inc]")
+    fork = session.fork()
+    fork.run("C.inc()\nfuncs[0]()")
+    # documented limitation: these still write to the namespace they were defined in
+    assert fork.variables["n"] == 0
+    assert session.variables["n"] == 2
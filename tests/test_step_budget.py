@@ -0,0 +1,68 @@
+import ast
+
+import pytest
+
+from py_sandbox.AnalyzerConfig import AnalyzerConfig
+from py_sandbox.CodeRunner import CodeRunner
+from py_sandbox.ResourceLimiter import ResourceLimiter, StepLimitExceeded
+from py_sandbox.StepBudget import STEP_NAME
+
+
+def _runner(max_steps=1000):
+    return CodeRunner(limiter=ResourceLimiter(max_steps=max_steps))
+
+
+def _run(source, max_steps=1000):
+    runner = _runner(max_steps)
+    return runner, runner.run_compiled(runner.prepare(source, AnalyzerConfig())[1])
+
+
+def test_runaway_loop_stops():
+    with pytest.raises(StepLimitExceeded):
+        _run("while True:\n    pass")
+
+
+def test_swallowed_stop_still_counts():
+    source = "while True:\n    try:\n        [i for i in range(10)]\n    except BaseException:\n        pass"
+    with pytest.raises(StepLimitExceeded):
+        _run(source)
+
+
+def test_budget_is_enough_for_small_loops():
+    runner, (_, variables, _) = _run("total = 0\nfor i in range(100):\n    total += i")
+    assert variables["total"] == 4950
+    assert runner.last_steps == 100
+
+
+@pytest.mark.parametrize("source", [
+    "globals()['__sandbox_step__'] = int",
+    "def f(): pass\nf.__globals__['__sandbox_step__'] = int",
+    "g = (i for i in ())\ng.gi_frame.f_globals.clear()",
+    "getattr(len, '__globals__')",
+    "exec('while True: pass')",
+    "__sandbox_step__ = int",
+])
+def test_counter_cannot_be_reached(source):
+    with pytest.raises(SyntaxError):
+        _run(source + "\nfor i in range(10 ** 6):\n    pass")
+
+
+def test_counter_rebound_at_run_time_fails_the_run():
+    source = ("import builtins\n"
+              "ns = getattr(builtins, 'glob' + 'als')()\n"
+              "ns['__sandbox_' + 'step__'] = int\n"
+              "for i in range(10 ** 5):\n    pass")
+    with pytest.raises(StepLimitExceeded, match="tampered"):
+        _run(source)
+
+
+def test_tree_is_not_changed_and_compiles_twice():
+    tree = ast.parse("for i in range(10):\n    pass\nf = lambda: [x for x in range(3) if x]")
+    before = ast.dump(tree)
+    runner = _runner()
+    for _ in range(2):
+        runner.run_compiled(runner.compile_tree(tree))
+    assert ast.dump(tree) == before
+    assert STEP_NAME not in before
+    # and the same tree still compiles without a budget
+    CodeRunner().run_compiled(CodeRunner().compile_tree(tree))
@@ -0,0 +1,93 @@
+import time
+
+import pytest
+
+from py_sandbox.ResourceLimiter import ResourceLimiter, ResourceLimitExceeded, WallClockLimitExceeded
+from py_sandbox.WorkerPool import JobCPUTimeout, WorkerError, WorkerPool
+
+
+def _code(source):
+    return compile(source, "<string>", "exec")
+
+
+def test_runs_jobs_and_recycles_workers():
+    with WorkerPool(workers=1, max_jobs_per_worker=1) as pool:
+        results = [pool.run(_code(f"x = {i}")) for i in range(3)]
+        assert [captured_vars["x"] for _, captured_vars, _ in results] == [0, 1, 2]
+        assert pool.stats()["recycled"] >= 2
+
+
+def test_wall_clock_kill_replaces_the_worker():
+    with WorkerPool(workers=1, limiter=ResourceLimiter(wall_seconds=0.2), kill_grace=0.2) as pool:
+        with pytest.raises(WallClockLimitExceeded):
+            pool.run(_code("import time\ntime.sleep(5)"))
+        assert pool.run(_code("y = 2"))[1]["y"] == 2
+
+
+def test_close_settles_every_future():
+    pool = WorkerPool(workers=1, max_jobs_per_worker=1)
+    futures = [pool.submit(_code("z = 1")) for _ in range(5)]
+    pool.close()
+    for future in futures:
+        assert future.done()
+        if future.exception() is not None:
+            assert isinstance(future.exception(), WorkerError)
+    with pytest.raises(RuntimeError):
+        pool.submit(_code("z = 1"))
+
+
+def test_accounted_jobs_return_their_usage():
+    with WorkerPool(workers=1) as pool:
+        output, captured_vars, _, usage = pool.run(_code("print('hi')\nx = [0] * 1000"), accounting=True)
+        assert output == "hi\n"
+        assert usage.status == "ok"
+        assert usage.output_bytes == 3
+        assert usage.wall_ns > 0
+        with pytest.raises(ZeroDivisionError) as info:
+            pool.run(_code("1 / 0"), accounting=True)
+        assert info.value.usage.status == "ZeroDivisionError"
+        # without accounting jobs still come back as three values
+        assert len(pool.run(_code("y = 1"))) == 3
+
+
+def test_killed_jobs_are_charged_their_wall_time():
+    with WorkerPool(workers=1, limiter=ResourceLimiter(wall_seconds=0.2), kill_grace=0.2) as pool:
+        with pytest.raises(WallClockLimitExceeded) as info:
+            # stuck in one C call, the worker never gets to raise and is killed
+            pool.run(_code("sum(range(10 ** 12))"), accounting=True)
+        assert info.value.usage.status == "JobTimeout"
+        assert info.value.usage.wall_ns >= 0.4e9
+
+
+SWALLOWS_LIMITS = "while True:\n    try:\n        while True:\n            pass\n    except BaseException:\n        pass"
+
+
+@pytest.mark.parametrize("limiter", [ResourceLimiter(wall_seconds=0.2), ResourceLimiter(cpu_seconds=0.2)])
+def test_jobs_catching_the_limit_are_killed(limiter):
+    with WorkerPool(workers=1, limiter=limiter, kill_grace=0.2) as pool:
+        with pytest.raises(ResourceLimitExceeded):
+            pool.run(_code(SWALLOWS_LIMITS))
+        assert pool.run(_code("y = 2"))[1]["y"] == 2
+
+
+def test_rlimit_cpu_backs_the_cpu_budget_up():
+    # kill_grace keeps the dispatcher out of it, SIGXCPU ends the worker
+    with WorkerPool(workers=1, limiter=ResourceLimiter(cpu_seconds=0.2), kill_grace=30) as pool:
+        with pytest.raises(JobCPUTimeout):
+            pool.run(_code(SWALLOWS_LIMITS))
+
+
+def test_cancel_after_the_reply_does_not_hit_the_next_job():
+    with WorkerPool(workers=1) as pool:
+        finish = pool._finish
+
+        def slow_finish(*args, **kwargs):
+            # widen the window between the worker's reply and the job letting go of it
+            time.sleep(0.3)
+            finish(*args, **kwargs)
+
+        pool._finish = slow_finish
+        first = pool.submit(_code("x = 1"))
+        time.sleep(0.15)
+        assert pool.cancel(first)
+        assert pool.run(_code("y = 2"))[1]["y"] == 2